@@ -27,9 +27,7 @@ def login_callback():
     code = request.args.get('code')
     state = request.args.get('state')
 
-    tokens = oxc.get_tokens_by_code(code, state)
-
-    claims = oxc.get_user_info(tokens['access_token'])
+    claims = oxc.complete_login(code, state).claims
 
     resp = make_response(render_template("home.html"))
     resp.set_cookie('sub', claims['sub'][0])
@@ -10,3 +10,6 @@ logging.getLogger(__name__).addHandler(logging.NullHandler())
 
 # expose Client
 from client import Client
+
+# expose ClientRegistry
+from registry import ClientRegistry
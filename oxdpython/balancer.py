@@ -0,0 +1,291 @@
+"""Load balancing of the requests over several oxd-servers.
+
+:class:`BalancedMessenger` spreads the requests over one messenger per oxd
+endpoint. Each request goes to the endpoint with the least outstanding
+requests, or with ``strategy=P2C`` to the less busy of two endpoints picked at
+random, which scales better to many endpoints and many clients.
+
+An endpoint failing ``max_failures`` requests in a row is ejected from the
+rotation. A background thread probes the ejected endpoints every
+``probe_interval`` seconds and reinstates them once they accept connections
+again. A request that failed on one endpoint is sent to another one when the
+retry policy allows it, after its backoff and within its retry budget. When
+all the endpoints are ejected, the requests are spread over all of them rather
+than failing outright.
+
+With a :class:`~oxdpython.hedging.HedgePolicy`, slow read-only requests are
+also sent to a second endpoint and the first answer is used.
+
+The balancer is created by ``Messenger.create`` when given a list of hosts::
+
+    msgr = Messenger.create(["oxd1:8099", "oxd2:8099"], 8099)
+"""
+import collections
+import logging
+import random
+import socket
+import sys
+import threading
+import time
+
+from . import deadline
+from . import forking
+from .exceptions import OxdConnectionError, OxdTimeoutError
+from .messenger import Messenger
+
+logger = logging.getLogger(__name__)
+
+LEAST_OUTSTANDING = "least_outstanding"
+P2C = "p2c"
+
+
+class Endpoint(object):
+    """The state the balancer keeps about one oxd endpoint.
+
+    Args:
+        msgr (Messenger): the messenger talking to the endpoint
+    """
+    def __init__(self, msgr):
+        self.msgr = msgr
+        self.outstanding = 0
+        self.failures = 0
+        self.healthy = True
+
+    def __repr__(self):
+        return "<Endpoint %s outstanding=%d healthy=%s>" % (
+            self.msgr, self.outstanding, self.healthy)
+
+
+class BalancedMessenger(Messenger):
+    """Messenger balancing the requests over several messengers.
+
+    Args:
+        messengers (list): one messenger per oxd endpoint
+        strategy (str, optional): ``LEAST_OUTSTANDING`` (default) or ``P2C``
+        max_failures (int, optional): consecutive transport failures after
+            which an endpoint is ejected. Default 3.
+        probe_interval (float, optional): seconds between the health probes
+            of the ejected endpoints. Default 5.
+        probe_timeout (float, optional): seconds allowed for a health probe.
+            Default 1.
+        timeout (float, optional): seconds allowed for a whole request,
+            including the attempts on other endpoints
+        retry_policy (RetryPolicy, optional): decides whether a failed request
+            may be sent to another endpoint, and how many times
+        hedge_policy (HedgePolicy, optional): enables hedging of the read-only
+            requests to a second endpoint when the first one is slow
+    """
+    def __init__(self, messengers, strategy=LEAST_OUTSTANDING, max_failures=3,
+                 probe_interval=5.0, probe_timeout=1.0, timeout=None,
+                 retry_policy=None, hedge_policy=None):
+        Messenger.__init__(self, timeout, retry_policy=retry_policy)
+        self.endpoints = [Endpoint(m) for m in messengers]
+        self.strategy = strategy
+        self.max_failures = max_failures
+        self.probe_interval = probe_interval
+        self.probe_timeout = probe_timeout
+        self.hedge_policy = hedge_policy
+        self._prober = None
+        self._lock = threading.Lock()
+        forking.register(self)
+
+    def _after_fork(self):
+        """Forgets the requests and the prober of the parent process."""
+        self._lock = threading.Lock()
+        self._prober = None
+        for endpoint in self.endpoints:
+            endpoint.outstanding = 0
+        if not all(e.healthy for e in self.endpoints):
+            self._start_prober()
+
+    @property
+    def access_token(self):
+        return self._access_token
+
+    @access_token.setter
+    def access_token(self, token):
+        Messenger.access_token.fset(self, token)
+        for endpoint in self.endpoints:
+            endpoint.msgr.access_token = token
+
+    def _pick(self, candidates):
+        if self.strategy == P2C and len(candidates) > 2:
+            candidates = random.sample(candidates, 2)
+        return min(candidates, key=lambda e: (e.outstanding, random.random()))
+
+    def acquire(self, exclude=()):
+        """Chooses an endpoint for a request and counts the request as
+        outstanding on it.
+
+        Args:
+            exclude (iterable, optional): endpoints not to be chosen
+
+        Returns:
+            Endpoint: the chosen endpoint or None when all are excluded
+        """
+        with self._lock:
+            candidates = [e for e in self.endpoints if e not in exclude]
+            healthy = [e for e in candidates if e.healthy]
+            if not candidates:
+                return None
+            endpoint = self._pick(healthy or candidates)
+            endpoint.outstanding += 1
+            return endpoint
+
+    def release(self, endpoint, failed):
+        """Records the end of a request on the endpoint, ejecting the
+        endpoint after too many consecutive failures."""
+        with self._lock:
+            endpoint.outstanding -= 1
+            if not failed:
+                endpoint.failures = 0
+                if not endpoint.healthy:
+                    self._reinstate(endpoint)
+                return
+            endpoint.failures += 1
+            if endpoint.healthy and endpoint.failures >= self.max_failures:
+                self._eject(endpoint)
+
+    def _eject(self, endpoint):
+        logger.warning("Ejecting %s after %d failures", endpoint.msgr,
+                       endpoint.failures)
+        endpoint.healthy = False
+        if self._prober is None:
+            self._start_prober()
+
+    def _start_prober(self):
+        self._prober = threading.Thread(target=self._probe_loop,
+                                        name="%s prober" % self)
+        self._prober.daemon = True
+        self._prober.start()
+
+    def _reinstate(self, endpoint):
+        logger.warning("Reinstating %s", endpoint.msgr)
+        endpoint.healthy = True
+        endpoint.failures = 0
+
+    def _probe_loop(self):
+        """Probes the ejected endpoints until all of them are reinstated."""
+        while True:
+            time.sleep(self.probe_interval)
+            with self._lock:
+                ejected = [e for e in self.endpoints if not e.healthy]
+                if not ejected:
+                    self._prober = None
+                    return
+            for endpoint in ejected:
+                try:
+                    endpoint.msgr.probe(self.probe_timeout)
+                except (socket.error, IOError) as e:
+                    logger.debug("Probe of %s failed: %s", endpoint.msgr, e)
+                    continue
+                with self._lock:
+                    if not endpoint.healthy:
+                        self._reinstate(endpoint)
+
+    def _send(self, endpoint, command, kwargs):
+        """Sends the request to the acquired endpoint and releases it."""
+        start = time.time()
+        try:
+            response = endpoint.msgr.request(command, **kwargs)
+        except (OxdConnectionError, OxdTimeoutError):
+            self.release(endpoint, True)
+            raise
+        except Exception:
+            self.release(endpoint, False)
+            raise
+        self.release(endpoint, False)
+        if self.hedge_policy is not None:
+            self.hedge_policy.observe(command, time.time() - start)
+        return response
+
+    def _may_failover(self, command, error, tried):
+        """Tells whether the failed request may be sent to another endpoint,
+        after waiting for the backoff of the retry policy and taking from its
+        budget."""
+        if not isinstance(error, OxdConnectionError) or \
+                len(tried) == len(self.endpoints):
+            return False
+        return self.retry_policy.wait(command, error, len(tried))
+
+    def request(self, command, **kwargs):
+        forking.check()
+        with deadline.scope(self.timeout):
+            if self.hedge_policy is not None and len(self.endpoints) > 1:
+                delay = self.hedge_policy.delay(command)
+                if delay is not None:
+                    return self._hedged(command, kwargs, delay)
+
+            tried = []
+            while True:
+                endpoint = self.acquire(tried)
+                tried.append(endpoint)
+                try:
+                    return self._send(endpoint, command, kwargs)
+                except OxdConnectionError as e:
+                    if not self._may_failover(command, e, tried):
+                        raise
+
+    def _hedged(self, command, kwargs, delay):
+        """Sends the request from a worker thread and, when no answer came
+        within delay seconds, a duplicate to another endpoint. Returns the
+        first response, the other one is ignored."""
+        # the (exc_info, response) of the finished sends, notified to wake
+        # the caller without the polling of a timed Queue.get
+        results = collections.deque()
+        condition = threading.Condition()
+        current = deadline.current()
+        tried = []
+
+        def run(endpoint):
+            with deadline.scope(current):
+                try:
+                    result = (None, self._send(endpoint, command, kwargs))
+                except Exception:
+                    result = (sys.exc_info(), None)
+            with condition:
+                results.append(result)
+                condition.notify()
+
+        def launch():
+            endpoint = self.acquire(tried)
+            if endpoint is None:
+                return False
+            tried.append(endpoint)
+            worker = threading.Thread(target=run, args=(endpoint,),
+                                      name="%s %s" % (command, endpoint.msgr))
+            worker.daemon = True
+            worker.start()
+            return True
+
+        launch()
+        pending = 1
+        hedged = False
+        while True:
+            timeout = deadline.remaining(None if hedged else delay)
+            with condition:
+                finished = deadline.wait(condition, lambda: results, timeout)
+                if finished:
+                    error, response = results.popleft()
+            if not finished:
+                deadline.remaining()
+                if not hedged:
+                    hedged = True
+                    if self.hedge_policy.take() and launch():
+                        logger.debug("Hedging %s after %.3fs", command, delay)
+                        pending += 1
+                continue
+
+            pending -= 1
+            if error is None:
+                return response
+            if pending:
+                continue
+            if self._may_failover(command, error[1], tried) and launch():
+                pending += 1
+                continue
+            raise error[0], error[1], error[2]
+
+    def __str__(self):
+        return "BalancedMessenger(%s)" % ", ".join(
+            str(e.msgr) for e in self.endpoints)
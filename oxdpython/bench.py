@@ -0,0 +1,333 @@
+"""Load generator for measuring the throughput and latency of oxd-server and
+the oxd-https-extension as seen through the oxdpython Client.
+
+The benchmark runs a weighted mix of Client operations from a number of worker
+threads or processes, against either a real oxd deployment described by a
+config file, or the local stand-in servers from :mod:`oxdpython.fakeserver`.
+It is installed as the ``oxdpython-bench`` command::
+
+    oxdpython-bench --messenger socket --messenger https \\
+        --mix login=1,check_access=8,introspection=4 --workers 16 -n 20000
+
+Note:
+    asyncio is not available on Python 2, so the workers are limited to
+    threads and processes.
+"""
+import argparse
+import collections
+import math
+import multiprocessing
+import os
+import random
+import shutil
+import sys
+import tempfile
+import threading
+import time
+
+from ConfigParser import SafeConfigParser
+
+from .client import Client
+from .fakeserver import FakeOxdServer, FakeOxdUnixServer, FakeHttpsExtension
+
+#: Operation name mapped to the Client calls it is made of
+OPERATIONS = collections.OrderedDict()
+
+
+def operation(name):
+    """Decorator registering a function as a benchmark operation. The function
+    receives the Client and a ``timed`` callable, through which every Client
+    method call must be made so that it is measured."""
+    def register(func):
+        OPERATIONS[name] = func
+        return func
+    return register
+
+
+@operation("login")
+def login(client, timed):
+    timed(client.get_authorization_url)
+    tokens = timed(client.get_tokens_by_code, "code", "state")
+    timed(client.get_user_info, tokens["access_token"])
+
+
+@operation("complete_login")
+def complete_login(client, timed):
+    timed(client.get_authorization_url)
+    timed(client.complete_login, "code", "state", ["sub"])
+
+
+@operation("check_access")
+def check_access(client, timed):
+    timed(client.uma_rs_check_access, "rpt", "/photoz", "GET")
+
+
+@operation("check_access_many")
+def check_access_many(client, timed):
+    timed(client.uma_rs_check_access_many, "rpt",
+          [("/photoz/%d" % i, "GET") for i in range(20)])
+
+
+@operation("introspection")
+def introspection(client, timed):
+    timed(client.introspect_access_token, "access-token")
+
+
+@operation("introspection_many")
+def introspection_many(client, timed):
+    timed(client.introspect_access_token_many,
+          ["access-token-%d" % i for i in range(20)])
+
+
+def percentile(samples, pct):
+    """Returns the pct-th percentile of the sorted list of samples using the
+    nearest-rank method.
+
+    Args:
+        samples (list): the samples in ascending order
+        pct (float): a percentage between 0 and 100
+
+    Returns:
+        float: the value of the percentile or 0.0 for no samples
+    """
+    if not samples:
+        return 0.0
+    rank = int(math.ceil(pct / 100.0 * len(samples))) - 1
+    return samples[min(max(rank, 0), len(samples) - 1)]
+
+
+class Stats(object):
+    """Accumulates the latency samples and errors of a benchmark run, per
+    Client method."""
+    def __init__(self):
+        self.latencies = collections.defaultdict(list)
+        self.errors = collections.defaultdict(int)
+        self.elapsed = 0.0
+
+    def add(self, samples):
+        """Adds samples in the form of (method name, latency, succeeded)."""
+        for name, latency, ok in samples:
+            self.latencies[name].append(latency)
+            if not ok:
+                self.errors[name] += 1
+
+    def summary(self):
+        """Returns a list of rows (method, calls, throughput, p50, p95, p99,
+        error rate) with the latencies in milliseconds, the last row being
+        the total over all methods."""
+        rows = []
+        everything = []
+        for name in sorted(self.latencies):
+            samples = sorted(self.latencies[name])
+            everything.extend(samples)
+            rows.append(self._row(name, samples, self.errors[name]))
+        everything.sort()
+        rows.append(self._row("total", everything, sum(self.errors.values())))
+        return rows
+
+    def _row(self, name, samples, errors):
+        count = len(samples)
+        rate = count / self.elapsed if self.elapsed else 0.0
+        return (name, count, rate,
+                percentile(samples, 50) * 1000,
+                percentile(samples, 95) * 1000,
+                percentile(samples, 99) * 1000,
+                float(errors) / count if count else 0.0)
+
+
+def parse_mix(text):
+    """Parses an operation mix like ``login=1,check_access=8`` into a list of
+    (operation, weight) pairs."""
+    mix = []
+    for item in text.split(","):
+        name, _, weight = item.partition("=")
+        name = name.strip()
+        if name not in OPERATIONS:
+            raise argparse.ArgumentTypeError(
+                "Unknown operation %r, choose from %s" % (
+                    name, ", ".join(OPERATIONS)))
+        mix.append((name, float(weight or 1)))
+    return mix
+
+
+def _choose(mix, rng):
+    total = sum(weight for _, weight in mix)
+    point = rng.uniform(0, total)
+    for name, weight in mix:
+        point -= weight
+        if point <= 0:
+            return name
+    return mix[-1][0]
+
+
+def run_worker(spec):
+    """Runs the operations of one worker and returns its samples. This is a
+    module level function so that it can be used by a process pool.
+
+    Args:
+        spec (dict): with the keys ``config``, ``mix``, ``operations`` and
+            ``seed``
+
+    Returns:
+        list: tuples of (method name, latency in seconds, succeeded)
+    """
+    client = Client(spec["config"])
+    rng = random.Random(spec["seed"])
+    samples = []
+
+    def timed(method, *args):
+        start = time.time()
+        try:
+            result = method(*args)
+        except Exception:
+            samples.append((method.__name__, time.time() - start, False))
+            raise
+        samples.append((method.__name__, time.time() - start, True))
+        return result
+
+    for _ in xrange(spec["operations"]):
+        try:
+            OPERATIONS[_choose(spec["mix"], rng)](client, timed)
+        except Exception:
+            pass
+    return samples
+
+
+def run(config, mix, workers=4, operations=1000, mode="threads"):
+    """Runs a benchmark against the oxd described by the config file.
+
+    Args:
+        config (str): location of the Client config file
+        mix (list): list of (operation, weight) pairs
+        workers (int): number of concurrent workers
+        operations (int): total number of operations over all workers
+        mode (str): ``threads`` or ``processes``
+
+    Returns:
+        Stats: the statistics of the run
+    """
+    specs = [dict(config=config, mix=mix, seed=i,
+                  operations=operations // workers +
+                  (1 if i < operations % workers else 0))
+             for i in range(workers)]
+    stats = Stats()
+    start = time.time()
+
+    if mode == "processes":
+        pool = multiprocessing.Pool(workers)
+        try:
+            for samples in pool.map(run_worker, specs):
+                stats.add(samples)
+        finally:
+            pool.close()
+            pool.join()
+    else:
+        results = []
+        threads = [threading.Thread(target=lambda s=s: results.append(
+            run_worker(s))) for s in specs]
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join()
+        for samples in results:
+            stats.add(samples)
+
+    stats.elapsed = time.time() - start
+    return stats
+
+
+def write_config(path, host, port=None, https_extension=False,
+                 socket_path=None):
+    """Writes a minimal Client config pointing to the given oxd and returns
+    its location."""
+    parser = SafeConfigParser()
+    parser.add_section("oxd")
+    parser.set("oxd", "host", host)
+    parser.set("oxd", "id", "bench-oxd-id")
+    if https_extension:
+        parser.set("oxd", "https_extension", "true")
+    elif socket_path:
+        parser.set("oxd", "socket_path", socket_path)
+    else:
+        parser.set("oxd", "port", str(port))
+    parser.add_section("client")
+    parser.set("client", "authorization_redirect_uri",
+               "https://client.example.com/callback")
+    with open(path, "wb") as cfile:
+        parser.write(cfile)
+    return path
+
+
+def format_report(label, stats):
+    lines = ["== %s: %d calls in %.2fs" % (
+        label, sum(len(s) for s in stats.latencies.values()), stats.elapsed),
+        "%-28s %8s %10s %9s %9s %9s %7s" % (
+            "method", "calls", "calls/s", "p50 ms", "p95 ms", "p99 ms",
+            "errors")]
+    for row in stats.summary():
+        lines.append("%-28s %8d %10.1f %9.2f %9.2f %9.2f %6.2f%%" % (
+            row[:6] + (row[6] * 100,)))
+    return "\n".join(lines)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(
+        prog="oxdpython-bench",
+        description="Benchmark oxd-server and oxd-https-extension through the "
+                    "oxdpython Client.")
+    parser.add_argument("--config", action="append", default=[],
+                        help="Client config file of the oxd to benchmark. May "
+                             "be repeated. The local stand-in servers are "
+                             "used when none is given.")
+    parser.add_argument("--messenger", action="append",
+                        choices=["socket", "unix", "https"],
+                        help="messenger types to benchmark against the "
+                             "stand-in servers, default socket and https")
+    parser.add_argument("--mix", type=parse_mix,
+                        default=parse_mix("login=1,check_access=8,"
+                                          "introspection=4"),
+                        help="weighted operations, e.g. login=1,"
+                             "check_access=8. Available: %s" %
+                             ", ".join(OPERATIONS))
+    parser.add_argument("-w", "--workers", type=int, default=4)
+    parser.add_argument("-n", "--operations", type=int, default=1000)
+    parser.add_argument("--mode", choices=["threads", "processes"],
+                        default="threads")
+    parser.add_argument("--latency", type=float, default=0.0,
+                        help="latency in ms added by the stand-in servers")
+    args = parser.parse_args(argv)
+
+    if args.config:
+        for config in args.config:
+            stats = run(config, args.mix, args.workers, args.operations,
+                        args.mode)
+            print format_report(config, stats)
+        return 0
+
+    tmpdir = tempfile.mkdtemp(prefix="oxdpython-bench-")
+    try:
+        for kind in args.messenger or ["socket", "https"]:
+            if kind == "socket":
+                server = FakeOxdServer(latency=args.latency / 1000.0)
+            elif kind == "unix":
+                server = FakeOxdUnixServer(latency=args.latency / 1000.0)
+            else:
+                server = FakeHttpsExtension(latency=args.latency / 1000.0)
+            with server:
+                config = os.path.join(tmpdir, "%s.cfg" % kind)
+                if kind == "socket":
+                    write_config(config, server.host, server.port)
+                elif kind == "unix":
+                    write_config(config, "localhost", socket_path=server.path)
+                else:
+                    write_config(config, server.url, https_extension=True)
+                stats = run(config, args.mix, args.workers, args.operations,
+                            args.mode)
+            print format_report("%s (stand-in)" % kind, stats)
+    finally:
+        shutil.rmtree(tmpdir)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
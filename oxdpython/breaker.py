@@ -0,0 +1,195 @@
+"""Circuit breaker for failing fast while oxd is unavailable.
+
+The breaker watches the outcome of the most recent requests. While it is
+*closed* the requests pass through. When the share of failed requests, or the
+share of requests slower than a threshold, grows beyond the configured rate,
+the breaker *opens* and requests fail at once with ``CircuitOpenError``
+instead of waiting on an unresponsive oxd. After the reset timeout the breaker
+turns *half-open* and lets a few trial requests through. If they succeed the
+breaker closes again, otherwise it goes back to open.
+
+Only transport failures count as failures: connection errors and timeouts.
+An error response from oxd means that oxd is up and answering, including an
+HTTP error status of the oxd-https-extension.
+
+Example::
+
+    breaker = CircuitBreaker(error_rate=0.5, slow_call_duration=1.0)
+    breaker.add_listener(lambda b, old, new: log.warning("%s -> %s", old, new))
+    client.msgr = CircuitBreakerMessenger(client.msgr, breaker)
+"""
+import collections
+import logging
+import threading
+import time
+import urllib2
+
+from .exceptions import CircuitOpenError, OxdTimeoutError
+from .messenger import WrappedMessenger
+
+logger = logging.getLogger(__name__)
+
+CLOSED = "closed"
+OPEN = "open"
+HALF_OPEN = "half_open"
+
+
+class CircuitBreaker(object):
+    """Tracks the health of oxd from the outcome of requests.
+
+    Args:
+        error_rate (float, optional): the share of failed requests in the
+            window at which the breaker opens. Default 0.5.
+        slow_call_duration (float, optional): seconds after which a request
+            counts as slow. Default is no latency threshold.
+        slow_call_rate (float, optional): the share of slow requests in the
+            window at which the breaker opens. Default 0.5.
+        window_size (int, optional): the number of most recent requests
+            considered. Default 20.
+        minimum_calls (int, optional): the number of requests in the window
+            needed before the breaker may open. Default 10.
+        reset_timeout (float, optional): seconds the breaker stays open
+            before letting trial requests through. Default 30.
+        half_open_calls (int, optional): the number of trial requests, all of
+            which must succeed to close the breaker. Default 1.
+        name (str, optional): a name used in logs and errors
+    """
+    failures = (IOError, OxdTimeoutError)
+    #: the subclasses of failures which are answers of oxd
+    not_failures = (urllib2.HTTPError,)
+
+    def __init__(self, error_rate=0.5, slow_call_duration=None,
+                 slow_call_rate=0.5, window_size=20, minimum_calls=10,
+                 reset_timeout=30.0, half_open_calls=1, name="oxd"):
+        self.error_rate = error_rate
+        self.slow_call_duration = slow_call_duration
+        self.slow_call_rate = slow_call_rate
+        self.minimum_calls = minimum_calls
+        self.reset_timeout = reset_timeout
+        self.half_open_calls = half_open_calls
+        self.name = name
+        self.state = CLOSED
+        self.opened_at = None
+        self._outcomes = collections.deque(maxlen=window_size)
+        self._trials = 0
+        self._trial_successes = 0
+        self._listeners = []
+        self._lock = threading.Lock()
+
+    def add_listener(self, listener):
+        """Registers a callable receiving (breaker, old state, new state) on
+        every state transition."""
+        self._listeners.append(listener)
+
+    def _transition(self, state):
+        """Changes the state, the lock must be held. Returns the (old, new)
+        pair for the listeners."""
+        old, self.state = self.state, state
+        self._outcomes.clear()
+        self._trials = self._trial_successes = 0
+        self.opened_at = time.time() if state == OPEN else None
+        logger.warning("Circuit breaker %s: %s -> %s", self.name, old, state)
+        return old, state
+
+    def _notify(self, change):
+        if change:
+            for listener in self._listeners:
+                try:
+                    listener(self, *change)
+                except Exception:
+                    logger.exception("Circuit breaker listener failed")
+
+    def before_call(self):
+        """Lets a request through or raises ``CircuitOpenError``."""
+        change = None
+        allowed = True
+        with self._lock:
+            if self.state == OPEN:
+                if time.time() - self.opened_at < self.reset_timeout:
+                    allowed = False
+                else:
+                    change = self._transition(HALF_OPEN)
+            if self.state == HALF_OPEN:
+                if self._trials >= self.half_open_calls:
+                    allowed = False
+                else:
+                    self._trials += 1
+            state = self.state
+        self._notify(change)
+        if not allowed:
+            raise CircuitOpenError("Circuit breaker %s is %s" % (self.name,
+                                                                 state))
+
+    def after_call(self, failed, elapsed):
+        """Records the outcome of a request let through by ``before_call``.
+
+        Args:
+            failed (bool): whether the request failed in transport
+            elapsed (float): the seconds the request took
+        """
+        slow = self.slow_call_duration is not None and \
+            elapsed > self.slow_call_duration
+        change = None
+        with self._lock:
+            if self.state == HALF_OPEN:
+                if failed or slow:
+                    change = self._transition(OPEN)
+                else:
+                    self._trial_successes += 1
+                    if self._trial_successes >= self.half_open_calls:
+                        change = self._transition(CLOSED)
+            elif self.state == CLOSED:
+                self._outcomes.append((failed, slow))
+                if len(self._outcomes) >= self.minimum_calls and \
+                        self._tripped():
+                    change = self._transition(OPEN)
+        self._notify(change)
+
+    def _tripped(self):
+        count = float(len(self._outcomes))
+        failures = sum(1 for failed, _ in self._outcomes if failed)
+        slow = sum(1 for _, s in self._outcomes if s)
+        return failures / count >= self.error_rate or \
+            (self.slow_call_duration is not None and
+             slow / count >= self.slow_call_rate)
+
+    def call(self, func):
+        """Calls func through the breaker.
+
+        Raises:
+            CircuitOpenError: when the breaker does not let the call through
+        """
+        self.before_call()
+        start = time.time()
+        try:
+            result = func()
+        except self.not_failures:
+            self.after_call(False, time.time() - start)
+            raise
+        except self.failures:
+            self.after_call(True, time.time() - start)
+            raise
+        except Exception:
+            self.after_call(False, time.time() - start)
+            raise
+        self.after_call(False, time.time() - start)
+        return result
+
+    def __repr__(self):
+        return "<CircuitBreaker %s %s>" % (self.name, self.state)
+
+
+class CircuitBreakerMessenger(WrappedMessenger):
+    """Messenger sending the requests through a circuit breaker.
+
+    Args:
+        msgr (Messenger): the messenger doing the actual communication
+        breaker (CircuitBreaker, optional): default is a breaker with the
+            default settings
+    """
+    def __init__(self, msgr, breaker=None):
+        WrappedMessenger.__init__(self, msgr)
+        self.breaker = breaker or CircuitBreaker(name=str(msgr))
+
+    def request(self, command, **kwargs):
+        return self.breaker.call(lambda: self.msgr.request(command, **kwargs))
@@ -0,0 +1,102 @@
+"""A thread-safe cache with a size limit and expiring entries.
+
+The cache keeps at most ``maxsize`` entries and evicts the least recently used
+ones first. Entries expire ``ttl`` seconds after they were set, unless a
+different ttl is given for the entry. It is shared between the clients of a
+:class:`~oxdpython.registry.ClientRegistry`, so the keys should include what
+distinguishes the sites, like the ``oxd_id``.
+
+Example::
+
+    cache = TTLCache(maxsize=10000, ttl=60)
+    cache.set(("introspect_rpt", oxd_id, rpt), data, ttl=data["exp"] - now)
+    data = cache.get(("introspect_rpt", oxd_id, rpt))
+"""
+import collections
+import threading
+import time
+
+_MISSING = object()
+
+
+class TTLCache(object):
+    """A least recently used cache whose entries expire.
+
+    Args:
+        maxsize (int, optional): the maximum number of entries. Default 1024.
+        ttl (float, optional): the seconds an entry stays valid, None keeps
+            the entries until they are evicted. Default None.
+        on_evict (callable, optional): called with (key, value) for every
+            entry evicted because the cache is full
+    """
+    def __init__(self, maxsize=1024, ttl=None, on_evict=None):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.on_evict = on_evict
+        self.hits = 0
+        self.misses = 0
+        self._entries = collections.OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key, default=None):
+        """Returns the value of the key, or default when it is missing or
+        expired."""
+        with self._lock:
+            entry = self._entries.pop(key, _MISSING)
+            if entry is not _MISSING:
+                value, expires = entry
+                if expires is None or expires > time.time():
+                    self._entries[key] = entry
+                    self.hits += 1
+                    return value
+            self.misses += 1
+            return default
+
+    def set(self, key, value, ttl=_MISSING):
+        """Stores the value of the key.
+
+        Args:
+            key: a hashable key
+            value: the value
+            ttl (float, optional): the seconds the entry stays valid instead
+                of the ttl of the cache
+        """
+        ttl = self.ttl if ttl is _MISSING else ttl
+        expires = None if ttl is None else time.time() + ttl
+        evicted = []
+        with self._lock:
+            self._entries.pop(key, None)
+            self._entries[key] = (value, expires)
+            while len(self._entries) > self.maxsize:
+                old_key, (old_value, _) = self._entries.popitem(last=False)
+                evicted.append((old_key, old_value))
+        if self.on_evict:
+            for old_key, old_value in evicted:
+                self.on_evict(old_key, old_value)
+
+    def pop(self, key, default=None):
+        """Removes the key and returns its value, or default."""
+        with self._lock:
+            entry = self._entries.pop(key, _MISSING)
+        return default if entry is _MISSING else entry[0]
+
+    def expire(self):
+        """Removes the expired entries and returns their (key, value)
+        pairs."""
+        now = time.time()
+        with self._lock:
+            expired = [(k, v) for k, (v, e) in self._entries.items()
+                       if e is not None and e <= now]
+            for key, _ in expired:
+                del self._entries[key]
+        return expired
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def __contains__(self, key):
+        return self.get(key, _MISSING) is not _MISSING
+
+    def __len__(self):
+        return len(self._entries)
@@ -1,39 +1,100 @@
 import logging
+import threading
+import time
 
+from collections import namedtuple, OrderedDict
 from threading import Timer
 
+from . import deadline
+from . import forking
+from .breaker import CircuitBreaker, CircuitBreakerMessenger
+from .cache import TTLCache
+from .codec import get_codec
 from .configurer import Configurer
+from .executor import Executor
+from .hedging import HedgePolicy
 from .messenger import Messenger
+from .retry import RetryPolicy
+from .sharding import ShardedMessenger
 from .exceptions import OxdServerError, NeedInfoError, InvalidTicketError, \
     InvalidRequestError
 
 logger = logging.getLogger(__name__)
 
+#: The credentials of the site, replaced as a whole when they change so that
+#: a thread never sees the client id of one registration with the secret of
+#: another
+Credentials = namedtuple("Credentials", ["oxd_id", "client_id",
+                                         "client_secret"])
+
+#: The tokens and the claims about the user of a completed login
+Login = namedtuple("Login", ["tokens", "claims"])
+
+
+def _pool_size(msgr):
+    """Returns the number of connections the messenger may open at once."""
+    if hasattr(msgr, "endpoints"):
+        return sum(_pool_size(e.msgr) for e in msgr.endpoints)
+    if hasattr(msgr, "messengers"):
+        return sum(_pool_size(m) for m in msgr.messengers.values())
+    if hasattr(msgr, "msgr"):
+        return _pool_size(msgr.msgr)
+    return getattr(msgr, "pool_size", 4)
+
 
 class Client:
     """Client is the main class that carries out the task of talking with the
     oxd server. The oxd commands are provided as class methods that are called
     to send the command to the oxd-server or the oxd-https-extension
 
+    A Client may be shared by the threads of a server. The commands read the
+    site credentials without locking from immutable snapshots, the
+    registration runs at most once at a time and concurrent commands are sent
+    over separate connections.
+
     Args:
         config_location (string): The complete path of the location
             of the config file. Sample config at
             (https://github.com/GluuFederation/oxd-python/blob/master/sample.cfg)
     """
 
-    def __init__(self, config_location):
+    def __init__(self, config_location, msgr=None, shards=None, cache=None,
+                 scheduler=None, executor=None):
         """Constructor of class Client
 
+        Args:
+            msgr (Messenger, optional): a messenger shared with other clients,
+                instead of one created from the [oxd] section of the config
+            shards (ShardedMessenger, optional): the sharded messenger behind
+                a shared msgr
+            cache (TTLCache, optional): a cache shared with other clients,
+                default is a cache of 1024 entries for this client
+            scheduler (Scheduler, optional): runs the token refreshes instead
+                of a thread per client
+            executor (Executor, optional): runs the calls of :meth:`submit`
+                and :meth:`map`, default is an executor created on first use
+                with a thread per connection of the messenger
         """
         self.oxd_id = None
-        self.config = Configurer(config_location)
-        if self.config.get("oxd", "https_extension"):
-            logger.info("https_extenstion is enabled.")
-            self.msgr = Messenger.create(self.config.get("oxd", "host"),
-                                         https_extension=True)
+        if isinstance(config_location, Configurer):
+            self.config = config_location
         else:
-            self.msgr = Messenger.create(self.config.get("oxd", "host"),
-                                         int(self.config.get("oxd", "port")))
+            self.config = Configurer(config_location)
+        self.cache = cache if cache is not None else TTLCache()
+        self.scheduler = scheduler
+        self._executor = executor
+        self._own_executor = executor is None
+        self._refresh_task = None
+        self._lock = threading.RLock()
+        forking.register(self)
+        if msgr is None:
+            msgr, shards = self._create_messenger()
+        self.msgr = msgr
+        self.shards = shards
+        shard = self.config.get("oxd", "shard", None)
+        if self.shards is not None and shard and \
+                self.config.get("oxd", "id", None):
+            self.shards.pin(self.config.get("oxd", "id"), shard)
 
         if self.config.get("client", "protection_access_token"):
             logger.info("Protection Token available in config. Setting it to "
@@ -43,6 +104,21 @@ class Client:
 
         self.authorization_redirect_uri = self.config.get(
             "client", "authorization_redirect_uri")
+        # seconds a granted access decision is served from the cache
+        self.access_decision_ttl = self._float(
+            "client", "access_decision_ttl") or 60
+        # seconds the information about an active token is cached at most
+        self.introspection_ttl = self._float(
+            "client", "introspection_ttl") or 60
+        # seconds the claims of an access token are cached at most
+        self.user_info_ttl = self._float("client", "user_info_ttl") or 60
+        # claims the id_token must carry for a login to skip get_user_info
+        self.login_claims = [c.strip() for c in (self.config.get(
+            "client", "login_claims", None) or "").split(",") if c.strip()]
+        self.credentials = Credentials(
+            self.config.get("oxd", "id", None),
+            self.config.get("client", "client_id", None),
+            self.config.get("client", "client_secret", None))
         if self.config.get("oxd", "id"):
             self.oxd_id = self.config.get("oxd", "id")
 
@@ -72,6 +148,206 @@ class Client:
                                 "claims_redirect_uri",
                                 ]
 
+    def _create_messenger(self):
+        """Creates the messenger from the [oxd] section of the config.
+
+        Returns:
+            tuple: the messenger and the sharded messenger, if sharding
+        """
+        options = dict(timeout=self._float("oxd", "timeout"),
+                       connect_timeout=self._float("oxd", "connect_timeout"))
+        # the optional keys are read quietly when they are not set
+        optional = dict((key, self.config.get("oxd", key, None)) for key in [
+            "retries", "pool_size", "balancing", "json_codec",
+            "max_response_size", "compress_threshold", "socket_path"])
+        if optional["retries"]:
+            options["retry_policy"] = RetryPolicy(
+                retries=int(optional["retries"]))
+        if optional["pool_size"]:
+            options["pool_size"] = int(optional["pool_size"])
+        if optional["balancing"]:
+            options["strategy"] = optional["balancing"]
+        if optional["json_codec"]:
+            options["codec"] = get_codec(optional["json_codec"])
+        if optional["max_response_size"]:
+            options["max_response_size"] = int(optional["max_response_size"])
+        if optional["compress_threshold"]:
+            options["compress_threshold"] = int(
+                optional["compress_threshold"])
+        if self._bool("oxd", "incremental_decoding"):
+            options["incremental"] = True
+        if optional["socket_path"]:
+            options["socket_path"] = optional["socket_path"]
+        hosts = self.config.get("oxd", "host") or "localhost"
+        hosts = [h.strip() for h in hosts.split(",")]
+        if self.config.get("oxd", "https_extension"):
+            logger.info("https_extenstion is enabled.")
+            create = lambda host: Messenger.create(
+                host, https_extension=True, **options)
+        else:
+            port = int(self.config.get("oxd", "port") or 8099)
+            create = lambda host: Messenger.create(host, port, **options)
+
+        if self._bool("oxd", "sharding"):
+            if "socket_path" in options and len(hosts) > 1:
+                raise ValueError("socket_path %r cannot be used with the "
+                                 "sharding over several hosts" %
+                                 options["socket_path"])
+            shards = ShardedMessenger(dict((h, create(h)) for h in hosts))
+            msgr = shards
+        else:
+            shards = None
+            msgr = create(hosts)
+
+        if self._bool("oxd", "hedging") and \
+                hasattr(msgr, "hedge_policy"):
+            policy = HedgePolicy()
+            for key in ["percentile", "rate"]:
+                value = self._float("oxd", "hedge_" + key)
+                if value is not None:
+                    setattr(policy, key, value)
+            msgr.hedge_policy = policy
+
+        if self._bool("oxd", "circuit_breaker"):
+            breaker = CircuitBreaker(name=str(msgr))
+            for key in ["error_rate", "slow_call_duration", "reset_timeout"]:
+                value = self._float("oxd", "circuit_breaker_" + key)
+                if value is not None:
+                    setattr(breaker, key, value)
+            msgr = CircuitBreakerMessenger(msgr, breaker)
+        return msgr, shards
+
+    def _float(self, section, key):
+        """Returns the config value as a float or None when it is not set"""
+        value = self.config.get(section, key, None)
+        return float(value) if value else None
+
+    def _bool(self, section, key):
+        """Returns whether the config value is set to true, yes, on or 1"""
+        value = self.config.get(section, key, None)
+        return bool(value) and value.strip().lower() in ("true", "yes", "on",
+                                                          "1")
+
+    def _store_shard(self):
+        """Stores the oxd-server holding the site when sharding, so that the
+        requests of the site keep going to it after a restart."""
+        if self.shards is not None:
+            self.config.set("oxd", "shard", self.shards.node_of(self.oxd_id))
+
+    def deadline(self, timeout):
+        """Sets a deadline for all the commands sent from the current thread
+        within the ``with`` block. It overrides the timeout configured in the
+        config file when it is shorter.
+
+        Args:
+            timeout (float): seconds allowed for the commands
+
+        Returns:
+            a context manager
+
+        Example::
+
+            with client.deadline(0.25):
+                client.uma_rs_check_access(rpt, '/photoz', 'GET')
+
+        Raises:
+            OxdTimeoutError: from the commands that did not complete in time
+        """
+        return deadline.scope(timeout)
+
+    @property
+    def executor(self):
+        """The :class:`~oxdpython.executor.Executor` running the calls of
+        :meth:`submit` and :meth:`map`."""
+        forking.check()
+        with self._lock:
+            if self._executor is None:
+                self._executor = Executor(_pool_size(self.msgr))
+            return self._executor
+
+    def submit(self, method, *args, **kwargs):
+        """Calls a method of the client in a thread of the executor, so that
+        the caller can send other commands meanwhile. The deadline of the
+        current thread applies to the call.
+
+        Args:
+            method (str): the name of the method, like
+                ``introspect_access_token``
+            *args: the arguments of the method
+            **kwargs: the keyword arguments of the method
+
+        Returns:
+            Future: the result of the method
+
+        Example::
+
+            with client.deadline(0.5):
+                futures = [client.submit("uma_rs_check_access", rpt, path,
+                                         "GET") for path in paths]
+            granted = [f.result()["access"] == "granted" for f in futures]
+        """
+        return self.executor.submit(getattr(self, method), *args, **kwargs)
+
+    def map(self, method, *iterables, **kwargs):
+        """Calls a method of the client concurrently with the arguments taken
+        from each of the iterables in turn.
+
+        Args:
+            method (str): the name of the method
+            *iterables: the arguments of the calls
+            timeout (float, optional): seconds allowed for all the calls
+
+        Returns:
+            iterator: the results in the order of the arguments
+
+        Example::
+
+            for data in client.map("introspect_access_token", tokens,
+                                   timeout=1):
+                print data["active"]
+        """
+        return self.executor.map(getattr(self, method), *iterables, **kwargs)
+
+    def _schedule_refresh(self, delay, args):
+        """Schedules get_client_token with args, replacing the refresh set up
+        by an earlier call. The lock must be held."""
+        self._cancel_refresh()
+        self._refresh_due = time.time() + delay
+        self._refresh_args = args
+        if self.scheduler is not None:
+            self._refresh_task = self.scheduler.schedule(
+                delay, self.get_client_token, *args)
+        else:
+            self._refresh_task = Timer(delay, self.get_client_token, args)
+            self._refresh_task.start()
+
+    def _after_fork(self):
+        """Sets up the token refresh again in a forked process, as the timer
+        thread of the parent does not exist in the child. A scheduler restarts
+        its own thread."""
+        self._lock = threading.RLock()
+        if self._refresh_task is not None and self.scheduler is None:
+            self._schedule_refresh(max(0, self._refresh_due - time.time()),
+                                   self._refresh_args)
+
+    def _cancel_refresh(self):
+        """Cancels the scheduled token refresh, if any. The lock must be
+        held."""
+        if self._refresh_task is not None:
+            self._refresh_task.cancel()
+            self._refresh_task = None
+
+    def close(self):
+        """Stops the automatic refresh of the protection access token and the
+        threads of the executor created by the client."""
+        forking.check()
+        with self._lock:
+            self._cancel_refresh()
+            executor = self._executor if self._own_executor else None
+            self._executor = None
+        if executor is not None:
+            executor.shutdown(wait=False)
+
     def register_site(self):
         """Function to register the site and generate a unique ID for the site
 
@@ -82,36 +358,44 @@ class Client:
         Raises:
             OxdServerError: If the site registration fails.
         """
-        if self.oxd_id:
-            logger.info('Client is already registered. ID: %s', self.oxd_id)
-            return self.oxd_id
-
-        # add required params for the command
-        params = {
-            "authorization_redirect_uri": self.authorization_redirect_uri,
-			"oxd_rp_programming_language": "python",
-            }
+        forking.check()
+        with self._lock:
+            if self.oxd_id:
+                logger.info('Client is already registered. ID: %s',
+                            self.oxd_id)
+                return self.oxd_id
+
+            # add required params for the command
+            params = {
+                "authorization_redirect_uri": self.authorization_redirect_uri,
+                "oxd_rp_programming_language": "python",
+                }
 
-        # add other optional params if they exist in config
-        for op in self.opt_params:
-            if self.config.get("client", op):
-                params[op] = self.config.get("client", op)
+            # add other optional params if they exist in config
+            for op in self.opt_params:
+                if self.config.get("client", op):
+                    params[op] = self.config.get("client", op)
 
-        for olp in self.opt_list_params:
-            if self.config.get("client", olp):
-                params[olp] = self.config.get("client", olp).split(",")
+            for olp in self.opt_list_params:
+                if self.config.get("client", olp):
+                    params[olp] = self.config.get("client", olp).split(",")
 
-        logger.debug("Sending command `register_site` with params %s", params)
-        response = self.msgr.request("register_site", **params)
-        logger.debug("Received response: %s", response)
+            logger.debug("Sending command `register_site` with params %s",
+                         params)
+            response = self.msgr.request("register_site", **params)
+            logger.debug("Received response: %s", response)
 
-        if response['status'] == 'error':
-            raise OxdServerError(response['data'])
+            if response['status'] == 'error':
+                raise OxdServerError(response['data'])
 
-        self.oxd_id = response["data"]["oxd_id"]
-        self.config.set("oxd", "id", self.oxd_id)
-        logger.info("Site registration successful. Oxd ID: %s", self.oxd_id)
-        return self.oxd_id
+            self.oxd_id = response["data"]["oxd_id"]
+            self.credentials = self.credentials._replace(oxd_id=self.oxd_id)
+            with self.config.deferred():
+                self.config.set("oxd", "id", self.oxd_id)
+                self._store_shard()
+            logger.info("Site registration successful. Oxd ID: %s",
+                        self.oxd_id)
+            return self.oxd_id
 
     def get_authorization_url(self, acr_values=None, prompt=None, scope=None,
                               custom_params=None):
@@ -243,7 +527,7 @@ class Client:
             raise OxdServerError(response['data'])
         return response['data']
 
-    def get_user_info(self, access_token):
+    def get_user_info(self, access_token, cached=False):
         """Function to get the information about the user using the access code
         obtained from the OP
 
@@ -254,6 +538,9 @@ class Client:
         Args:
             access_token (string): access token from the get_tokens_by_code
                                     function
+            cached (bool, optional): look the claims up in the cache of the
+                client first, and cache them for user_info_ttl seconds.
+                Default False.
 
         Returns:
             dict: The user data claims that are returned by the OP in format
@@ -274,6 +561,12 @@ class Client:
             OxdServerError: If the param access_token is empty OR if the oxd
                 Server returns an error.
         """
+        if cached and self.cache is not None:
+            claims = self.cache.get(("get_user_info", self.oxd_id,
+                                     access_token))
+            if claims is not None:
+                return claims
+
         params = dict(oxd_id=self.oxd_id, access_token=access_token)
         params["access_token"] = access_token
         logger.debug("Sending command `get_user_info` with params %s",
@@ -283,8 +576,71 @@ class Client:
 
         if response['status'] == 'error':
             raise OxdServerError(response['data'])
+        if cached:
+            self._cache_user_info(access_token, response['data']['claims'])
         return response['data']['claims']
 
+    def complete_login(self, code, state, required_claims=None,
+                       cache_claims=False):
+        """Completes the login of the user on the callback from the OP,
+        returning the tokens and the claims about the user together.
+
+        oxd validates the id_token obtained with the code, so its claims are
+        trusted. When they include all the required claims, the login takes
+        a single round trip to oxd; otherwise the claims are completed with
+        ``get_user_info`` over a pooled connection.
+
+        Args:
+            code (string): code, parse from the callback URL querystring
+            state (string): state value parsed from the callback URL
+            required_claims (list, optional): the claims the application
+                needs, default is the ``login_claims`` of the [client]
+                section. When there are none, ``get_user_info`` is always
+                called.
+            cache_claims (bool, optional): cache the claims for the access
+                token, for ``get_user_info(access_token, cached=True)``, at
+                most until the token expires. Default False.
+
+        Returns:
+            Login: the tokens of :meth:`get_tokens_by_code` and the claims,
+            those of the id_token updated with those of the user info. The
+            value of each claim is a list, as returned by
+            :meth:`get_user_info`.
+
+        Raises:
+            OxdServerError: If oxd server throws an error
+        """
+        tokens = self.get_tokens_by_code(code, state)
+        if required_claims is None:
+            required_claims = self.login_claims
+        # in the shape of the user info, a list of values for each claim
+        claims = dict((name, value if isinstance(value, list) else [value])
+                      for name, value in
+                      (tokens.get("id_token_claims") or {}).items())
+        if not required_claims or \
+                not all(claims.get(claim) for claim in required_claims):
+            claims.update(self.get_user_info(tokens["access_token"]))
+        else:
+            logger.debug("Login claims taken from the id_token")
+        if cache_claims:
+            self._cache_user_info(tokens["access_token"], claims,
+                                  tokens.get("expires_in"))
+        return Login(tokens, claims)
+
+    def _cache_user_info(self, access_token, claims, expires_in=None):
+        """Caches the claims of the access token for at most user_info_ttl
+        seconds, and not beyond the expiry of the token."""
+        if self.cache is None:
+            return
+        ttl = self.user_info_ttl
+        try:
+            ttl = min(ttl, int(expires_in))
+        except (TypeError, ValueError):
+            pass
+        if ttl > 0:
+            self.cache.set(("get_user_info", self.oxd_id, access_token),
+                           claims, ttl=ttl)
+
     def get_logout_uri(self, id_token_hint=None, post_logout_redirect_uri=None,
                        state=None, session_state=None):
         """Function to logout the user.
@@ -437,6 +793,91 @@ class Client:
                 raise OxdServerError(response['data'])
         return response['data']
 
+    def uma_rs_check_access_many(self, rpt, resources):
+        """Checks the access of an RPT to many resources at once, like the
+        links of a page. Each distinct (path, http_method) pair is checked
+        once, the granted ones are looked up in the cache of the client first
+        and the others are sent concurrently. The granted decisions are cached
+        for access_decision_ttl seconds, and no longer than the RPT is active,
+        which is learnt from its introspection.
+
+        Args:
+            rpt (string): RPT or blank value if absent
+            resources (iterable): (path, http_method) pairs
+
+        Returns:
+            dict: the access information of :meth:`uma_rs_check_access` by
+            (path, http_method) pair
+
+        Raises:
+            ``oxdpython.exceptions.InvalidRequestError`` if a resource is not
+                protected
+
+        Example::
+
+            access = client.uma_rs_check_access_many(
+                rpt, [("/photoz", "GET"), ("/photoz", "POST")])
+            if access[("/photoz", "POST")]["access"] == "granted":
+                ...
+        """
+        pairs = list(OrderedDict.fromkeys(tuple(r) for r in resources))
+        decisions = {}
+        misses = []
+        for pair in pairs:
+            decision = None
+            if self.cache is not None:
+                decision = self.cache.get(self._access_key(rpt, pair))
+            if decision is not None:
+                decisions[pair] = decision
+            else:
+                misses.append(pair)
+
+        # introspected meanwhile, to cache the decisions until it expires
+        expires = None
+        if misses and rpt and self.cache is not None:
+            expires = self.submit("_rpt_expires", rpt)
+
+        if len(misses) == 1:
+            results = [self.uma_rs_check_access(rpt, *misses[0])]
+        else:
+            futures = [self.submit("uma_rs_check_access", rpt, *pair)
+                       for pair in misses]
+            results = [future.result() for future in futures]
+
+        ttl = self.access_decision_ttl
+        if expires is not None:
+            ttl = min(ttl, expires.result() - time.time())
+        for pair, decision in zip(misses, results):
+            decisions[pair] = decision
+            # a denial may carry a ticket for a single permission request
+            if ttl > 0 and decision.get("access") == "granted":
+                self.cache.set(self._access_key(rpt, pair), decision, ttl=ttl)
+        return decisions
+
+    def _access_key(self, rpt, pair):
+        return ("uma_rs_check_access", self.oxd_id, rpt) + pair
+
+    def _rpt_expires(self, rpt):
+        """Returns the time the RPT expires at, from its introspection, which
+        is cached like the ones of :meth:`introspect_rpt_many`. It is now for
+        an inactive RPT or a failed introspection, and never for an RPT
+        without ``exp``."""
+        data = self.cache.get(("introspect_rpt", self.oxd_id, rpt))
+        if data is None:
+            try:
+                data = self.introspect_rpt(rpt)
+            except Exception as e:
+                logger.debug("Introspection of the RPT failed, the access "
+                             "decisions are not cached: %s", e)
+                return time.time()
+            self._cache_introspection("introspect_rpt", rpt, data)
+        if not data.get("active"):
+            return time.time()
+        try:
+            return int(data["exp"])
+        except (KeyError, TypeError, ValueError):
+            return float("inf")
+
     def uma_rp_get_rpt(self, ticket, claim_token=None, claim_token_format=None,
                        pct=None, rpt=None, scope=None, state=None):
         """Function to be used by a UMA Requesting Party to get RPT token.
@@ -584,44 +1025,55 @@ class Client:
                 }
 
         """
-        # add required params for the command
-        params = {
-            "authorization_redirect_uri": self.authorization_redirect_uri,
-			"oxd_rp_programming_language": "python",
-            }
+        forking.check()
+        with self._lock:
+            # add required params for the command
+            params = {
+                "authorization_redirect_uri": self.authorization_redirect_uri,
+                "oxd_rp_programming_language": "python",
+                }
 
-        # add other optional params if they exist in config
-        for op in self.opt_params:
-            if self.config.get("client", op):
-                params[op] = self.config.get("client", op)
+            # add other optional params if they exist in config
+            for op in self.opt_params:
+                if self.config.get("client", op):
+                    params[op] = self.config.get("client", op)
 
-        for olp in self.opt_list_params:
-            if self.config.get("client", olp):
-                params[olp] = self.config.get("client", olp).split(",")
+            for olp in self.opt_list_params:
+                if self.config.get("client", olp):
+                    params[olp] = self.config.get("client", olp).split(",")
 
-        logger.debug("Sending command `setup_client` with params %s", params)
+            logger.debug("Sending command `setup_client` with params %s",
+                         params)
 
-        response = self.msgr.request("setup_client", **params)
-        logger.debug("Received response: %s", response)
+            response = self.msgr.request("setup_client", **params)
+            logger.debug("Received response: %s", response)
 
-        if response['status'] == 'error':
-            raise OxdServerError(response['data'])
-        data = response["data"]
-
-        self.oxd_id = data["oxd_id"]
-        self.config.set("oxd", "id", data["oxd_id"])
-        self.config.set("client", "client_id", data["client_id"])
-        self.config.set("client", "client_secret", data["client_secret"])
-        if data["client_registration_access_token"]:
-            self.config.set("client", "client_registration_access_token",
-                            data["client_registration_access_token"])
-        if data["client_registration_client_uri"]:
-            self.config.set("client", "client_registration_client_uri",
-                            data["client_registration_client_uri"])
-        self.config.set("client", "client_id_issued_at",
-                        str(data["client_id_issued_at"]))
-
-        return data
+            if response['status'] == 'error':
+                raise OxdServerError(response['data'])
+            data = response["data"]
+
+            self.oxd_id = data["oxd_id"]
+            self.credentials = Credentials(data["oxd_id"], data["client_id"],
+                                           data["client_secret"])
+            # written to the config file at once
+            with self.config.deferred():
+                self.config.set("oxd", "id", data["oxd_id"])
+                self._store_shard()
+                self.config.set("client", "client_id", data["client_id"])
+                self.config.set("client", "client_secret",
+                                data["client_secret"])
+                if data["client_registration_access_token"]:
+                    self.config.set("client",
+                                    "client_registration_access_token",
+                                    data["client_registration_access_token"])
+                if data["client_registration_client_uri"]:
+                    self.config.set("client",
+                                    "client_registration_client_uri",
+                                    data["client_registration_client_uri"])
+                self.config.set("client", "client_id_issued_at",
+                                str(data["client_id_issued_at"]))
+
+            return data
 
     def get_client_token(self, client_id=None, client_secret=None,
                          op_host=None, op_discovery_path=None, scope=None,
@@ -668,12 +1120,13 @@ class Client:
         if scope and isinstance(scope, list):
             params['scope'] = scope
 
-        # If client id and secret aren't passed, then just read from the config
+        # If client id and secret aren't passed, then just use the ones of the
+        # site
+        credentials = self.credentials
         if not client_id:
-            params["client_id"] = self.config.get("client", "client_id")
+            params["client_id"] = credentials.client_id
         if not client_secret:
-            params["client_secret"] = self.config.get("client",
-                                                      "client_secret")
+            params["client_secret"] = credentials.client_secret
         if not op_host:
             params["op_host"] = self.config.get("client", "op_host")
         logger.debug("Sending command `get_client_token` with params %s",
@@ -696,8 +1149,9 @@ class Client:
                     scope, auto_update]
             logger.info("Setting up a threading.Timer to get_client_token in "
                         "%s seconds", interval)
-            t = Timer(interval, self.get_client_token, args)
-            t.start()
+            forking.check()
+            with self._lock:
+                self._schedule_refresh(interval, args)
 
         return response['data']
 
@@ -808,4 +1262,78 @@ class Client:
 
         if response['status'] == 'error':
             raise OxdServerError(response['data'])
-        return response['data']
\ No newline at end of file
+        return response['data']
+
+    def introspect_access_token_many(self, access_tokens):
+        """Gives information about many access tokens, like the tokens of the
+        requests a gateway verifies in a batch. Each distinct token is
+        introspected once, active tokens are looked up in the cache of the
+        client first and the others are sent concurrently.
+
+        Args:
+            access_tokens (iterable): the access tokens
+
+        Returns:
+            list: for each of the access tokens in order, either the
+            information of :meth:`introspect_access_token` or the exception
+            raised for the token, so that one failure does not fail the batch
+
+        Example::
+
+            for token, data in zip(tokens,
+                                   client.introspect_access_token_many(tokens)):
+                if isinstance(data, Exception) or not data["active"]:
+                    reject(token)
+        """
+        return self._introspect_many("introspect_access_token", access_tokens)
+
+    def introspect_rpt_many(self, rpts):
+        """Gives information about many RPTs, like
+        :meth:`introspect_access_token_many`.
+
+        Args:
+            rpts (iterable): the RPTs
+
+        Returns:
+            list: for each of the RPTs in order, either the information of
+            :meth:`introspect_rpt` or the exception raised for the RPT
+        """
+        return self._introspect_many("introspect_rpt", rpts)
+
+    def _introspect_many(self, command, tokens):
+        tokens = list(tokens)
+        results = {}
+        misses = []
+        for token in OrderedDict.fromkeys(tokens):
+            data = None
+            if self.cache is not None:
+                data = self.cache.get((command, self.oxd_id, token))
+            if data is not None:
+                results[token] = data
+            else:
+                misses.append(token)
+
+        futures = [(token, self.submit(command, token)) for token in misses]
+        for token, future in futures:
+            try:
+                results[token] = data = future.result()
+            except Exception as e:
+                logger.debug("%s failed for one of %d tokens: %s", command,
+                             len(tokens), e)
+                results[token] = e
+                continue
+            self._cache_introspection(command, token, data)
+        return [results[token] for token in tokens]
+
+    def _cache_introspection(self, command, token, data):
+        """Caches the information about an active token until it expires,
+        for at most introspection_ttl seconds."""
+        if self.cache is None or not data.get("active"):
+            return
+        ttl = self.introspection_ttl
+        try:
+            ttl = min(ttl, int(data["exp"]) - time.time())
+        except (KeyError, TypeError, ValueError):
+            pass
+        if ttl > 0:
+            self.cache.set((command, self.oxd_id, token), data, ttl=ttl)
@@ -0,0 +1,207 @@
+"""JSON encoding of the oxd commands and responses.
+
+Every request and response passes through a codec, which turns the command
+into the bytes sent to oxd and the bytes received back into a dict. The json
+module of the standard library is always available, faster backends are used
+when they are installed, in the order of :data:`BACKENDS`::
+
+    pip install ujson
+
+A backend is chosen explicitly with the ``json_codec`` option of the [oxd]
+section of the config, or::
+
+    msgr = Messenger.create(host, port, codec=get_codec("json"))
+
+The codecs work on byte strings: :meth:`~JsonCodec.encode` returns the UTF-8
+encoded str to be put on the wire, escaping non-ASCII characters, so its
+length is the length of the frame, and :meth:`~JsonCodec.decode` parses the
+received str without decoding it to unicode first.
+
+The messengers pass the response to :meth:`~JsonCodec.load` as a file-like
+object reading it from the connection. With ijson installed and
+``incremental`` set, the response is parsed while it is read, so it is never
+held as one string next to the parsed dict, which needs about twice the memory
+of the response. Otherwise its chunks are fed to a decoder returned by
+:meth:`~JsonCodec.decoder` and decoded once the response is complete.
+"""
+import decimal
+import json
+import logging
+
+try:
+    import ijson
+except ImportError:
+    ijson = None
+    _ijson_backend = None
+else:
+    try:
+        import ijson.backends.yajl2_c as _ijson_backend
+    except ImportError:
+        _ijson_backend = ijson
+
+logger = logging.getLogger(__name__)
+
+
+class BufferedDecoder(object):
+    """Collects the chunks of a response and decodes them at the end.
+
+    Args:
+        decode (callable): decodes the joined chunks
+    """
+    def __init__(self, decode):
+        self._decode = decode
+        self._chunks = []
+
+    def feed(self, data):
+        self._chunks.append(data)
+
+    def close(self):
+        """Returns the decoded response.
+
+        Raises:
+            ValueError: when the response is not valid JSON
+        """
+        data = "".join(self._chunks)
+        self._chunks = []
+        return self._decode(data)
+
+
+def parse_incremental(stream):
+    """Returns the object of the JSON read from the file-like stream, parsed
+    with ijson while it is read. Numbers with a fraction are returned as
+    floats, like the json module does.
+
+    Raises:
+        ImportError: when ijson is not installed
+        ValueError: when the stream is not valid JSON
+    """
+    if ijson is None:
+        raise ImportError("Incremental decoding needs ijson")
+    builder = ijson.ObjectBuilder()
+    try:
+        for event, value in _ijson_backend.basic_parse(stream):
+            if event == "number" and isinstance(value, decimal.Decimal):
+                value = float(value)
+            builder.event(event, value)
+    except ijson.JSONError as e:
+        raise ValueError("Invalid JSON: %s" % e)
+    if not hasattr(builder, "value"):
+        raise ValueError("Invalid JSON: no document")
+    return builder.value
+
+
+class JsonCodec(object):
+    """Codec using the json module of the standard library, with its C
+    speedups. The encoder and decoder are created once instead of on every
+    call, and separators without spaces keep the frames short."""
+    name = "json"
+
+    def __init__(self):
+        self._encoder = json.JSONEncoder(separators=(",", ":"))
+        self._decoder = json.JSONDecoder()
+
+    def encode(self, obj):
+        """Returns the JSON of obj as an ASCII str."""
+        return self._encoder.encode(obj)
+
+    def decode(self, data):
+        """Returns the object of the UTF-8 encoded JSON str data.
+
+        Raises:
+            ValueError: when data is not valid JSON
+        """
+        return self._decoder.decode(data)
+
+    def decoder(self):
+        """Returns a decoder to be fed the chunks of one response."""
+        return BufferedDecoder(self.decode)
+
+    def load(self, stream, incremental=False):
+        """Returns the object of the JSON read from the file-like stream.
+
+        Args:
+            stream: has a ``read(size)`` method returning an empty str at the
+                end of the response
+            incremental (bool, optional): parse the JSON while it is read
+                when ijson is installed, instead of buffering it. Default
+                False.
+
+        Raises:
+            ValueError: when the stream is not valid JSON
+        """
+        if incremental and ijson is not None:
+            return parse_incremental(stream)
+        decoder = self.decoder()
+        for chunk in iter(lambda: stream.read(65536), ""):
+            decoder.feed(chunk)
+        return decoder.close()
+
+    def __repr__(self):
+        return "<%s codec>" % self.name
+
+
+class SimplejsonCodec(JsonCodec):
+    """Codec using simplejson, which is usually ahead of the json module
+    of Python 2.7 in its C speedups."""
+    name = "simplejson"
+
+    def __init__(self):
+        import simplejson
+        self._encoder = simplejson.JSONEncoder(separators=(",", ":"))
+        self._decoder = simplejson.JSONDecoder()
+
+
+class UjsonCodec(JsonCodec):
+    """Codec using ujson, the fastest of the backends on the dicts of
+    strings and lists exchanged with oxd."""
+    name = "ujson"
+
+    def __init__(self):
+        import ujson
+        self._ujson = ujson
+
+    def encode(self, obj):
+        return self._ujson.dumps(obj, ensure_ascii=True)
+
+    def decode(self, data):
+        return self._ujson.loads(data, precise_float=True)
+
+
+#: The codecs by name, in the order of preference
+BACKENDS = [("ujson", UjsonCodec), ("simplejson", SimplejsonCodec),
+            ("json", JsonCodec)]
+
+_default = None
+
+
+def get_codec(name=None):
+    """Returns a codec by name, or the preferred installed one.
+
+    Args:
+        name (str, optional): ``ujson``, ``simplejson`` or ``json``. Default
+            is the first installed of :data:`BACKENDS`.
+
+    Raises:
+        ValueError: when the name is not one of the backends
+        ImportError: when the named backend is not installed
+    """
+    global _default
+    if name is None:
+        if _default is None:
+            _default = _first_installed()
+        return _default
+    for backend, cls in BACKENDS:
+        if backend == name:
+            return cls()
+    raise ValueError("Unknown JSON codec %r, choose one of %s" % (
+        name, ", ".join(b for b, _ in BACKENDS)))
+
+
+def _first_installed():
+    for name, cls in BACKENDS:
+        try:
+            codec = cls()
+        except ImportError:
+            continue
+        logger.debug("Using the %s JSON codec", name)
+        return codec
@@ -1,20 +1,58 @@
+import contextlib
 import logging
+import os
+import tempfile
+import threading
 
 from ConfigParser import SafeConfigParser, NoOptionError, NoSectionError
 
+from . import forking
+
 logger = logging.getLogger(__name__)
 
+# marks a key read without a default, whose absence is logged
+_REQUIRED = object()
+
 
 class Configurer(object):
     """The class which holds all the information about the client and the OP
-    metadata"""
-    def __init__(self, cfg_file):
+    metadata
+
+    Args:
+        cfg_file (str): the path of the config file, None keeps the config in
+            memory only
+        settings (dict, optional): values by key by section, set over the
+            values of the file
+
+    The file is replaced atomically on every change, so that a crash never
+    leaves it half written. Within :meth:`deferred` the changes are only
+    written once at the end.
+    """
+    def __init__(self, cfg_file, settings=None):
         self.parser = SafeConfigParser()
         self.config_file = cfg_file
-        self.parser.read(self.config_file)
-        logger.info("Loading config at: %s", cfg_file)
-
-    def get(self, section, key):
+        # serializes the changes and the writes of the file
+        self._lock = threading.Lock()
+        # the number of deferred blocks open, in any thread
+        self._deferred = 0
+        self._dirty = False
+        forking.register(self)
+        if cfg_file:
+            self.parser.read(self.config_file)
+            logger.info("Loading config at: %s", cfg_file)
+        for section, values in (settings or {}).items():
+            if not self.parser.has_section(section):
+                self.parser.add_section(section)
+            for key, value in values.items():
+                self.parser.set(section, key, value)
+
+    def _after_fork(self):
+        """Replaces the lock and ends the deferred blocks of the threads of
+        the parent process, which do not exist in the child."""
+        self._lock = threading.Lock()
+        self._deferred = 0
+
+    def get(self, section, key, default=_REQUIRED):
         """get function reads the config value for the requested section and
         key and returns it
 
@@ -22,6 +60,8 @@ class Configurer(object):
             section (string) - the section to look for the config value
                                either - oxd, client
             key (string) - the key for the config value required
+            default - the value of an optional key which is not set. When
+                      given, a missing key is not logged as a warning.
 
         Returns:
             value (string) - the function returns the value of the key
@@ -31,7 +71,12 @@ class Configurer(object):
         Example:
             config = Configurer(location)
             oxd_port = config.get('oxd', 'port')  # returns the port of the oxd
+            timeout = config.get('oxd', 'timeout', None)  # optional key
         """
+        if default is not _REQUIRED:
+            if not self.parser.has_option(section, key):
+                return default
+            return self.parser.get(section, key)
         try:
             return self.parser.get(section, key)
         except (NoOptionError, NoSectionError) as e:
@@ -40,7 +85,7 @@ class Configurer(object):
 
     def set(self, section, key, value):
         """set function sets a particular value for the specified key in the
-        specified section and writes it to the config file.
+        specified section and writes it to the config file, if any.
 
         Args:
             section (string) - the section under which the config should be
@@ -58,9 +103,82 @@ class Configurer(object):
             logger.warning("Invalid config section: %s", section)
             return False
 
-        self.parser.set(section, key, value)
+        forking.check()
+        with self._lock:
+            self.parser.set(section, key, value)
+            self._changed()
+        return True
 
-        with open(self.config_file, 'wb') as cfile:
-            self.parser.write(cfile)
+    def remove(self, section, key):
+        """Removes the value of the key from the section and writes the config
+        file, if any.
 
-        return True
+        Returns:
+            bool: whether the key was set
+        """
+        forking.check()
+        with self._lock:
+            try:
+                removed = self.parser.remove_option(section, key)
+            except NoSectionError:
+                return False
+            if removed:
+                self._changed()
+        return removed
+
+    def _changed(self):
+        """Writes the file after a change, the lock must be held."""
+        self._dirty = True
+        if not self._deferred:
+            self._write()
+
+    def _write(self):
+        """Replaces the file with the current config, the lock must be held.
+        The config is written to a temporary file next to it first, which is
+        then renamed over the file."""
+        self._dirty = False
+        if not self.config_file:
+            return
+        directory = os.path.dirname(os.path.abspath(self.config_file))
+        fd, path = tempfile.mkstemp(prefix=".oxdpython-", suffix=".cfg",
+                                    dir=directory)
+        try:
+            with os.fdopen(fd, 'wb') as cfile:
+                self.parser.write(cfile)
+            if os.path.exists(self.config_file):
+                os.chmod(path, os.stat(self.config_file).st_mode & 0o777)
+            os.rename(path, self.config_file)
+        except:
+            os.remove(path)
+            raise
+
+    def flush(self):
+        """Writes the changes made within :meth:`deferred` so far."""
+        forking.check()
+        with self._lock:
+            if self._dirty:
+                self._write()
+
+    @contextlib.contextmanager
+    def deferred(self):
+        """Context manager collecting the changes made within it and writing
+        the file once at the end, instead of once per change. The blocks may
+        be nested or overlap between threads, the file is written when the
+        last of them ends.
+
+        Example::
+
+            with config.deferred():
+                config.set("oxd", "id", oxd_id)
+                config.set("client", "client_id", client_id)
+        """
+        forking.check()
+        with self._lock:
+            self._deferred += 1
+        try:
+            yield self
+        finally:
+            with self._lock:
+                self._deferred -= 1
+                if not self._deferred and self._dirty:
+                    self._write()
@@ -0,0 +1,134 @@
+"""Deadlines bounding the time spent on oxd requests.
+
+A deadline is set for the current thread with :func:`scope` and applies to
+every request made within the ``with`` block, including the connection
+attempts, retries and reconnects made internally by the messengers. Nested
+scopes can only shorten the deadline::
+
+    with scope(0.5):
+        client.uma_rs_check_access(rpt, '/photoz', 'GET')
+
+The messengers raise :class:`~oxdpython.exceptions.OxdTimeoutError` once the
+deadline has passed.
+"""
+import contextlib
+import threading
+import time
+
+from .exceptions import OxdTimeoutError
+
+_local = threading.local()
+
+
+class Deadline(object):
+    """A point in time by which a request must be completed.
+
+    Args:
+        timeout (float): seconds from now
+    """
+    def __init__(self, timeout):
+        self.timeout = timeout
+        self.expires = time.time() + timeout
+
+    def remaining(self):
+        """Returns the seconds left, which are negative once expired."""
+        return self.expires - time.time()
+
+    def expired(self):
+        return self.remaining() <= 0
+
+    def __repr__(self):
+        return "<Deadline in %.3fs>" % self.remaining()
+
+
+def current():
+    """Returns the :class:`Deadline` of the current thread or None."""
+    return getattr(_local, "deadline", None)
+
+
+@contextlib.contextmanager
+def scope(timeout):
+    """Context manager setting the deadline of the current thread to timeout
+    seconds from now, unless an enclosing scope ends earlier. A timeout of
+    None leaves the deadline unchanged.
+
+    Args:
+        timeout (float or Deadline): seconds from now or an existing deadline,
+            for example one captured in another thread with :func:`current`
+    """
+    outer = current()
+    if timeout is None:
+        yield outer
+        return
+
+    inner = timeout if isinstance(timeout, Deadline) else Deadline(timeout)
+    if outer is not None and outer.expires <= inner.expires:
+        inner = outer
+
+    _local.deadline = inner
+    try:
+        yield inner
+    finally:
+        _local.deadline = outer
+
+
+def remaining(limit=None):
+    """Returns the seconds left before the deadline of the current thread,
+    capped by limit, or None when there is neither a deadline nor a limit.
+
+    Args:
+        limit (float, optional): an upper bound like a connect timeout
+
+    Raises:
+        OxdTimeoutError: when the deadline has already passed
+    """
+    deadline = current()
+    if deadline is None:
+        return limit
+
+    left = deadline.remaining()
+    if left <= 0:
+        raise OxdTimeoutError("Deadline of %ss exceeded" % deadline.timeout)
+    return left if limit is None else min(left, limit)
+
+
+def wait(condition, predicate, timeout=None):
+    """Waits on a held condition until predicate() is true or timeout seconds
+    have passed, and returns whether predicate() is true.
+
+    ``Condition.wait(timeout)`` of Python 2 polls, sleeping up to 50ms between
+    checks, so a notification is noticed late. The condition is waited on
+    without timeout instead, and a timer thread notifies it once the timeout
+    has passed.
+
+    Args:
+        condition (threading.Condition): the condition, acquired by the
+            caller and notified by the threads changing what predicate checks
+        predicate (callable): returns whether the wait is over
+        timeout (float, optional): the seconds to wait, default forever
+    """
+    if timeout is None:
+        while not predicate():
+            condition.wait()
+        return True
+
+    end = time.time() + timeout
+    timer = None
+    try:
+        while not predicate():
+            if time.time() >= end:
+                return False
+            if timer is None:
+                timer = threading.Timer(timeout, _notify, (condition,))
+                timer.daemon = True
+                timer.start()
+            condition.wait()
+        return True
+    finally:
+        if timer is not None:
+            timer.cancel()
+
+
+def _notify(condition):
+    with condition:
+        condition.notify_all()
@@ -1,3 +1,6 @@
+import socket
+
+
 class OxdServerError(Exception):
     """Error raises by oxdpython whenever a Oxd Server Error is reported
     """
@@ -20,12 +23,18 @@ class InvalidTicketError(Exception):
 class NeedInfoError(Exception):
     """Error raised when oxd-server returns a "need_info" error for the
     `uma_rp_get_rpt` command.
+
+    Attributes:
+        details (dict): the details of the error, with the new ticket
+        claims_gathering_url (str): the URL to redirect the user to for
+            gathering the claims, when it was requested already
     """
-    def __init__(self, data):
+    def __init__(self, data, claims_gathering_url=None):
         error_string = "Need Info Error: {0}".format(
             data['error_description'])
         Exception.__init__(self, error_string)
         self.details = data['details']
+        self.claims_gathering_url = claims_gathering_url
 
 class InvalidRequestError(Exception):
     """Error raised when UMA RP does an `uma_rp_check_access` on unprotected resource
@@ -36,3 +45,48 @@ class InvalidRequestError(Exception):
             data['error_description']
         )
         Exception.__init__(self, error_string)
+
+
+class OxdTimeoutError(Exception):
+    """Error raised when a request to the oxd-server or the
+    oxd-https-extension does not complete before its deadline. The connection
+    used by the request is closed, since a late response could otherwise be
+    read as the response to the next request.
+    """
+
+
+class OxdResponseTooLargeError(Exception):
+    """Error raised when the response of oxd is longer than the
+    ``max_response_size`` of the messenger. The response is not read, and the
+    connection it was sent on is closed.
+    """
+
+
+class OxdConnectionError(socket.error):
+    """Error raised when the connection to the oxd-server or the
+    oxd-https-extension fails or breaks during a request.
+
+    Attributes:
+        sent (bool): False when the request certainly did not reach the
+            server, in which case it is safe to send it again. True when the
+            server might have received and processed the request.
+    """
+    def __init__(self, message, sent):
+        socket.error.__init__(self, message)
+        self.sent = sent
+
+
+class CircuitOpenError(OxdConnectionError):
+    """Error raised without contacting oxd when the circuit breaker in front
+    of it is open, because too many of the recent requests failed or were
+    too slow.
+    """
+    def __init__(self, message):
+        OxdConnectionError.__init__(self, message, sent=False)
+
+
+class CancelledError(Exception):
+    """Error raised when the result of a call submitted to an
+    :class:`~oxdpython.executor.Executor` is requested after the call was
+    cancelled.
+    """
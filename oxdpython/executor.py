@@ -0,0 +1,269 @@
+"""Running oxd commands concurrently from a bounded pool of threads.
+
+The commands of a :class:`~oxdpython.client.Client` block until oxd answers,
+so checking the access to 30 paths takes 30 round trips one after the other.
+An :class:`Executor` runs them from a few threads, sized to the connection
+pool of the messenger, and returns a :class:`Future` for each::
+
+    futures = [client.submit("introspect_access_token", token)
+               for token in tokens]
+    results = [f.result() for f in futures]
+
+The API follows ``concurrent.futures``, which is not part of Python 2.
+The deadline of the submitting thread, set with
+:func:`oxdpython.deadline.scope`, also applies to the submitted call.
+"""
+import collections
+import logging
+import sys
+import threading
+
+from . import deadline
+from . import forking
+from .exceptions import CancelledError, OxdTimeoutError
+
+logger = logging.getLogger(__name__)
+
+PENDING = "pending"
+RUNNING = "running"
+CANCELLED = "cancelled"
+FINISHED = "finished"
+
+
+class Future(object):
+    """The result of a call running in an :class:`Executor`."""
+    def __init__(self):
+        self._state = PENDING
+        self._result = None
+        self._exc_info = None
+        self._callbacks = []
+        self._condition = threading.Condition()
+
+    def cancel(self):
+        """Cancels the call unless it is already running. Returns whether
+        the call is cancelled."""
+        with self._condition:
+            if self._state in (RUNNING, FINISHED):
+                return False
+            if self._state == PENDING:
+                self._state = CANCELLED
+                self._condition.notify_all()
+        self._run_callbacks()
+        return True
+
+    def cancelled(self):
+        return self._state == CANCELLED
+
+    def running(self):
+        return self._state == RUNNING
+
+    def done(self):
+        return self._state in (CANCELLED, FINISHED)
+
+    def _wait(self, timeout):
+        with self._condition:
+            if not deadline.wait(self._condition, self.done, timeout):
+                raise OxdTimeoutError("The call did not complete in %ss"
+                                      % timeout)
+        if self._state == CANCELLED:
+            raise CancelledError("The call was cancelled")
+
+    def result(self, timeout=None):
+        """Returns the result of the call, waiting for it to complete.
+
+        Args:
+            timeout (float, optional): the seconds to wait, default forever
+
+        Raises:
+            OxdTimeoutError: when the call did not complete in time
+            CancelledError: when the call was cancelled
+            Exception: the exception raised by the call
+        """
+        self._wait(timeout)
+        if self._exc_info is not None:
+            raise self._exc_info[0], self._exc_info[1], self._exc_info[2]
+        return self._result
+
+    def exception(self, timeout=None):
+        """Returns the exception raised by the call or None, waiting for it
+        to complete like :meth:`result`."""
+        self._wait(timeout)
+        return self._exc_info[1] if self._exc_info is not None else None
+
+    def add_done_callback(self, func):
+        """Calls func with the future once it is done, right away if it is
+        done already."""
+        with self._condition:
+            if not self.done():
+                self._callbacks.append(func)
+                return
+        func(self)
+
+    def _start(self):
+        """Marks the call as running, returns False when it was cancelled."""
+        with self._condition:
+            if self._state == CANCELLED:
+                return False
+            self._state = RUNNING
+            return True
+
+    def _finish(self, result=None, exc_info=None):
+        with self._condition:
+            self._result = result
+            self._exc_info = exc_info
+            self._state = FINISHED
+            self._condition.notify_all()
+        self._run_callbacks()
+
+    def _run_callbacks(self):
+        callbacks, self._callbacks = self._callbacks, []
+        for func in callbacks:
+            try:
+                func(self)
+            except Exception:
+                logger.exception("Callback of %r failed", self)
+
+    def __repr__(self):
+        return "<Future %s>" % self._state
+
+
+class Executor(object):
+    """Runs calls in at most max_workers daemon threads, started as they are
+    needed.
+
+    A call submitted from a thread of the executor runs right away in that
+    thread, so that calls waiting for other calls cannot use up the threads
+    and wait forever.
+
+    Args:
+        max_workers (int, optional): the maximum number of threads. Default 4.
+        name (str, optional): the name of the threads
+    """
+    def __init__(self, max_workers=4, name="oxdpython executor"):
+        self.max_workers = max_workers
+        self.name = name
+        self._queue = collections.deque()
+        self._condition = threading.Condition()
+        self._threads = []
+        self._idle = 0
+        self._shutdown = False
+        self._local = threading.local()
+        forking.register(self)
+
+    def _after_fork(self):
+        """Drops the calls of the parent process, whose threads do not exist
+        in the child."""
+        self._queue = collections.deque()
+        self._condition = threading.Condition()
+        self._threads = []
+        self._idle = 0
+
+    def submit(self, func, *args, **kwargs):
+        """Calls func with the args in a thread of the executor, within the
+        deadline of the current thread.
+
+        Returns:
+            Future: the result of the call
+
+        Raises:
+            RuntimeError: when the executor is shut down
+        """
+        forking.check()
+        future = Future()
+        item = (future, deadline.current(), func, args, kwargs)
+        if getattr(self._local, "worker", False):
+            self._run(item)
+            return future
+        with self._condition:
+            if self._shutdown:
+                raise RuntimeError("The executor is shut down")
+            self._queue.append(item)
+            if self._idle:
+                self._condition.notify()
+            if len(self._queue) > self._idle and \
+                    len(self._threads) < self.max_workers:
+                self._start_worker()
+        return future
+
+    def map(self, func, *iterables, **kwargs):
+        """Calls func with the arguments taken from each of the iterables in
+        turn, concurrently.
+
+        Args:
+            func (callable): the function to call
+            *iterables: the arguments of the calls
+            timeout (float, optional): seconds allowed for all the calls
+
+        Returns:
+            iterator: the results in the order of the arguments. Iterating
+            raises the exception of a failed call, and cancels the calls not
+            yet started.
+        """
+        timeout = kwargs.pop("timeout", None)
+        if kwargs:
+            raise TypeError("Unexpected arguments %s" % ", ".join(kwargs))
+        with deadline.scope(timeout) as limit:
+            futures = [self.submit(func, *args) for args in zip(*iterables)]
+
+        def results():
+            try:
+                for future in futures:
+                    if limit is None:
+                        yield future.result()
+                    else:
+                        yield future.result(max(limit.remaining(), 0))
+            finally:
+                for future in futures:
+                    future.cancel()
+        return results()
+
+    def shutdown(self, wait=True):
+        """Stops the threads once the submitted calls are done.
+
+        Args:
+            wait (bool, optional): wait for the threads to stop. Default True.
+        """
+        with self._condition:
+            self._shutdown = True
+            self._condition.notify_all()
+            threads = list(self._threads)
+        if wait:
+            for thread in threads:
+                if thread is not threading.current_thread():
+                    thread.join()
+
+    def _start_worker(self):
+        thread = threading.Thread(target=self._work, name="%s %d" % (
+            self.name, len(self._threads) + 1))
+        thread.daemon = True
+        self._threads.append(thread)
+        thread.start()
+
+    def _work(self):
+        self._local.worker = True
+        condition = self._condition
+        while True:
+            with condition:
+                while not self._queue:
+                    if self._shutdown:
+                        self._threads.remove(threading.current_thread())
+                        return
+                    self._idle += 1
+                    condition.wait()
+                    self._idle -= 1
+                item = self._queue.popleft()
+            self._run(item)
+
+    @staticmethod
+    def _run(item):
+        future, limit, func, args, kwargs = item
+        if not future._start():
+            return
+        try:
+            with deadline.scope(limit):
+                deadline.remaining()
+                result = func(*args, **kwargs)
+        except Exception:
+            future._finish(exc_info=sys.exc_info())
+        else:
+            future._finish(result)
@@ -0,0 +1,444 @@
+"""A local stand-in for oxd-server and the oxd-https-extension.
+
+The servers in this module speak the same wire protocols as the real oxd
+components, but answer every command with a canned response. They run in a
+background thread of the current process, which makes them suitable for tests
+and benchmarks on a machine without network access or an OpenID Provider.
+:class:`FakeOxdUnixServer` listens on a Unix domain socket, like an oxd-server
+running next to the site.
+
+Example::
+
+    with FakeOxdServer(latency=0.005) as server:
+        msgr = SocketMessenger(*server.address)
+        msgr.request('get_user_info', oxd_id='test-id', access_token='t')
+"""
+import collections
+import copy
+import json
+import logging
+import os
+import tempfile
+import threading
+import time
+import zlib
+import BaseHTTPServer
+import SocketServer
+
+logger = logging.getLogger(__name__)
+
+OXD_ID = "6F9619FF-8B86-D011-B42D-00CF4FC964FF"
+
+#: The canned responses returned for each of the commands used by the Client
+DEFAULT_RESPONSES = {
+    "register_site": {
+        "status": "ok",
+        "data": {"oxd_id": OXD_ID}
+    },
+    "update_site": {
+        "status": "ok",
+        "data": {}
+    },
+    "remove_site": {
+        "status": "ok",
+        "data": {"oxd_id": OXD_ID}
+    },
+    "setup_client": {
+        "status": "ok",
+        "data": {
+            "oxd_id": OXD_ID,
+            "op_host": "https://op.example.com",
+            "client_id": "@!1736.179E.AA60.16B2!0001!8F7C.B9AB!0008!A2BB",
+            "client_secret": "f436b936-03fc-433f-9772-53c2bc9e1c74",
+            "client_registration_access_token": "d836df94-44b0-445a-bd1a",
+            "client_registration_client_uri": "https://op.example.com/oxauth"
+                                              "/restv1/register?client_id=1",
+            "client_id_issued_at": 1501854943,
+            "client_secret_expires_at": 1501941343
+        }
+    },
+    "get_client_token": {
+        "status": "ok",
+        "data": {
+            "access_token": "6F9619FF-8B86-D011-B42D-00CF4FC964FF",
+            "expires_in": 399,
+            "refresh_token": "fr459f",
+            "scope": "openid"
+        }
+    },
+    "get_authorization_url": {
+        "status": "ok",
+        "data": {
+            "authorization_url": "https://op.example.com/authorize"
+                                 "?response_type=code&client_id=1"
+        }
+    },
+    "get_tokens_by_code": {
+        "status": "ok",
+        "data": {
+            "access_token": "SlAV32hkKG",
+            "expires_in": 3600,
+            "refresh_token": "aaAV32hkKG1",
+            "id_token": "eyJ0 ... NiJ9.eyJ1c ... I6IjIifX0.DeWt4Qu ... ZXso",
+            "id_token_claims": {
+                "iss": "https://op.example.com",
+                "sub": "24400320",
+                "aud": "s6BhdRkqt3",
+                "nonce": "n-0S6_WzA2Mj",
+                "exp": 1311281970,
+                "iat": 1311280970,
+                "at_hash": "MTIzNDU2Nzg5MDEyMzQ1Ng"
+            }
+        }
+    },
+    "get_access_token_by_refresh_token": {
+        "status": "ok",
+        "data": {
+            "access_token": "SlAV32hkKG",
+            "expires_in": 3600,
+            "refresh_token": "aaAV32hkKG1"
+        }
+    },
+    "get_user_info": {
+        "status": "ok",
+        "data": {
+            "claims": {
+                "sub": ["248289761001"],
+                "name": ["Jane Doe"],
+                "given_name": ["Jane"],
+                "family_name": ["Doe"],
+                "preferred_username": ["j.doe"],
+                "email": ["janedoe@example.com"],
+                "picture": ["http://example.com/janedoe/me.jpg"]
+            }
+        }
+    },
+    "get_logout_uri": {
+        "status": "ok",
+        "data": {"uri": "https://op.example.com/end_session"}
+    },
+    "uma_rs_protect": {
+        "status": "ok",
+        "data": {"oxd_id": OXD_ID}
+    },
+    "uma_rs_check_access": {
+        "status": "ok",
+        "data": {"access": "granted"}
+    },
+    "uma_rp_get_rpt": {
+        "status": "ok",
+        "data": {
+            "access_token": "SSJHBSUSSJHVhjsgvhsgvshgsv",
+            "token_type": "Bearer",
+            "pct": "c2F2ZWRjb25zZW50",
+            "upgraded": True
+        }
+    },
+    "uma_rp_get_claims_gathering_url": {
+        "status": "ok",
+        "data": {
+            "url": "https://op.example.com/restv1/uma/gather_claims"
+                   "?ticket=4678a107-e124-416c-af79-7807f3c31457"
+        }
+    },
+    "introspect_access_token": {
+        "status": "ok",
+        "data": {
+            "active": True,
+            "client_id": "@6F96!19756yCF4F!C964FF",
+            "username": "John Doe",
+            "scopes": "openid",
+            "token_type": "bearer",
+            "sub": "John Doe",
+            "aud": "@6F96!19756yCF4F!C964FF",
+            "iss": "https://op.example.com",
+            "exp": "1518268876",
+            "iat": "1518268576",
+            "acr_values": None,
+            "jti": None
+        }
+    },
+    "introspect_rpt": {
+        "status": "ok",
+        "data": {
+            "active": True,
+            "exp": 1256953732,
+            "iat": 1256912345,
+            "nbf": None,
+            "permissions": [{
+                "resource_id": "112210f47de98100",
+                "resource_scopes": [
+                    "view",
+                    "http://photoz.example.com/dev/actions/print"
+                ],
+                "exp": 1256953732
+            }],
+            "client_id": "@6F96!19756yCF4F!C964FF",
+            "sub": "John Doe",
+            "aud": "@6F96!19756yCF4F!C964FF",
+            "iss": "https://op.example.com",
+            "jti": None
+        }
+    },
+}
+
+UNKNOWN_COMMAND = {
+    "status": "error",
+    "data": {
+        "error": "unsupported_operation",
+        "error_description": "Unsupported operation."
+    }
+}
+
+
+class FakeOxd(object):
+    """Base class holding the canned responses, the latency model and the
+    request log shared by the fake socket server and the fake https extension.
+
+    Args:
+        responses (dict, optional): command name mapped to either a response
+            dict or a callable taking the params dict and returning the
+            response. Merged over :data:`DEFAULT_RESPONSES`.
+        latency (float or callable, optional): the seconds to wait before
+            answering each command, or a callable taking the command name and
+            returning the seconds to wait
+        host (str, optional): the interface to bind to, default localhost
+        port (int, optional): the port to bind to, default is any free port
+        history (int, optional): the number of most recent requests kept in
+            the ``requests`` log, default 1000
+    """
+    def __init__(self, responses=None, latency=0, host='localhost', port=0,
+                 history=1000):
+        self.responses = copy.deepcopy(DEFAULT_RESPONSES)
+        if responses:
+            self.responses.update(responses)
+        self.latency = latency
+        self.host = host
+        self.port = port
+        self.requests = collections.deque(maxlen=history)
+        self.server = None
+        self._thread = None
+        self._lock = threading.Lock()
+
+    def respond(self, command, params):
+        """Looks up the canned response for the command after waiting for the
+        configured latency, and records the request.
+
+        Args:
+            command (str): the oxd command
+            params (dict): the parameters sent along with the command
+
+        Returns:
+            dict: the response to be sent back to the client
+        """
+        with self._lock:
+            self.requests.append((command, params))
+
+        delay = self.latency(command) if callable(self.latency) \
+            else self.latency
+        if delay:
+            time.sleep(delay)
+
+        response = self.responses.get(command, UNKNOWN_COMMAND)
+        if callable(response):
+            response = response(params)
+        return response
+
+    def _create_server(self):
+        raise NotImplementedError
+
+    def start(self):
+        """Binds the server and starts serving in a background thread.
+
+        Returns:
+            the server object itself, to allow chaining
+        """
+        self.server = self._create_server()
+        if isinstance(self.server.server_address, tuple):
+            self.port = self.server.server_address[1]
+        self._thread = threading.Thread(target=self.server.serve_forever,
+                                        args=(0.05,), name=str(self))
+        self._thread.daemon = True
+        self._thread.start()
+        logger.info("%s started", self)
+        return self
+
+    def stop(self):
+        """Shuts down the server and waits for the serving thread to exit."""
+        if self.server is None:
+            return
+        self.server.shutdown()
+        self.server.server_close()
+        self._thread.join()
+        self.server = None
+        logger.info("%s stopped", self)
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.stop()
+
+
+class _ThreadingTCPServer(SocketServer.ThreadingMixIn, SocketServer.TCPServer):
+    daemon_threads = True
+    allow_reuse_address = True
+
+
+class _SocketHandler(SocketServer.BaseRequestHandler):
+    """Serves the 4 digit length prefixed JSON protocol of oxd-server. Like
+    oxd-server, the connection is kept open for any number of commands."""
+    def _read(self, length):
+        chunks = []
+        remaining = length
+        while remaining > 0:
+            chunk = self.request.recv(remaining)
+            if not chunk:
+                return None
+            chunks.append(chunk)
+            remaining -= len(chunk)
+        return "".join(chunks)
+
+    def handle(self):
+        fake = self.server.fake
+        while True:
+            prefix = self._read(4)
+            if prefix is None:
+                return
+            body = self._read(int(prefix))
+            if body is None:
+                return
+
+            message = json.loads(body)
+            response = json.dumps(fake.respond(message.get("command"),
+                                               message.get("params", {})))
+            self.request.sendall("{:04d}".format(len(response)) + response)
+
+
+class FakeOxdServer(FakeOxd):
+    """A fake oxd-server listening on a TCP socket. The ``address`` attribute
+    gives the (host, port) pair to be passed on to the ``SocketMessenger``.
+    """
+    @property
+    def address(self):
+        return self.host, self.port
+
+    def _create_server(self):
+        server = _ThreadingTCPServer((self.host, self.port), _SocketHandler)
+        server.fake = self
+        return server
+
+    def __str__(self):
+        return "FakeOxdServer(%s, %s)" % (self.host, self.port)
+
+
+class _ThreadingUnixServer(SocketServer.ThreadingMixIn,
+                           SocketServer.UnixStreamServer):
+    daemon_threads = True
+
+
+class FakeOxdUnixServer(FakeOxd):
+    """A fake oxd-server listening on a Unix domain socket. The ``address``
+    attribute gives the path to be passed on to the ``UnixSocketMessenger``.
+
+    Args:
+        path (str, optional): the path of the socket, default is a new path
+            in the temporary directory
+        **kwargs: the arguments of :class:`FakeOxd`
+    """
+    def __init__(self, path=None, **kwargs):
+        FakeOxd.__init__(self, **kwargs)
+        self._tmpdir = None
+        if path is None:
+            self._tmpdir = tempfile.mkdtemp(prefix="oxdpython-")
+            path = os.path.join(self._tmpdir, "oxd.sock")
+        self.path = path
+
+    @property
+    def address(self):
+        return self.path
+
+    def _create_server(self):
+        server = _ThreadingUnixServer(self.path, _SocketHandler)
+        server.fake = self
+        return server
+
+    def stop(self):
+        FakeOxd.stop(self)
+        if os.path.exists(self.path):
+            os.remove(self.path)
+        if self._tmpdir is not None:
+            os.rmdir(self._tmpdir)
+            self._tmpdir = None
+
+    def __str__(self):
+        return "FakeOxdUnixServer(%s)" % self.path
+
+
+class _ThreadingHTTPServer(SocketServer.ThreadingMixIn,
+                           BaseHTTPServer.HTTPServer):
+    daemon_threads = True
+    allow_reuse_address = True
+
+
+class _HttpHandler(BaseHTTPServer.BaseHTTPRequestHandler):
+    """Serves the REST paths of oxd-https-extension, where the command
+    `get_user_info` is mapped to `POST /get-user-info`. The bearer token in
+    the Authorization header is recorded as `protection_access_token`."""
+    protocol_version = "HTTP/1.1"
+
+    def do_POST(self):
+        fake = self.server.fake
+        command = self.path.strip("/").replace("-", "_")
+        length = int(self.headers.getheader("Content-Length") or 0)
+        body = self.rfile.read(length) if length else ""
+        if self.headers.getheader("Content-Encoding") == "gzip":
+            body = zlib.decompress(body, 16 + zlib.MAX_WBITS)
+        params = json.loads(body) if body else {}
+
+        auth = self.headers.getheader("Authorization")
+        if auth and auth.startswith("Bearer "):
+            params["protection_access_token"] = auth[len("Bearer "):]
+
+        response = json.dumps(fake.respond(command, params))
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json")
+        accept = self.headers.getheader("Accept-Encoding") or ""
+        if fake.compress and "gzip" in accept:
+            compressor = zlib.compressobj(6, zlib.DEFLATED,
+                                          16 + zlib.MAX_WBITS)
+            response = compressor.compress(response) + compressor.flush()
+            self.send_header("Content-Encoding", "gzip")
+        self.send_header("Content-Length", str(len(response)))
+        self.end_headers()
+        self.wfile.write(response)
+
+    def log_message(self, fmt, *args):
+        logger.debug(fmt, *args)
+
+
+class FakeHttpsExtension(FakeOxd):
+    """A fake oxd-https-extension. It serves plain HTTP, so the ``url``
+    attribute carries an explicit ``http://`` scheme which the
+    ``HttpMessenger`` respects. Gzip compressed request bodies are accepted.
+
+    Args:
+        compress (bool, optional): gzip the responses to clients accepting
+            it. Default False.
+        **kwargs: the arguments of :class:`FakeOxd`
+    """
+    def __init__(self, compress=False, **kwargs):
+        FakeOxd.__init__(self, **kwargs)
+        self.compress = compress
+
+    @property
+    def url(self):
+        return "http://%s:%s/" % (self.host, self.port)
+
+    def _create_server(self):
+        server = _ThreadingHTTPServer((self.host, self.port), _HttpHandler)
+        server.fake = self
+        return server
+
+    def __str__(self):
+        return "FakeHttpsExtension(%s)" % self.url
@@ -0,0 +1,263 @@
+"""Fault injection for the socket protocol of oxd-server.
+
+:class:`FaultInjectingProxy` sits between a ``SocketMessenger`` and an
+oxd-server (usually the :class:`~oxdpython.fakeserver.FakeOxdServer`) and
+damages the responses according to a schedule of faults. :func:`run_harness`
+sends a series of commands through the proxy and reports for each of them
+whether it completed, failed or stalled beyond its deadline, along with the
+time taken to recover from every fault.
+
+Example::
+
+    with FakeOxdServer() as server, \\
+            FaultInjectingProxy(server.address, [None, RESET, SPLIT]) as proxy:
+        report = run_harness(lambda: SocketMessenger(*proxy.address),
+                             ['get_user_info'] * 10, deadline=1)
+        assert not report.stalled
+"""
+import collections
+import logging
+import socket
+import struct
+import threading
+import time
+import SocketServer
+
+logger = logging.getLogger(__name__)
+
+#: Delay the response by the proxy's ``latency``
+LATENCY = "latency"
+#: Reset the connection after the request has been received
+RESET = "reset"
+#: Send only a part of the length prefix and close the connection
+TRUNCATE = "truncate"
+#: Send the response in small chunks with a pause in between
+SPLIT = "split"
+
+FAULTS = (LATENCY, RESET, TRUNCATE, SPLIT)
+
+
+class _ThreadingTCPServer(SocketServer.ThreadingMixIn, SocketServer.TCPServer):
+    daemon_threads = True
+    allow_reuse_address = True
+
+
+def _read_frame(sock):
+    """Reads one length prefixed frame from the socket. Returns None when the
+    connection is closed."""
+    data = ""
+    length = None
+    while length is None or len(data) < length + 4:
+        chunk = sock.recv(4096)
+        if not chunk:
+            return None
+        data += chunk
+        if length is None and len(data) >= 4:
+            length = int(data[:4])
+    return data
+
+
+class _ProxyHandler(SocketServer.BaseRequestHandler):
+    def handle(self):
+        proxy = self.server.proxy
+        upstream = socket.create_connection(proxy.upstream)
+        try:
+            while True:
+                request = _read_frame(self.request)
+                if request is None:
+                    return
+                fault = proxy.next_fault(request)
+
+                if fault == RESET:
+                    self.request.setsockopt(socket.SOL_SOCKET,
+                                            socket.SO_LINGER,
+                                            struct.pack('ii', 1, 0))
+                    return
+
+                upstream.sendall(request)
+                response = _read_frame(upstream)
+                if response is None:
+                    return
+
+                if fault == LATENCY:
+                    time.sleep(proxy.latency)
+                    self.request.sendall(response)
+                elif fault == TRUNCATE:
+                    self.request.sendall(response[:2])
+                    return
+                elif fault == SPLIT:
+                    for i in range(0, len(response), proxy.split_size):
+                        self.request.sendall(response[i:i + proxy.split_size])
+                        time.sleep(proxy.split_delay)
+                else:
+                    self.request.sendall(response)
+        finally:
+            upstream.close()
+
+
+class FaultInjectingProxy(object):
+    """A TCP proxy for the oxd-server protocol injecting faults into the
+    responses.
+
+    Args:
+        upstream (tuple): the (host, port) of the oxd-server
+        faults (iterable or callable, optional): the faults to inject. An
+            iterable provides one fault per request in order, with None
+            meaning no fault, and no faults once exhausted. A callable is
+            called with the request frame and returns the fault or None.
+        latency (float, optional): seconds of delay for ``LATENCY`` faults
+        split_size (int, optional): bytes per chunk for ``SPLIT`` faults
+        split_delay (float, optional): seconds between chunks for ``SPLIT``
+        host (str, optional): the interface to bind to, default localhost
+        port (int, optional): the port to bind to, default is any free port
+    """
+    def __init__(self, upstream, faults=None, latency=0.5, split_size=3,
+                 split_delay=0.001, host='localhost', port=0):
+        self.upstream = upstream
+        self.faults = faults if callable(faults) else iter(faults or [])
+        self.latency = latency
+        self.split_size = split_size
+        self.split_delay = split_delay
+        self.host = host
+        self.port = port
+        self.injected = []
+        self.server = None
+        self._thread = None
+        self._lock = threading.Lock()
+
+    @property
+    def address(self):
+        return self.host, self.port
+
+    def next_fault(self, request):
+        """Returns the fault to be injected for the request frame and records
+        it in ``injected``."""
+        with self._lock:
+            if callable(self.faults):
+                fault = self.faults(request)
+            else:
+                fault = next(self.faults, None)
+            self.injected.append(fault)
+        if fault:
+            logger.info("Injecting fault %s", fault)
+        return fault
+
+    def start(self):
+        self.server = _ThreadingTCPServer((self.host, self.port),
+                                          _ProxyHandler)
+        self.server.proxy = self
+        self.port = self.server.server_address[1]
+        self._thread = threading.Thread(target=self.server.serve_forever,
+                                        args=(0.05,), name=str(self))
+        self._thread.daemon = True
+        self._thread.start()
+        return self
+
+    def stop(self):
+        if self.server is None:
+            return
+        self.server.shutdown()
+        self.server.server_close()
+        self._thread.join()
+        self.server = None
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.stop()
+
+    def __str__(self):
+        return "FaultInjectingProxy(%s, %s)" % (self.host, self.port)
+
+
+#: The outcome of a single request in the harness
+Outcome = collections.namedtuple("Outcome",
+                                 "command result elapsed error")
+
+COMPLETED = "completed"
+FAILED = "failed"
+STALLED = "stalled"
+
+
+class HarnessReport(object):
+    """The outcomes of a harness run, in the order of the commands."""
+    def __init__(self, outcomes):
+        self.outcomes = outcomes
+
+    def _select(self, result):
+        return [o for o in self.outcomes if o.result == result]
+
+    @property
+    def completed(self):
+        return self._select(COMPLETED)
+
+    @property
+    def failed(self):
+        return self._select(FAILED)
+
+    @property
+    def stalled(self):
+        return self._select(STALLED)
+
+    @property
+    def recovery_times(self):
+        """Seconds from the start of each request which did not complete to
+        the end of the next completed request. Faults without any later
+        completed request are left out."""
+        times = []
+        start = 0.0
+        pending = None
+        for outcome in self.outcomes:
+            if outcome.result != COMPLETED:
+                if pending is None:
+                    pending = start
+            elif pending is not None:
+                times.append(start + outcome.elapsed - pending)
+                pending = None
+            start += outcome.elapsed
+        return times
+
+
+def run_harness(messenger_factory, commands, deadline=5.0, params=None):
+    """Sends the commands one after another and classifies each request as
+    completed, failed (raised an error within the deadline) or stalled (did
+    not return within the deadline). A stalled messenger is abandoned with its
+    thread and replaced by a new one from the factory.
+
+    Args:
+        messenger_factory (callable): returns a new messenger
+        commands (list): the oxd commands to be sent
+        deadline (float, optional): seconds allowed for each request
+        params (dict, optional): the params to send with every command
+
+    Returns:
+        HarnessReport: the outcome of every request
+    """
+    msgr = messenger_factory()
+    outcomes = []
+    for command in commands:
+        result = {}
+
+        def target():
+            try:
+                result["response"] = msgr.request(command, **(params or {}))
+            except Exception as e:
+                result["error"] = e
+
+        worker = threading.Thread(target=target)
+        worker.daemon = True
+        start = time.time()
+        worker.start()
+        worker.join(deadline)
+        elapsed = time.time() - start
+
+        if worker.is_alive():
+            outcomes.append(Outcome(command, STALLED, elapsed, None))
+            msgr = messenger_factory()
+        elif "error" in result:
+            outcomes.append(Outcome(command, FAILED, elapsed,
+                                    result["error"]))
+        else:
+            outcomes.append(Outcome(command, COMPLETED, elapsed, None))
+    return HarnessReport(outcomes)
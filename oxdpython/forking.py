@@ -0,0 +1,53 @@
+"""Fork safety for pre-fork servers like gunicorn or uWSGI.
+
+A client created in the master process is copied into every worker forked
+from it, with its open connections, its locks and the state of its threads,
+but without the threads themselves. Workers sharing a connection would read
+each other's responses, and a lock held by another thread during the fork
+would never be released.
+
+The objects holding such state register themselves with :func:`register` and
+implement ``_after_fork``, which rebuilds the state in the child process.
+:func:`check` is called on every request, and before any lock of a client
+or config is taken, and runs the resets in the first process using the
+objects after a fork. Where the interpreter supports
+``os.register_at_fork`` the resets run right after the fork instead.
+"""
+import logging
+import os
+import weakref
+
+logger = logging.getLogger(__name__)
+
+_pid = os.getpid()
+_objects = weakref.WeakSet()
+
+
+def register(obj):
+    """Resets the state of obj in the child processes, by calling its
+    ``_after_fork`` method."""
+    _objects.add(obj)
+
+
+def check():
+    """Resets the registered objects when the current process was forked
+    since the last check."""
+    if _pid != os.getpid():
+        _after_fork_in_child()
+
+
+def _after_fork_in_child():
+    global _pid
+    _pid = os.getpid()
+    objects = list(_objects)
+    logger.info("Forked as process %s, resetting %d objects", _pid,
+                len(objects))
+    for obj in objects:
+        try:
+            obj._after_fork()
+        except Exception:
+            logger.exception("Resetting %r after fork failed", obj)
+
+
+if hasattr(os, "register_at_fork"):
+    os.register_at_fork(after_in_child=_after_fork_in_child)
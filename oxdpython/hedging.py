@@ -0,0 +1,109 @@
+"""Hedging of read-only requests against slow oxd endpoints.
+
+One slow oxd instance drags up the tail latency of the requests even while the
+other instances are idle. A hedged request is sent to a second endpoint when
+the first one has not answered within the usual latency of the command, the
+observed 95th percentile by default, and the first answer wins. The late
+answer is ignored.
+
+Only commands that read state are hedged, since the duplicate may be executed
+as well. The hedges are capped to a share of the hedged commands, so that a
+generally slow oxd does not get twice the load.
+
+Hedging needs several endpoints and is enabled on the balancer::
+
+    msgr = Messenger.create(["oxd1:8099", "oxd2:8099"], 8099)
+    msgr.hedge_policy = HedgePolicy(percentile=95, rate=0.1)
+"""
+import collections
+import logging
+import math
+import threading
+
+logger = logging.getLogger(__name__)
+
+#: Commands that only read state and may be sent twice at once
+HEDGED_COMMANDS = frozenset([
+    "introspect_access_token",
+    "introspect_rpt",
+    "uma_rs_check_access",
+])
+
+
+class HedgePolicy(object):
+    """Decides when and how often a request is hedged.
+
+    Args:
+        percentile (float, optional): the percentile of the observed latency
+            of a command after which the request is hedged. Default 95.
+        rate (float, optional): the maximum share of the requests of the
+            hedged commands which may be hedged. Default 0.1.
+        burst (int, optional): the number of hedges which may be sent in a
+            row when the requests were not hedged for a while. Default 10.
+        window_size (int, optional): the number of most recent latencies of a
+            command considered. Default 100.
+        minimum_samples (int, optional): the number of latencies of a command
+            needed before its requests are hedged. Default 20.
+        min_delay (float, optional): seconds to wait at least before hedging.
+            Default 0.001.
+        commands (iterable, optional): the commands which may be hedged.
+            Default is :data:`HEDGED_COMMANDS`.
+    """
+    def __init__(self, percentile=95, rate=0.1, burst=10, window_size=100,
+                 minimum_samples=20, min_delay=0.001,
+                 commands=HEDGED_COMMANDS):
+        self.percentile = percentile
+        self.rate = rate
+        self.burst = burst
+        self.window_size = window_size
+        self.minimum_samples = minimum_samples
+        self.min_delay = min_delay
+        self.commands = frozenset(commands)
+        self.hedges = 0
+        self._tokens = float(burst)
+        self._latencies = {}
+        self._lock = threading.Lock()
+
+    def observe(self, command, elapsed):
+        """Records the latency of a successful request.
+
+        Args:
+            command (str): the oxd command
+            elapsed (float): the seconds the request took
+        """
+        if command not in self.commands:
+            return
+        with self._lock:
+            latencies = self._latencies.get(command)
+            if latencies is None:
+                latencies = collections.deque(maxlen=self.window_size)
+                self._latencies[command] = latencies
+            latencies.append(elapsed)
+
+    def delay(self, command):
+        """Returns the seconds after which a request of the command is hedged,
+        or None when the command is not hedged. Each call counts as a request
+        towards the hedge rate.
+
+        Args:
+            command (str): the oxd command
+        """
+        if command not in self.commands:
+            return None
+        with self._lock:
+            self._tokens = min(self.burst, self._tokens + self.rate)
+            latencies = sorted(self._latencies.get(command, ()))
+        if not latencies or len(latencies) < self.minimum_samples:
+            return None
+        rank = int(math.ceil(self.percentile / 100.0 * len(latencies)))
+        return max(self.min_delay, latencies[max(rank, 1) - 1])
+
+    def take(self):
+        """Returns whether a hedge may be sent now, counting it if so."""
+        with self._lock:
+            if self._tokens < 1:
+                logger.debug("Hedge rate exceeded, not hedging")
+                return False
+            self._tokens -= 1
+            self.hedges += 1
+            return True
@@ -1,24 +1,163 @@
-import json
+import httplib
 import socket
 import logging
+import threading
 import urllib2
+import urlparse
 import ssl
+import zlib
 
 from . import __version__
+from . import deadline
+from . import forking
+from .codec import get_codec
+from .exceptions import OxdTimeoutError, OxdConnectionError, \
+    OxdResponseTooLargeError
+from .retry import RetryPolicy
 
 logger = logging.getLogger(__name__)
 
+
+def _split_host_port(host, port):
+    """Splits the port off ``host:port`` or ``[address]:port``. A bare IPv6
+    address, having more than one colon, keeps the default port."""
+    if host.startswith("["):
+        address, _, rest = host[1:].partition("]")
+        if rest.startswith(":"):
+            port = rest[1:]
+        return address, port
+    if host.count(":") == 1:
+        return host.split(":")
+    return host, port
+
+
+class _ChunkReader(object):
+    """File-like reader over the chunks of a response as they are received,
+    for the codec to pull from."""
+    def __init__(self, chunks):
+        self._chunks = iter(chunks)
+        self._buffer = ""
+
+    def read(self, size=-1):
+        while size < 0 or len(self._buffer) < size:
+            chunk = next(self._chunks, None)
+            if chunk is None:
+                break
+            if not self._buffer and len(chunk) == size:
+                return chunk
+            self._buffer += chunk
+        if size < 0:
+            data, self._buffer = self._buffer, ""
+        else:
+            data, self._buffer = self._buffer[:size], self._buffer[size:]
+        return data
+
+
 class Messenger(object):
     """Base class for the different messengers employed by the oxdpython Client
+
+    Args:
+        timeout (float, optional): seconds allowed for a whole request,
+            including connecting and any reconnects. Applies unless a shorter
+            deadline is set by the caller with ``oxdpython.deadline.scope``.
+            Default is no timeout.
+        connect_timeout (float, optional): seconds allowed for establishing
+            a connection, default is the remaining time of the request
+        retry_policy (RetryPolicy, optional): decides which failed requests
+            are sent again, default is a ``RetryPolicy`` with its defaults
+        codec (JsonCodec, optional): encodes the requests and decodes the
+            responses, default is the fastest installed backend
+
+    Attributes:
+        max_response_size (int): the longest response in bytes accepted from
+            oxd, longer ones raise ``OxdResponseTooLargeError``. Default None
+            accepts any size.
+        incremental (bool): decode the responses while they are read, see
+            :meth:`oxdpython.codec.JsonCodec.load`. Default False.
     """
-    def __init__(self):
+    def __init__(self, timeout=None, connect_timeout=None, retry_policy=None,
+                 codec=None):
         self._access_token = ''
+        self.timeout = timeout
+        self.connect_timeout = connect_timeout
+        self.retry_policy = retry_policy or RetryPolicy()
+        self.codec = codec or get_codec()
+        self.max_response_size = None
+        self.incremental = False
 
     @staticmethod
-    def create(host='localhost', port='8099', https_extension=False):
-        if https_extension:
-            return HttpMessenger(host)
-        return SocketMessenger(host, port)
+    def create(host='localhost', port='8099', https_extension=False,
+               timeout=None, connect_timeout=None, retry_policy=None,
+               strategy="least_outstanding", pool_size=4, socket_path=None,
+               codec=None, max_response_size=None, incremental=False,
+               compress_threshold=None):
+        """Creates the messenger for the oxd-server or the
+        oxd-https-extension.
+
+        Args:
+            host (str or list): the host, or a list of hosts to balance the
+                requests over. For the oxd-server each host may carry its own
+                port as ``host:port``, or ``[address]:port`` for an IPv6
+                address.
+            port (int): the port of the oxd-server
+            https_extension (bool): whether the host is an
+                oxd-https-extension
+            timeout (float): seconds allowed for a whole request
+            connect_timeout (float): seconds allowed for connecting
+            retry_policy (RetryPolicy): decides which failed requests are
+                sent again
+            strategy (str): the balancing strategy for a list of hosts,
+                ``least_outstanding`` or ``p2c``
+            pool_size (int): the maximum number of connections to each
+                oxd-server
+            socket_path (str): the Unix domain socket of an oxd-server on
+                the same host, used instead of host and port. It cannot be
+                combined with https_extension or several hosts.
+            codec (JsonCodec): the JSON codec, default is the fastest
+                installed backend
+            max_response_size (int): the longest response accepted in bytes
+            incremental (bool): decode the responses while they are read
+            compress_threshold (int): the size from which request bodies to
+                the oxd-https-extension are compressed
+
+        Raises:
+            ValueError: when socket_path is given along with https_extension
+                or several hosts
+        """
+        if socket_path and https_extension:
+            raise ValueError("socket_path %r cannot be used with the "
+                             "oxd-https-extension" % socket_path)
+        if socket_path and isinstance(host, (list, tuple)) and len(host) > 1:
+            raise ValueError("socket_path %r cannot be used with several "
+                             "hosts %s" % (socket_path, ", ".join(host)))
+        if isinstance(host, (list, tuple)) and len(host) > 1:
+            from .balancer import BalancedMessenger
+            # the balancer sends failed requests to another endpoint instead
+            single = [Messenger.create(h, port, https_extension, timeout,
+                                       connect_timeout, RetryPolicy(retries=0),
+                                       pool_size=pool_size, codec=codec,
+                                       max_response_size=max_response_size,
+                                       incremental=incremental,
+                                       compress_threshold=compress_threshold)
+                      for h in host]
+            return BalancedMessenger(single, strategy, timeout=timeout,
+                                     retry_policy=retry_policy)
+        if isinstance(host, (list, tuple)):
+            host = host[0]
+
+        if socket_path:
+            msgr = UnixSocketMessenger(socket_path, timeout, connect_timeout,
+                                       retry_policy, pool_size, codec)
+        elif https_extension:
+            msgr = HttpMessenger(host, timeout, connect_timeout, retry_policy,
+                                 codec, compress_threshold)
+        else:
+            host, port = _split_host_port(host, port)
+            msgr = SocketMessenger(host, int(port), timeout, connect_timeout,
+                                   retry_policy, pool_size, codec)
+        msgr.max_response_size = max_response_size
+        msgr.incremental = incremental
+        return msgr
 
     def request(self, command, **kwargs):
         """Mandatory function that should be implemented by the subclasses. The
@@ -27,13 +166,36 @@ class Messenger(object):
 
         Args:
             command (str): The command that has to be sent to the oxd-server
-            **kwargs: The parameters that should accompany the request
+            **kwargs: The parameters that should accompany the request. A
+                ``protection_access_token`` parameter is used instead of the
+                access token of the messenger.
 
         Returns:
             dict: the returned response from oxd-server as a dictionary
         """
         pass
 
+    def probe(self, timeout=None):
+        """Checks that the server accepts connections, used as the health
+        check of load balanced messengers.
+
+        Args:
+            timeout (float, optional): seconds allowed for connecting
+
+        Raises:
+            socket.error: when the server cannot be reached
+        """
+        raise NotImplementedError
+
+    def _check_size(self, length):
+        """Raises OxdResponseTooLargeError when a response of length bytes
+        is not accepted."""
+        if self.max_response_size is not None and \
+                length > self.max_response_size:
+            raise OxdResponseTooLargeError(
+                "The response of %s is %d bytes long, more than the maximum "
+                "of %d" % (self, length, self.max_response_size))
+
     @property
     def access_token(self):
         return self._access_token
@@ -46,36 +208,150 @@ class Messenger(object):
         self._access_token = token
 
 
+class WrappedMessenger(Messenger):
+    """Base class for messengers adding behaviour on top of another messenger.
+    The protection access token is shared with the wrapped messenger.
+
+    Args:
+        msgr (Messenger): the messenger to which the requests are passed on
+    """
+    def __init__(self, msgr):
+        Messenger.__init__(self)
+        self.msgr = msgr
+
+    def request(self, command, **kwargs):
+        return self.msgr.request(command, **kwargs)
+
+    @property
+    def access_token(self):
+        return self.msgr.access_token
+
+    @access_token.setter
+    def access_token(self, token):
+        self.msgr.access_token = token
+
+    def __str__(self):
+        return "%s(%s)" % (self.__class__.__name__, self.msgr)
+
+
 class SocketMessenger(Messenger):
     """A class which takes care of the socket communication with oxd Server.
     The object is initialized with the port number
+
+    A connection carries one command at a time, so the messenger keeps a pool
+    of connections for the threads sending commands concurrently. A thread
+    waits for a connection when all of them are busy.
     """
-    def __init__(self, host='localhost', port=8099):
+    def __init__(self, host='localhost', port=8099, timeout=None,
+                 connect_timeout=None, retry_policy=None, pool_size=4,
+                 codec=None):
         """Constructor for SocketMessenger
 
         Args:
             host (str) - the host to connect for oxd-server, default localhost
             port (integer) - the port number to bind to the host, default
                              is 8099
+            timeout (float) - seconds allowed for a whole request, default
+                              is no timeout
+            connect_timeout (float) - seconds allowed for connecting, default
+                                      is the remaining time of the request
+            retry_policy (RetryPolicy) - decides which failed requests are
+                                         sent again
+            pool_size (integer) - the maximum number of connections, default
+                                  is 4
+            codec (JsonCodec) - the JSON codec, default is the fastest
+                                installed backend
         """
-        Messenger.__init__(self)
+        Messenger.__init__(self, timeout, connect_timeout, retry_policy, codec)
         self.host = host
         self.port = port
-        self.sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+        self.pool_size = pool_size
+        # connected sockets waiting for a command
+        self._idle = []
+        self._busy = 0
+        self._waiting = 0
+        self._available = threading.Condition(threading.Lock())
+        forking.register(self)
+
+    def _after_fork(self):
+        """Drops the connections inherited from the parent process, which
+        keeps using them."""
+        for sock in self._idle:
+            sock.close()
+        self._idle = []
+        self._busy = 0
+        self._waiting = 0
+        self._available = threading.Condition(threading.Lock())
+
+    def _socket(self):
+        if ":" in self.host:
+            logger.debug("Creating a AF_INET6, SOCK_STREAM socket.")
+            return socket.socket(socket.AF_INET6, socket.SOCK_STREAM)
         logger.debug("Creating a AF_INET, SOCK_STREAM socket.")
-        self.firstDone = False
+        return socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+
+    def _address(self):
+        return self.host, self.port
 
     def __connect(self):
         """A helper function to make connection."""
+        logger.debug("Socket connecting to %s", self)
+        sock = self._socket()
         try:
-            logger.debug("Socket connecting to %s:%s", self.host, self.port)
-            self.sock.connect((self.host, self.port))
+            sock.settimeout(deadline.remaining(self.connect_timeout))
+            sock.connect(self._address())
         except socket.error as e:
-            logger.exception("socket error %s", e)
-            logger.error("Closing socket and recreating a new one.")
-            self.sock.close()
-            self.sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
-            self.sock.connect((self.host, self.port))
+            # a connect timeout as well, nothing was sent yet
+            sock.close()
+            raise OxdConnectionError("Could not connect to %s: %s" % (self, e),
+                                     sent=False)
+        except:
+            sock.close()
+            raise
+        return sock
+
+    def _checkout(self):
+        """Takes an idle connection or opens a new one, waiting while the
+        pool is exhausted."""
+        with self._available:
+            while self._busy >= self.pool_size:
+                self._waiting += 1
+                try:
+                    self._available.wait(deadline.remaining())
+                finally:
+                    self._waiting -= 1
+            self._busy += 1
+            if self._idle:
+                return self._idle.pop()
+        try:
+            logger.info('Opening a new socket connection.')
+            return self.__connect()
+        except:
+            self._checkin(None)
+            raise
+
+    def _checkin(self, sock):
+        """Returns a connection to the pool. None frees the slot of a closed
+        connection."""
+        with self._available:
+            self._busy -= 1
+            if sock is not None:
+                self._idle.append(sock)
+            if self._waiting:
+                self._available.notify()
+
+    def close(self):
+        """Closes the idle connections."""
+        with self._available:
+            idle, self._idle = self._idle, []
+        for sock in idle:
+            sock.close()
+
+    def _frame(self, command):
+        """Serializes the command into a frame of the oxd-server protocol,
+        which is the JSON string prefixed by its length as 4 digits."""
+        cmd = self.codec.encode(command)
+        return "%04d" % len(cmd) + cmd
 
     def send(self, command):
         """send function sends the command to the oxd server and recieves the
@@ -86,56 +362,99 @@ class SocketMessenger(Messenger):
 
         Returns:
             response (dict) - The JSON response from the oxd Server as a dict
+
+        Raises:
+            OxdTimeoutError - when the deadline of the current thread passes
+            OxdConnectionError - when the connection fails or breaks
         """
-        cmd = json.dumps(command)
-        cmd = "{:04d}".format(len(cmd)) + cmd
+        forking.check()
+        frame = self._frame(command)
+        sock = None
+        try:
+            sock = self._checkout()
+            response = self.__exchange(sock, frame)
+        except socket.timeout:
+            self.__discard(sock)
+            raise OxdTimeoutError("Timed out communicating with %s" % self)
+        except:
+            # the connection may hold a partial frame, don't reuse it
+            self.__discard(sock)
+            raise
+        self._checkin(sock)
+        return response
+
+    def __discard(self, sock):
+        if sock is None:
+            # the checkout failed and freed its slot itself
+            return
+        logger.info("Closing the connection to %s", self)
+        sock.close()
+        self._checkin(None)
+
+    def __exchange(self, sock, cmd):
+        """Sends the frame and receives the response frame."""
         msg_length = len(cmd)
 
-        # make the first time connection
-        if not self.firstDone:
-            logger.info('Initiating first time socket connection.')
-            self.__connect()
-            self.firstDone = True
-
-        # Send the message the to the server
+        # Send the message the to the server. Until the whole frame is sent,
+        # oxd-server has not received a complete command.
         totalsent = 0
-        while totalsent < msg_length:
-            try:
+        try:
+            while totalsent < msg_length:
                 logger.debug("Sending: %s", cmd[totalsent:])
-                sent = self.sock.send(cmd[totalsent:])
+                sock.settimeout(deadline.remaining())
+                sent = sock.send(cmd[totalsent:])
                 totalsent = totalsent + sent
-            except socket.error as e:
-                logger.exception("Reconneting due to socket error. %s", e)
-                self.__connect()
-                logger.info("Reconnected to socket.")
-
-        # Check and receive the response if available
-        parts = []
-        resp_length = 0
+        except socket.timeout:
+            raise
+        except socket.error as e:
+            raise OxdConnectionError("Sending to %s failed: %s" % (self, e),
+                                     sent=False)
+
+        # Receive the response, decoding it as it arrives. The rest of the
+        # frame is read even if the codec stops early, so that the connection
+        # can be reused.
+        reader = _ChunkReader(self.__receive(sock))
+        response = self.codec.load(reader, self.incremental)
+        reader.read()
+        return response
+
+    def __receive(self, sock):
+        """Yields the parts of the response frame as they are received."""
+        header = ""
+        resp_length = None
         received = 0
-        done = False
-        while not done:
-            part = self.sock.recv(1024)
+        while resp_length is None or received < resp_length:
+            if resp_length is None:
+                size = 1024
+            else:
+                size = min(resp_length - received, 65536)
+            try:
+                sock.settimeout(deadline.remaining())
+                part = sock.recv(size)
+            except socket.timeout:
+                raise
+            except socket.error as e:
+                raise OxdConnectionError("Receiving from %s failed: %s" % (
+                    self, e), sent=True)
             if part == "":
                 logger.error("Socket connection broken, read empty.")
-                self.__connect()
-                logger.info("Reconnected to socket.")
-
-            # Find out the length of the response
-            if len(part) > 0 and resp_length == 0:
-                resp_length = int(part[0:4])
-                part = part[4:]
+                raise OxdConnectionError("oxd-server closed the connection "
+                                         "before the response was complete",
+                                         sent=True)
+
+            # Find out the length of the response, the 4 digit prefix might
+            # arrive split over several reads
+            if resp_length is None:
+                header += part
+                if len(header) < 4:
+                    continue
+                resp_length = int(header[0:4])
+                self._check_size(resp_length)
+                part = header[4:]
 
-            # Set Done flag
             received = received + len(part)
-            if received >= resp_length:
-                done = True
-
-            parts.append(part)
-
-        response = "".join(parts)
-        # return the JSON as a namedtuple object
-        return json.loads(response)
+            if part:
+                yield part
 
     def request(self, command, **kwargs):
         """Function that builds the request and returns the response from
@@ -155,24 +474,88 @@ class SocketMessenger(Messenger):
         for item in kwargs.keys():
             payload["params"][item] = kwargs.get(item)
 
-        if self.access_token:
+        if self.access_token and \
+                not payload["params"].get("protection_access_token"):
             payload["params"]["protection_access_token"] = self.access_token
 
-        return self.send(payload)
+        with deadline.scope(self.timeout):
+            return self.retry_policy.call(command,
+                                          lambda: self.send(payload))
+
+    def probe(self, timeout=None):
+        socket.create_connection((self.host, self.port), timeout).close()
 
     def __str__(self):
         return "SocketMessenger(%s, %s)" % (self.host, self.port)
 
 
+class UnixSocketMessenger(SocketMessenger):
+    """Messenger for an oxd-server on the same host listening on a Unix domain
+    socket. It speaks the same protocol as the ``SocketMessenger`` without the
+    overhead of TCP.
+
+    Args:
+        path (str): the path of the socket of the oxd-server
+        timeout (float, optional): seconds allowed for a whole request
+        connect_timeout (float, optional): seconds allowed for connecting
+        retry_policy (RetryPolicy, optional): decides which failed requests
+            are sent again
+        pool_size (int, optional): the maximum number of connections
+        codec (JsonCodec, optional): the JSON codec
+    """
+    def __init__(self, path, timeout=None, connect_timeout=None,
+                 retry_policy=None, pool_size=4, codec=None):
+        SocketMessenger.__init__(self, None, None, timeout, connect_timeout,
+                                 retry_policy, pool_size, codec)
+        self.path = path
+
+    def _socket(self):
+        logger.debug("Creating a AF_UNIX, SOCK_STREAM socket.")
+        return socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+
+    def _address(self):
+        return self.path
+
+    def probe(self, timeout=None):
+        sock = self._socket()
+        try:
+            sock.settimeout(timeout)
+            sock.connect(self.path)
+        finally:
+            sock.close()
+
+    def __str__(self):
+        return "UnixSocketMessenger(%s)" % self.path
+
+
 class HttpMessenger(Messenger):
     """HttpMessenger provides the communication channel for oxd-https-extension
 
     Args:
         host (str): host URL to which the requests are to be made
+        timeout (float, optional): seconds allowed for a whole request
+        connect_timeout (float, optional): seconds allowed for connecting and
+            for every read of the response, default is the remaining time of
+            the request
+        retry_policy (RetryPolicy, optional): decides which failed requests
+            are sent again
+        codec (JsonCodec, optional): the JSON codec
+        compress_threshold (int, optional): request bodies of at least this
+            many bytes are sent gzip compressed. Default None sends them
+            uncompressed.
+
+    Responses compressed with gzip or deflate, zlib wrapped or raw, are
+    decompressed while they are read, so a large response is never held
+    compressed and expanded at once.
     """
-    def __init__(self, host):
-        Messenger.__init__(self)
+    #: the encodings of the responses accepted from the server
+    ACCEPT_ENCODING = "gzip, deflate"
+
+    def __init__(self, host, timeout=None, connect_timeout=None,
+                 retry_policy=None, codec=None, compress_threshold=None):
+        Messenger.__init__(self, timeout, connect_timeout, retry_policy, codec)
         self.base = self.__base_url(host)
+        self.compress_threshold = compress_threshold
 
     def __base_url(self, host):
         if host[-1] != "/":
@@ -191,23 +574,143 @@ class HttpMessenger(Messenger):
 
         Returns:
             dict: the returned response from oxd-server as a dictionary
+
+        Raises:
+            OxdTimeoutError: when the deadline of the current thread passes
         """
+        forking.check()
         url = self.base + command.replace("_", "-")
+        token = kwargs.pop("protection_access_token", None) or \
+            self.access_token
+
+        body = self.codec.encode(kwargs)
+        compress = self.compress_threshold is not None and \
+            len(body) >= self.compress_threshold
+        if compress:
+            body = self._gzip(body)
 
-        req = urllib2.Request(url, json.dumps(kwargs))
+        req = urllib2.Request(url, body)
         req.add_header("User-Agent", "oxdpython/%s" % __version__)
         req.add_header("Content-type", "application/json; charset=UTF-8")
-
+        req.add_header("Accept-Encoding", self.ACCEPT_ENCODING)
+        if compress:
+            req.add_header("Content-Encoding", "gzip")
 
         # add the protection token if available
-        if self.access_token:
-            req.add_header("Authorization",
-                           "Bearer {0}".format(self.access_token))
+        if token:
+            req.add_header("Authorization", "Bearer {0}".format(token))
+
+        with deadline.scope(self.timeout):
+            return self.retry_policy.call(command, lambda: self.__send(req))
 
+    def __send(self, req):
+        """Sends the request and returns the decoded response, translating
+        the errors of the connection."""
         gcontext = ssl.SSLContext(ssl.PROTOCOL_TLSv1)
-        resp = urllib2.urlopen(req, context=gcontext)
+        try:
+            timeout = deadline.remaining(self.connect_timeout)
+            if timeout is None:
+                resp = urllib2.urlopen(req, context=gcontext)
+            else:
+                resp = urllib2.urlopen(req, context=gcontext, timeout=timeout)
+            return self.__read(resp)
+        except socket.timeout:
+            raise OxdTimeoutError("Timed out communicating with %s" % self)
+        except urllib2.HTTPError:
+            raise
+        except urllib2.URLError as e:
+            # urllib2 wraps the errors raised while sending the request
+            if isinstance(e.reason, socket.timeout):
+                raise OxdTimeoutError("Timed out connecting to %s" % self)
+            raise OxdConnectionError("Sending to %s failed: %s" % (
+                self, e.reason), sent=False)
+        except (socket.error, httplib.HTTPException) as e:
+            raise OxdConnectionError("Receiving from %s failed: %r" % (
+                self, e), sent=True)
 
-        return json.load(resp)
+    @staticmethod
+    def _gzip(data):
+        compressor = zlib.compressobj(6, zlib.DEFLATED, 16 + zlib.MAX_WBITS)
+        return compressor.compress(data) + compressor.flush()
+
+    def __read(self, resp):
+        """Reads and decodes the response body in chunks, so that the
+        deadline is also enforced on a server trickling the response."""
+        headers = resp.info()
+        length = headers.getheader("Content-Length")
+        if length is not None:
+            self._check_size(int(length))
+        encoding = (headers.getheader("Content-Encoding") or "").lower()
+        compressed = encoding in ("gzip", "x-gzip", "deflate")
+        if not compressed and encoding not in ("", "identity"):
+            raise OxdConnectionError("%s sent a response with the unsupported "
+                                     "Content-Encoding %s" % (self, encoding),
+                                     sent=True)
+        try:
+            return self.codec.load(_ChunkReader(self.__receive(
+                resp, encoding if compressed else None)), self.incremental)
+        finally:
+            resp.close()
+
+    def __receive(self, resp, encoding):
+        """Yields the decompressed parts of the response body as they are
+        received, checking the deadline and the size limit."""
+        inflater = None
+        received = 0
+        while True:
+            deadline.remaining()
+            chunk = resp.read(65536)
+            if not chunk:
+                break
+            if encoding is not None:
+                if inflater is None:
+                    inflater = self._inflater(encoding, chunk)
+                for data in self.__inflate(inflater, chunk):
+                    if not data:
+                        continue
+                    received += len(data)
+                    self._check_size(received)
+                    yield data
+            else:
+                received += len(chunk)
+                self._check_size(received)
+                yield chunk
+        if inflater is not None:
+            data = inflater.flush()
+            if data:
+                self._check_size(received + len(data))
+                yield data
+
+    @staticmethod
+    def _inflater(encoding, head):
+        """Returns the decompressor of a response body starting with head.
+        A deflate body should carry a zlib header, but many servers send the
+        raw deflate stream instead."""
+        if encoding == "deflate" and not (
+                len(head) >= 2 and ord(head[0]) & 0x0f == zlib.DEFLATED and
+                (ord(head[0]) << 8 | ord(head[1])) % 31 == 0):
+            return zlib.decompressobj(-zlib.MAX_WBITS)
+        # detects the gzip and zlib headers
+        return zlib.decompressobj(32 + zlib.MAX_WBITS)
+
+    def __inflate(self, inflater, chunk):
+        """Yields the decompressed chunk in pieces of 64 KB, so that the size
+        limit applies before a small chunk expands to a huge string."""
+        try:
+            data = inflater.decompress(chunk, 65536)
+            while True:
+                yield data
+                if not inflater.unconsumed_tail:
+                    return
+                data = inflater.decompress(inflater.unconsumed_tail, 65536)
+        except zlib.error as e:
+            raise OxdConnectionError("Decompressing the response of %s "
+                                     "failed: %s" % (self, e), sent=True)
+
+    def probe(self, timeout=None):
+        url = urlparse.urlparse(self.base)
+        port = url.port or (443 if url.scheme == "https" else 80)
+        socket.create_connection((url.hostname, port), timeout).close()
 
     def __str__(self):
         return "HttpMessenger(%s)" % self.base
@@ -0,0 +1,186 @@
+"""Bulk provisioning and teardown of many sites.
+
+Onboarding a region registers hundreds of sites with oxd, each described by
+its own config file. :func:`provision` runs the registration of all the sites
+of a manifest concurrently, over one shared messenger, and writes the oxd ids
+and tokens to the config files in one batch at the end. :func:`teardown` runs
+``remove_site`` for them in the same way.
+
+A manifest lists the config files, one per line, relative to the manifest::
+
+    # region eu-west
+    sites/shop.cfg
+    sites/blog.cfg
+
+The progress is kept in the config files themselves: a site whose config
+already holds an oxd id is not registered again, and a site without one is
+not removed. Running the same command again after a partial failure resumes
+where it stopped. It is installed as the ``oxdpython-provision`` command::
+
+    oxdpython-provision sites.manifest --concurrency 16
+    oxdpython-provision sites.manifest --setup-client
+    oxdpython-provision sites.manifest --remove
+"""
+import argparse
+import collections
+import logging
+import os
+import sys
+
+from .client import Client
+from .configurer import Configurer
+from .executor import Executor
+from .registry import SiteMessenger
+
+logger = logging.getLogger(__name__)
+
+#: The outcome for one site: the oxd id, or the exception which stopped it
+Result = collections.namedtuple("Result", ["config", "oxd_id", "error"])
+
+
+def read_manifest(path):
+    """Returns the paths of the config files listed in a manifest, skipping
+    blank lines and comments."""
+    base = os.path.dirname(os.path.abspath(path))
+    with open(path) as manifest:
+        lines = [line.split("#", 1)[0].strip() for line in manifest]
+    return [os.path.join(base, line) for line in lines if line]
+
+
+def _register(client, setup_client):
+    if not setup_client:
+        return client.register_site()
+    if not (client.oxd_id and client.credentials.client_id):
+        client.setup_client()
+    if not client.config.get("client", "protection_access_token"):
+        client.get_client_token(auto_update=False)
+    return client.oxd_id
+
+
+def _remove(client, setup_client):
+    if not client.oxd_id:
+        return None
+    oxd_id = client.remove_site()
+    for key in ["id", "shard"]:
+        client.config.remove("oxd", key)
+    if setup_client:
+        for key in ["client_id", "client_secret", "protection_access_token",
+                    "client_registration_access_token",
+                    "client_registration_client_uri", "client_id_issued_at"]:
+            client.config.remove("client", key)
+    client.oxd_id = None
+    return oxd_id
+
+
+def _run(step, configs, setup_client, concurrency, oxd_config):
+    configurers = [Configurer(path) for path in configs]
+    if not configurers:
+        return []
+    # one messenger with a connection per concurrent site
+    shared = Client(Configurer(oxd_config or configs[0],
+                               {"oxd": {"pool_size": str(concurrency)}}))
+    executor = Executor(concurrency, name="oxdpython provision")
+    deferred = [config.deferred() for config in configurers]
+    for context in deferred:
+        context.__enter__()
+    try:
+        futures = []
+        for config in configurers:
+            client = Client(config, msgr=SiteMessenger(shared.msgr),
+                            executor=executor)
+            futures.append(executor.submit(step, client, setup_client))
+        results = []
+        for path, future in zip(configs, futures):
+            try:
+                results.append(Result(path, future.result(), None))
+            except Exception as e:
+                logger.warning("%s failed for %s: %s", step.__name__, path, e)
+                results.append(Result(path, None, e))
+        return results
+    finally:
+        # written also when interrupted, to keep the oxd ids of the sites
+        # registered so far
+        for context in deferred:
+            context.__exit__(None, None, None)
+        executor.shutdown(wait=False)
+
+
+def provision(configs, setup_client=False, concurrency=8, oxd_config=None):
+    """Registers the sites of the config files concurrently, skipping the
+    ones already registered.
+
+    Args:
+        configs (list): the paths of the config files of the sites
+        setup_client (bool, optional): register with ``setup_client`` and get
+            a protection access token with ``get_client_token``, as needed by
+            the oxd-https-extension, instead of ``register_site``. Default
+            False.
+        concurrency (int, optional): the number of sites registered at the
+            same time. Default 8.
+        oxd_config (str, optional): the config whose [oxd] section configures
+            the shared messenger, default is the first config file
+
+    Returns:
+        list: a :data:`Result` for each config file in order
+    """
+    return _run(_register, configs, setup_client, concurrency, oxd_config)
+
+
+def teardown(configs, setup_client=False, concurrency=8, oxd_config=None):
+    """Removes the sites of the config files from oxd concurrently, and their
+    oxd ids from the config files. Sites without an oxd id are skipped.
+
+    Args:
+        configs (list): the paths of the config files of the sites
+        setup_client (bool, optional): also remove the client credentials and
+            the protection access token from the config files. Default False.
+        concurrency (int, optional): the number of sites removed at the same
+            time. Default 8.
+        oxd_config (str, optional): the config of the shared messenger
+
+    Returns:
+        list: a :data:`Result` for each config file in order, with the removed
+        oxd id or None when the site was not registered
+    """
+    return _run(_remove, configs, setup_client, concurrency, oxd_config)
+
+
+def format_results(results):
+    lines = []
+    for result in results:
+        if result.error is not None:
+            lines.append("FAILED %s: %s" % (result.config, result.error))
+        else:
+            lines.append("ok     %s %s" % (result.config, result.oxd_id or "-"))
+    failed = sum(1 for r in results if r.error is not None)
+    lines.append("%d sites, %d failed" % (len(results), failed))
+    return "\n".join(lines)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(
+        prog="oxdpython-provision",
+        description="Register or remove the sites listed in a manifest of "
+                    "config files. Run it again to resume after failures.")
+    parser.add_argument("manifest", help="file listing the config files of "
+                                         "the sites, one per line")
+    parser.add_argument("--remove", action="store_true",
+                        help="remove the sites instead of registering them")
+    parser.add_argument("--setup-client", action="store_true",
+                        help="use setup_client and get_client_token instead "
+                             "of register_site")
+    parser.add_argument("-c", "--concurrency", type=int, default=8)
+    parser.add_argument("--oxd-config",
+                        help="config file of the oxd to use, default is the "
+                             "first config file of the manifest")
+    args = parser.parse_args(argv)
+
+    run = teardown if args.remove else provision
+    results = run(read_manifest(args.manifest), args.setup_client,
+                  args.concurrency, args.oxd_config)
+    print format_results(results)
+    return 1 if any(r.error is not None for r in results) else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,189 @@
+"""Recording and replaying the traffic between the Client and oxd.
+
+:class:`RecordingMessenger` wraps any messenger and writes every command, its
+params, the response and the timing to a gzipped file of JSON lines.
+:class:`ReplayMessenger` serves the responses from such a file without any
+oxd-server, optionally pacing them with the recorded or scaled latencies, and
+:func:`play` sends the recorded commands through any messenger in their
+original rhythm. Together they allow a slice of production traffic to be
+captured once and used as a deterministic benchmark in CI::
+
+    client.msgr = RecordingMessenger(client.msgr, '/tmp/traffic.jsonl.gz')
+    ...
+    client.msgr.close()
+
+    backend = ReplayMessenger('/tmp/traffic.jsonl.gz', scale=0.5)
+    play('/tmp/traffic.jsonl.gz', backend)
+
+The protection access token of the messenger is not recorded, and the values
+of the secrets in :data:`SECRET_KEYS` are replaced with ``REDACTED`` in the
+params and responses, so that recordings can be shared. Replayed requests are
+matched with their secrets redacted the same way, and :func:`play` sends the
+redacted values.
+"""
+import collections
+import gzip
+import json
+import logging
+import threading
+import time
+
+from .messenger import Messenger, WrappedMessenger
+
+logger = logging.getLogger(__name__)
+
+#: A recorded exchange. offset is the start of the request in seconds since
+#: the start of the recording and elapsed the time taken by the request.
+Record = collections.namedtuple("Record",
+                                "command params response offset elapsed")
+
+#: The params and response fields whose values are not recorded
+SECRET_KEYS = frozenset(["protection_access_token", "client_secret",
+                         "access_token", "rpt", "refresh_token", "id_token"])
+
+REDACTED = "REDACTED"
+
+
+def redact(value):
+    """Returns a copy of the params or response with the values of the
+    :data:`SECRET_KEYS` replaced with ``REDACTED``, at any depth."""
+    if isinstance(value, dict):
+        return dict((k, REDACTED if k in SECRET_KEYS and v else redact(v))
+                    for k, v in value.items())
+    if isinstance(value, list):
+        return [redact(v) for v in value]
+    return value
+
+
+def load(path):
+    """Reads the records of a recording.
+
+    Args:
+        path (str): location of the recording
+
+    Returns:
+        list: the :class:`Record` objects in the order they were recorded
+    """
+    with gzip.open(path, "rb") as f:
+        return [Record(*json.loads(line)) for line in f if line.strip()]
+
+
+def _key(command, params):
+    return command, json.dumps(redact(params), sort_keys=True)
+
+
+class RecordingMessenger(WrappedMessenger):
+    """Messenger passing the requests on to another messenger and recording
+    them to a file.
+
+    Args:
+        msgr (Messenger): the messenger doing the actual communication
+        path (str): location of the recording, overwritten if it exists
+    """
+    def __init__(self, msgr, path):
+        WrappedMessenger.__init__(self, msgr)
+        self.path = path
+        self._file = gzip.open(path, "wb")
+        self._lock = threading.Lock()
+        self._start = time.time()
+
+    def request(self, command, **kwargs):
+        start = time.time()
+        response = self.msgr.request(command, **kwargs)
+        elapsed = time.time() - start
+
+        line = json.dumps([command, redact(kwargs), redact(response),
+                           round(start - self._start, 6), round(elapsed, 6)],
+                          separators=(",", ":"))
+        with self._lock:
+            if self._file:
+                self._file.write(line + "\n")
+        return response
+
+    def close(self):
+        """Flushes and closes the recording. Requests made afterwards are
+        still passed on but not recorded."""
+        with self._lock:
+            if self._file:
+                self._file.close()
+                self._file = None
+                logger.info("Recording saved to %s", self.path)
+
+
+class ReplayMessenger(Messenger):
+    """Messenger answering the commands with the responses of a recording.
+
+    Responses are looked up by the command and its params. When the same
+    request was recorded several times, the responses are served in the
+    recorded order and the last one is repeated afterwards. Without ``strict``
+    a request with unrecorded params gets the responses recorded for the
+    command in the same fashion.
+
+    Args:
+        path (str): location of the recording
+        scale (float, optional): factor applied to the recorded latencies
+            before waiting them out, 0 answers at once. Default is 1, the
+            original timing.
+        strict (bool, optional): raise KeyError instead of falling back to
+            any response of the command when the params were not recorded
+    """
+    def __init__(self, path, scale=1.0, strict=False):
+        Messenger.__init__(self)
+        self.scale = scale
+        self.strict = strict
+        self._exact = collections.defaultdict(list)
+        self._by_command = collections.defaultdict(list)
+        for record in load(path):
+            self._exact[_key(record.command, record.params)].append(record)
+            self._by_command[record.command].append(record)
+        self._served = collections.defaultdict(int)
+        self._lock = threading.Lock()
+
+    def _next(self, key, records):
+        with self._lock:
+            index = min(self._served[key], len(records) - 1)
+            self._served[key] += 1
+        return records[index]
+
+    def request(self, command, **kwargs):
+        key = _key(command, kwargs)
+        if key in self._exact:
+            record = self._next(key, self._exact[key])
+        elif not self.strict and command in self._by_command:
+            record = self._next(command, self._by_command[command])
+        else:
+            raise KeyError("No recorded response for %s %s" % key)
+
+        if self.scale:
+            time.sleep(record.elapsed * self.scale)
+        return record.response
+
+    def __str__(self):
+        return "ReplayMessenger(scale=%s)" % self.scale
+
+
+def play(path, msgr, scale=1.0):
+    """Sends the commands of a recording through a messenger, starting each
+    at its recorded offset multiplied by scale. The requests are sent one
+    after another, so a request taking longer than the gap to the next one
+    delays the rest.
+
+    Args:
+        path (str): location of the recording
+        msgr (Messenger): the messenger to send the commands through
+        scale (float, optional): factor applied to the recorded offsets, 0
+            sends the commands back to back
+
+    Returns:
+        list: tuples of (command, response, elapsed seconds)
+    """
+    results = []
+    start = time.time()
+    for record in load(path):
+        wait = record.offset * scale - (time.time() - start)
+        if wait > 0:
+            time.sleep(wait)
+        begin = time.time()
+        response = msgr.request(record.command, **record.params)
+        results.append((record.command, response, time.time() - begin))
+    return results
@@ -0,0 +1,195 @@
+"""Many sites served from one process.
+
+A :class:`~oxdpython.client.Client` per site builds its own messenger, and so
+its own connection to oxd, and its own thread for refreshing the protection
+token. :class:`ClientRegistry` creates the messenger, the cache and the
+scheduler once from a shared config, and gives each site a lightweight client
+on top of them, which only keeps the oxd_id, the redirect URI and the
+protection token of the site.
+
+The clients are loaded on first use by a loader returning the config of the
+site, and unloaded again when the registry is full or when they were idle for
+too long::
+
+    registry = ClientRegistry("/etc/oxd/shared.cfg",
+                              loader=lambda name: "/etc/oxd/sites/%s.cfg" % name,
+                              max_clients=500, idle_timeout=3600)
+    registry.get("shop").uma_rs_check_access(rpt, "/photoz", "GET")
+"""
+import collections
+import logging
+import threading
+import time
+
+from .cache import TTLCache
+from .client import Client
+from .configurer import Configurer
+from .messenger import Messenger, WrappedMessenger
+from .scheduler import Scheduler
+
+logger = logging.getLogger(__name__)
+
+
+class SiteMessenger(WrappedMessenger):
+    """Messenger sending the requests of one site over a shared messenger,
+    with the protection access token of the site. Unlike other wrapped
+    messengers it keeps its own token, which never reaches the shared
+    messenger.
+
+    Args:
+        msgr (Messenger): the shared messenger
+    """
+    def __init__(self, msgr):
+        WrappedMessenger.__init__(self, msgr)
+
+    @property
+    def access_token(self):
+        return self._access_token
+
+    @access_token.setter
+    def access_token(self, token):
+        # kept on the site messenger, not passed on to the shared messenger
+        # carrying the requests of all the sites
+        Messenger.access_token.fset(self, token)
+
+    def request(self, command, **kwargs):
+        if self._access_token:
+            kwargs.setdefault("protection_access_token", self._access_token)
+        return self.msgr.request(command, **kwargs)
+
+
+class ClientRegistry(object):
+    """Holds the clients of many sites sharing one messenger, cache,
+    scheduler and executor.
+
+    Args:
+        config_location (str): the config whose [oxd] section configures the
+            shared messenger
+        loader (callable, optional): returns the config of a site by name,
+            either a path or a :class:`~oxdpython.configurer.Configurer`
+        max_clients (int, optional): the number of clients kept loaded, the
+            least recently used ones are unloaded first. Default 1000.
+        idle_timeout (float, optional): seconds after which an unused client
+            is unloaded. Default is no timeout.
+        cache (TTLCache, optional): the cache shared by the clients
+        scheduler (Scheduler, optional): refreshes the protection tokens of
+            the clients
+        executor (Executor, optional): runs the calls submitted to the
+            clients, default is one executor sized to the shared messenger
+    """
+    def __init__(self, config_location, loader=None, max_clients=1000,
+                 idle_timeout=None, cache=None, scheduler=None,
+                 executor=None):
+        self.loader = loader
+        self.max_clients = max_clients
+        self.idle_timeout = idle_timeout
+        self.cache = cache if cache is not None else TTLCache()
+        self.scheduler = scheduler if scheduler is not None else Scheduler()
+        shared = Client(config_location)
+        self.msgr = shared.msgr
+        self.shards = shared.shards
+        self.executor = executor if executor is not None else shared.executor
+        self._clients = collections.OrderedDict()
+        self._lock = threading.Lock()
+        if idle_timeout:
+            self.scheduler.schedule(idle_timeout, self._sweep)
+
+    def add(self, name, config):
+        """Creates the client of a site, replacing any loaded one.
+
+        Args:
+            name (str): the name of the site
+            config (str, dict or Configurer): the config file of the site,
+                or its settings by key by section
+
+        Returns:
+            Client: the client of the site
+        """
+        if isinstance(config, dict):
+            config = Configurer(None, config)
+        client = Client(config, msgr=SiteMessenger(self.msgr),
+                        shards=self.shards, cache=self.cache,
+                        scheduler=self.scheduler, executor=self.executor)
+        with self._lock:
+            old = self._clients.pop(name, None)
+            self._clients[name] = [client, time.time()]
+            unloaded = self._evict()
+        if old is not None:
+            unloaded.append((name, old[0]))
+        self._unload(unloaded)
+        return client
+
+    def get(self, name):
+        """Returns the client of a site, loading it when needed.
+
+        Raises:
+            KeyError: when the site is neither loaded nor known to the loader
+        """
+        with self._lock:
+            entry = self._clients.pop(name, None)
+            if entry is not None:
+                entry[1] = time.time()
+                self._clients[name] = entry
+                return entry[0]
+        if self.loader is None:
+            raise KeyError(name)
+        config = self.loader(name)
+        if config is None:
+            raise KeyError(name)
+        logger.debug("Loading the client of %s", name)
+        return self.add(name, config)
+
+    __getitem__ = get
+
+    def remove(self, name):
+        """Unloads the client of a site, if loaded."""
+        with self._lock:
+            entry = self._clients.pop(name, None)
+        if entry is not None:
+            self._unload([(name, entry[0])])
+
+    def __contains__(self, name):
+        return name in self._clients
+
+    def __len__(self):
+        return len(self._clients)
+
+    def _evict(self):
+        """Removes the least recently used clients beyond max_clients, the
+        lock must be held. Returns the removed (name, client) pairs."""
+        evicted = []
+        while len(self._clients) > self.max_clients:
+            name, (client, _) = self._clients.popitem(last=False)
+            evicted.append((name, client))
+        return evicted
+
+    def _unload(self, clients):
+        for name, client in clients:
+            logger.debug("Unloading the client of %s", name)
+            client.close()
+
+    def expire(self):
+        """Unloads the clients idle for longer than the idle timeout."""
+        if not self.idle_timeout:
+            return
+        limit = time.time() - self.idle_timeout
+        with self._lock:
+            idle = [(n, c) for n, (c, used) in self._clients.items()
+                    if used <= limit]
+            for name, _ in idle:
+                del self._clients[name]
+        self._unload(idle)
+
+    def _sweep(self):
+        self.expire()
+        self.scheduler.schedule(self.idle_timeout, self._sweep)
+
+    def close(self):
+        """Unloads all the clients and stops the scheduler and the
+        executor."""
+        with self._lock:
+            clients = list((n, e[0]) for n, e in self._clients.items())
+            self._clients.clear()
+        self._unload(clients)
+        self.scheduler.stop()
+        self.executor.shutdown(wait=False)
@@ -0,0 +1,133 @@
+"""Retrying the commands that failed due to a broken connection.
+
+Whether a command may be sent again depends on what it does. Idempotent
+commands only read state, so they are resent whenever the connection fails.
+Other commands, like `register_site` or `get_tokens_by_code`, are only resent
+when the request certainly did not reach the server, that is when connecting
+or sending the request failed, but not when the response was lost.
+
+Between the attempts the policy waits for an exponentially growing, randomly
+jittered delay, never beyond the deadline of the request. A retry budget caps
+the number of retries in a time window, so that a struggling oxd-server is not
+flooded with retries from every thread.
+"""
+import collections
+import logging
+import random
+import threading
+import time
+
+from . import deadline
+from .exceptions import OxdConnectionError
+
+logger = logging.getLogger(__name__)
+
+#: Commands that only read state and are safe to resend
+IDEMPOTENT_COMMANDS = frozenset([
+    "get_authorization_url",
+    "get_logout_uri",
+    "get_user_info",
+    "introspect_access_token",
+    "introspect_rpt",
+    "uma_rs_check_access",
+])
+
+
+class RetryPolicy(object):
+    """Retries commands failing with ``OxdConnectionError``.
+
+    Args:
+        retries (int, optional): the maximum number of retries of a request,
+            0 disables retrying. Default 2.
+        base_delay (float, optional): seconds to wait before the first retry,
+            doubled for each further retry. Default 0.05.
+        max_delay (float, optional): the cap of the delay in seconds.
+            Default 1.
+        budget (int, optional): the maximum number of retries in a window
+            over all requests sharing the policy. Default 10.
+        window (float, optional): the length of the budget window in seconds.
+            Default 1.
+        idempotent (iterable, optional): the commands which are safe to
+            resend after the request reached the server. Default is
+            :data:`IDEMPOTENT_COMMANDS`.
+    """
+    def __init__(self, retries=2, base_delay=0.05, max_delay=1.0, budget=10,
+                 window=1.0, idempotent=IDEMPOTENT_COMMANDS):
+        self.retries = retries
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self.budget = budget
+        self.window = window
+        self.idempotent = frozenset(idempotent)
+        self._spent = collections.deque()
+        self._lock = threading.Lock()
+
+    def backoff(self, attempt):
+        """Returns the seconds to wait before the given retry, with full
+        jitter.
+
+        Args:
+            attempt (int): the retry number starting from 1
+        """
+        cap = min(self.max_delay, self.base_delay * 2 ** (attempt - 1))
+        return random.uniform(0, cap)
+
+    def _take_budget(self):
+        now = time.time()
+        with self._lock:
+            while self._spent and self._spent[0] <= now - self.window:
+                self._spent.popleft()
+            if len(self._spent) >= self.budget:
+                return False
+            self._spent.append(now)
+            return True
+
+    def retriable(self, command, error):
+        """Tells whether the command may be sent again after the error."""
+        return not error.sent or command in self.idempotent
+
+    def wait(self, command, error, attempt):
+        """Waits before the given retry of the command, when retries, budget
+        and deadline allow it.
+
+        Args:
+            command (str): the oxd command which failed
+            error (OxdConnectionError): the error of the failed attempt
+            attempt (int): the retry number starting from 1
+
+        Returns:
+            bool: True when the command may be sent again, after the backoff
+        """
+        if attempt > self.retries or not self.retriable(command, error):
+            return False
+        delay = self.backoff(attempt)
+        remaining = deadline.remaining()
+        if remaining is not None and remaining <= delay:
+            return False
+        if not self._take_budget():
+            logger.warning("Retry budget exhausted, not retrying %s", command)
+            return False
+        logger.info("Retrying %s in %.3fs after: %s", command, delay, error)
+        time.sleep(delay)
+        return True
+
+    def call(self, command, func):
+        """Calls func and calls it again when it raises a retriable
+        ``OxdConnectionError``, as long as retries, budget and deadline
+        allow.
+
+        Args:
+            command (str): the oxd command sent by func
+            func (callable): sends the whole command and returns the response
+
+        Returns:
+            the value returned by func
+        """
+        attempt = 0
+        while True:
+            try:
+                return func()
+            except OxdConnectionError as e:
+                attempt += 1
+                if not self.wait(command, e, attempt):
+                    raise
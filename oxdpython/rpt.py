@@ -0,0 +1,156 @@
+"""Reuse of the RPTs obtained by a UMA requesting party.
+
+A requesting party calling a protected API gets a permission ticket with
+every 401 response, and exchanges it with ``uma_rp_get_rpt`` for a new RPT.
+An :class:`RptCache` keeps the RPT obtained for each resource server and set
+of scopes until it expires, so that the following calls send it right away::
+
+    rpts = RptCache(client)
+    rpt = rpts.get("https://rs.example.com", ["view"])
+    if rpt is None:  # or the resource server answered 401 with a ticket
+        rpt = rpts.obtain("https://rs.example.com", ticket,
+                          ["view"])["access_token"]
+
+When a ticket is exchanged while an RPT for the resource server is held,
+the RPT is passed on to ``uma_rp_get_rpt`` to be upgraded with the new
+permissions, and the persisted claims token (pct) of the last exchange is
+sent along so that the claims need not be gathered again.
+"""
+import collections
+import logging
+import threading
+import time
+
+from .cache import TTLCache
+
+logger = logging.getLogger(__name__)
+
+#: An RPT held for a resource server, with the time it expires at, if known,
+#: and its permissions, if it was introspected
+Rpt = collections.namedtuple("Rpt", ["rpt", "pct", "expires", "permissions"])
+
+
+class RptCache(object):
+    """Caches the RPTs of a client by resource server and scopes.
+
+    Args:
+        client (Client): the client of the requesting party
+        cache (TTLCache, optional): the cache holding the RPTs, shared with
+            other clients, default is a cache of 1024 RPTs
+        leeway (float, optional): the seconds before its expiry an RPT is no
+            longer used, to allow for the time of the call. Default 30.
+        introspect (bool, optional): introspect the RPTs which come without
+            ``expires_in`` to learn their expiry and permissions. Default
+            True.
+        ttl (float, optional): the seconds an RPT of unknown expiry is kept,
+            None keeps it until it is invalidated. Default None.
+    """
+    def __init__(self, client, cache=None, leeway=30, introspect=True,
+                 ttl=None):
+        self.client = client
+        self.cache = cache if cache is not None else TTLCache()
+        self.leeway = leeway
+        self.introspect = introspect
+        self.ttl = ttl
+        # the key of the RPT obtained last by resource server, to be upgraded
+        self._latest = {}
+        self._lock = threading.Lock()
+
+    def _key(self, resource_server, scope):
+        return ("rpt", self.client.oxd_id, resource_server,
+                tuple(sorted(set(scope or []))))
+
+    def lookup(self, resource_server, scope=None):
+        """Returns the :data:`Rpt` held for the resource server and scopes,
+        or None."""
+        return self.cache.get(self._key(resource_server, scope))
+
+    def get(self, resource_server, scope=None):
+        """Returns the RPT held for the resource server and scopes, or None
+        when there is none or it is about to expire."""
+        entry = self.lookup(resource_server, scope)
+        return entry.rpt if entry is not None else None
+
+    def obtain(self, resource_server, ticket, scope=None, **kwargs):
+        """Exchanges the ticket for an RPT with ``uma_rp_get_rpt`` and keeps
+        it for the resource server and scopes. The RPT held for them, or else
+        the last one obtained for the resource server, is upgraded.
+
+        Args:
+            resource_server (str): the resource server, like its base URL
+            ticket (str): the ticket of the 401 response of the resource
+                server
+            scope (list, optional): the scopes requested
+            **kwargs: the other arguments of
+                :meth:`~oxdpython.client.Client.uma_rp_get_rpt`, like
+                ``claim_token`` or ``state``
+
+        Returns:
+            dict: the response of ``uma_rp_get_rpt``, which is the need_info
+            error when claims must be gathered first
+
+        Raises:
+            InvalidTicketError: when the ticket is invalid
+            OxdServerError: when the RPT could not be obtained
+        """
+        key = self._key(resource_server, scope)
+        with self._lock:
+            latest = self._latest.get(resource_server)
+        held = self.cache.get(key) or (
+            self.cache.get(latest) if latest is not None else None)
+        if held is not None:
+            kwargs.setdefault("rpt", held.rpt)
+            if held.pct:
+                kwargs.setdefault("pct", held.pct)
+
+        data = self.client.uma_rp_get_rpt(ticket, scope=scope, **kwargs)
+        if "access_token" not in data:
+            return data
+        logger.debug("Obtained %s RPT for %s %s",
+                     "an upgraded" if data.get("upgraded") else "a new",
+                     resource_server, key[3])
+
+        entry = self._entry(data, held)
+        if entry is not None:
+            self._store(key, entry)
+            with self._lock:
+                self._latest[resource_server] = key
+            if data.get("upgraded") and held is not None and latest != key \
+                    and self.cache.get(latest) == held:
+                # the upgraded RPT carries the permissions of the old one
+                self._store(latest, entry)
+        return data
+
+    def invalidate(self, resource_server, scope=None):
+        """Drops the RPT held for the resource server and scopes, like when
+        the resource server rejects it."""
+        self.cache.pop(self._key(resource_server, scope))
+
+    def _entry(self, data, held):
+        """Returns the :data:`Rpt` of the response of ``uma_rp_get_rpt``, or
+        None when it is not active."""
+        now = time.time()
+        pct = data.get("pct") or (held.pct if held is not None else None)
+        expires = None
+        permissions = None
+        if data.get("expires_in"):
+            expires = now + int(data["expires_in"])
+        elif self.introspect:
+            info = self.client.introspect_rpt(data["access_token"])
+            if not info.get("active"):
+                logger.warning("The RPT obtained is not active")
+                return None
+            if info.get("exp"):
+                expires = int(info["exp"])
+            permissions = info.get("permissions")
+        if expires is None and self.ttl is not None:
+            expires = now + self.ttl
+        return Rpt(data["access_token"], pct, expires, permissions)
+
+    def _store(self, key, entry):
+        if entry.expires is None:
+            self.cache.set(key, entry, ttl=None)
+            return
+        ttl = entry.expires - self.leeway - time.time()
+        if ttl > 0:
+            self.cache.set(key, entry, ttl=ttl)
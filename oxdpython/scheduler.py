@@ -0,0 +1,129 @@
+"""One thread running the delayed tasks of many clients.
+
+Each :class:`~oxdpython.client.Client` refreshing its protection token with a
+``threading.Timer`` keeps a sleeping thread per site. A :class:`Scheduler`
+runs all of them from a single thread, ordered in a heap by their due time.
+
+Example::
+
+    scheduler = Scheduler()
+    task = scheduler.schedule(300, client.get_client_token)
+    task.cancel()
+"""
+import heapq
+import itertools
+import logging
+import threading
+import time
+
+from . import forking
+
+logger = logging.getLogger(__name__)
+
+
+class Task(object):
+    """A scheduled call, which can be cancelled until it runs."""
+    def __init__(self, due, func, args, kwargs):
+        self.due = due
+        self.func = func
+        self.args = args
+        self.kwargs = kwargs
+        self.cancelled = False
+
+    def cancel(self):
+        self.cancelled = True
+
+    def __repr__(self):
+        return "<Task %s in %.1fs>" % (getattr(self.func, "__name__", "?"),
+                                       self.due - time.time())
+
+
+class Scheduler(object):
+    """Runs tasks after a delay from one daemon thread, started on the first
+    scheduled task.
+
+    A task runs in the scheduler thread and delays the tasks due after it, so
+    the tasks should be short, like sending one oxd command.
+
+    Args:
+        name (str, optional): the name of the thread
+    """
+    def __init__(self, name="oxdpython scheduler"):
+        self.name = name
+        self._heap = []
+        self._counter = itertools.count()
+        self._condition = threading.Condition()
+        self._thread = None
+        self._stopped = False
+        forking.register(self)
+
+    def _after_fork(self):
+        """Starts a new thread for the inherited tasks, as the thread of the
+        parent process does not exist in the child."""
+        self._condition = threading.Condition()
+        self._thread = None
+        if self._heap and not self._stopped:
+            self._start()
+
+    def _start(self):
+        self._stopped = False
+        self._thread = threading.Thread(target=self._run, name=self.name)
+        self._thread.daemon = True
+        self._thread.start()
+
+    def schedule(self, delay, func, *args, **kwargs):
+        """Calls func with args after delay seconds.
+
+        Returns:
+            Task: the task, to cancel it
+        """
+        forking.check()
+        task = Task(time.time() + delay, func, args, kwargs)
+        with self._condition:
+            heapq.heappush(self._heap, (task.due, next(self._counter), task))
+            if self._thread is None:
+                self._start()
+            self._condition.notify()
+        return task
+
+    def stop(self):
+        """Stops the thread, dropping the pending tasks."""
+        with self._condition:
+            self._stopped = True
+            del self._heap[:]
+            self._condition.notify()
+            thread, self._thread = self._thread, None
+        if thread is not None and thread is not threading.current_thread():
+            thread.join()
+
+    def __len__(self):
+        return sum(1 for _, _, task in self._heap if not task.cancelled)
+
+    def _next(self):
+        """Waits for the next due task, returns None once stopped."""
+        condition = self._condition
+        with condition:
+            while not self._stopped:
+                if not self._heap:
+                    condition.wait()
+                    continue
+                due, _, task = self._heap[0]
+                if task.cancelled:
+                    heapq.heappop(self._heap)
+                    continue
+                wait = due - time.time()
+                if wait <= 0:
+                    heapq.heappop(self._heap)
+                    return task
+                condition.wait(wait)
+            return None
+
+    def _run(self):
+        while True:
+            task = self._next()
+            if task is None:
+                return
+            try:
+                task.func(*task.args, **task.kwargs)
+            except Exception:
+                logger.exception("Scheduled task %r failed", task)
@@ -0,0 +1,274 @@
+"""Calling the APIs protected by UMA as a requesting party.
+
+A resource server answers a call without a valid RPT with a 401 response
+carrying a permission ticket in its ``WWW-Authenticate`` header::
+
+    WWW-Authenticate: UMA realm="rs", as_uri="https://op.example.com",
+        ticket="016f84e8-f9b9-11e0-bd6f-0021cc6004de"
+
+A :class:`UmaSession` exchanges the ticket for an RPT with
+``uma_rp_get_rpt``, keeps it in an :class:`~oxdpython.rpt.RptCache` and sends
+the call again with it. The following calls to the resource server send the
+RPT right away, over connections kept alive between the calls::
+
+    session = UmaSession(client)
+    response = session.get("https://rs.example.com/photoz", scope=["view"])
+    if response.status == 200:
+        photos = json.loads(response.body)
+
+When the authorization server needs claims about the user first, the call
+raises :class:`~oxdpython.exceptions.NeedInfoError` with the URL to redirect
+the user to. The ticket and state of the redirect back to the
+``claims_redirect_uri`` complete the exchange::
+
+    try:
+        response = session.get(url)
+    except NeedInfoError as e:
+        return redirect(e.claims_gathering_url)
+    ...
+    session.gather_claims(url, request.args["ticket"], request.args["state"])
+    response = session.get(url)
+"""
+import collections
+import httplib
+import logging
+import re
+import socket
+import ssl
+import threading
+import urlparse
+
+from . import deadline
+from . import forking
+from .exceptions import NeedInfoError
+from .rpt import RptCache
+
+logger = logging.getLogger(__name__)
+
+#: A response of the resource server, with the header names in lower case
+Response = collections.namedtuple("Response", ["status", "reason", "headers",
+                                               "body"])
+
+# the values are double or single quoted, as by oxd, or bare tokens
+_PARAM = re.compile(r'(\w+)\s*=\s*("[^"]*"|\'[^\']*\'|[^\s,]+)')
+
+#: The methods which may be sent again when the response was lost
+IDEMPOTENT_METHODS = frozenset(["GET", "HEAD", "OPTIONS", "TRACE", "PUT",
+                                "DELETE"])
+
+
+def parse_uma_challenge(header):
+    """Returns the parameters of a UMA ``WWW-Authenticate`` header as a dict,
+    like ``ticket`` and ``as_uri``, or None when it is not a UMA challenge."""
+    if not header or not header.strip().upper().startswith("UMA"):
+        return None
+    return dict((name, value[1:-1] if value[0] in "\"'" else value)
+                for name, value in _PARAM.findall(header))
+
+
+class ConnectionPool(object):
+    """Keeps the HTTP connections to the resource servers alive between
+    requests.
+
+    Args:
+        maxsize (int, optional): the number of idle connections kept for each
+            host. Default 4.
+        timeout (float, optional): seconds allowed for connecting and for each
+            read, capped by the deadline of the current thread
+        context (ssl.SSLContext, optional): the context of the https
+            connections, default verifies the certificates
+    """
+    def __init__(self, maxsize=4, timeout=None, context=None):
+        self.maxsize = maxsize
+        self.timeout = timeout
+        self.context = context or ssl.create_default_context()
+        self._idle = collections.defaultdict(list)
+        self._lock = threading.Lock()
+        forking.register(self)
+
+    def _after_fork(self):
+        """Drops the connections of the parent process."""
+        self._idle = collections.defaultdict(list)
+        self._lock = threading.Lock()
+
+    def _connect(self, scheme, netloc):
+        timeout = deadline.remaining(self.timeout)
+        if scheme == "https":
+            return httplib.HTTPSConnection(netloc, timeout=timeout,
+                                           context=self.context)
+        return httplib.HTTPConnection(netloc, timeout=timeout)
+
+    def urlopen(self, method, url, body=None, headers=None):
+        """Sends the request over an idle connection to the host, or a new
+        one, and reads the whole response.
+
+        A request failing on a connection which was idle is sent again once
+        on a new connection, as the server may have closed it meanwhile:
+        when it could not be sent, or when its method is idempotent and the
+        connection broke before the response. A request which timed out is
+        never sent again.
+
+        Returns:
+            Response: the response
+
+        Raises:
+            socket.error, httplib.HTTPException: when the request fails
+        """
+        parts = urlparse.urlsplit(url)
+        key = (parts.scheme, parts.netloc)
+        path = urlparse.urlunsplit(("", "", parts.path or "/", parts.query,
+                                    ""))
+        with self._lock:
+            conn = self._idle[key].pop() if self._idle[key] else None
+        if conn is not None:
+            response = self._send(key, conn, method, path, body, headers,
+                                  reused=True)
+            if response is not None:
+                return response
+        conn = self._connect(*key)
+        return self._send(key, conn, method, path, body, headers)
+
+    def _send(self, key, conn, method, path, body, headers, reused=False):
+        """Returns the response, or None when the request failed on a reused
+        connection and may be sent again."""
+        sent = False
+        try:
+            timeout = deadline.remaining(self.timeout)
+            conn.timeout = timeout
+            if conn.sock is not None:
+                conn.sock.settimeout(timeout)
+            conn.request(method, path, body, headers or {})
+            sent = True
+            resp = conn.getresponse()
+            data = resp.read()
+        except (IOError, httplib.HTTPException) as e:
+            conn.close()
+            if reused and not isinstance(e, socket.timeout) and \
+                    (not sent or method in IDEMPOTENT_METHODS):
+                logger.debug("Idle connection to %s failed: %s", key[1], e)
+                return None
+            raise
+        except:
+            conn.close()
+            raise
+        response = Response(resp.status, resp.reason,
+                            dict(resp.getheaders()), data)
+        if resp.will_close:
+            conn.close()
+            return response
+        with self._lock:
+            idle = self._idle[key]
+            if len(idle) < self.maxsize:
+                idle.append(conn)
+                conn = None
+        if conn is not None:
+            conn.close()
+        return response
+
+    def close(self):
+        """Closes the idle connections."""
+        with self._lock:
+            idle, self._idle = self._idle, collections.defaultdict(list)
+        for conns in idle.values():
+            for conn in conns:
+                conn.close()
+
+
+class UmaSession(object):
+    """Calls resource servers protected by UMA, obtaining and reusing the
+    RPTs they ask for.
+
+    Args:
+        client (Client): the client of the requesting party
+        rpts (RptCache, optional): the RPTs held, default is a new cache
+        pool (ConnectionPool, optional): the connections to the resource
+            servers, default is a new pool
+    """
+    def __init__(self, client, rpts=None, pool=None):
+        self.client = client
+        self.rpts = rpts if rpts is not None else RptCache(client)
+        self.pool = pool if pool is not None else ConnectionPool()
+
+    @staticmethod
+    def resource_server(url):
+        """Returns the resource server of the url, the key of its RPTs."""
+        parts = urlparse.urlsplit(url)
+        return "%s://%s" % (parts.scheme, parts.netloc)
+
+    def request(self, method, url, body=None, headers=None, scope=None,
+                **kwargs):
+        """Sends the request with the RPT held for the resource server. On a
+        401 response with a UMA ticket, obtains an RPT, upgrading the one
+        held, and sends the request again.
+
+        Args:
+            method (str): the HTTP method
+            url (str): the URL of the protected resource
+            body (str, optional): the body of the request
+            headers (dict, optional): the headers of the request
+            scope (list, optional): the scopes to ask for the RPT
+            **kwargs: the other arguments of
+                :meth:`~oxdpython.client.Client.uma_rp_get_rpt`, like
+                ``claim_token`` and ``claim_token_format``
+
+        Returns:
+            Response: the response of the resource server
+
+        Raises:
+            NeedInfoError: when claims about the user must be gathered first,
+                with the ``claims_gathering_url`` to redirect the user to
+            InvalidTicketError: when the ticket is rejected by oxd
+        """
+        server = self.resource_server(url)
+        rpt = self.rpts.get(server, scope)
+        response = self._send(method, url, body, headers, rpt)
+        if response.status != 401:
+            return response
+
+        challenge = parse_uma_challenge(response.headers.get(
+            "www-authenticate"))
+        if not challenge or "ticket" not in challenge:
+            if rpt is not None:
+                self.rpts.invalidate(server, scope)
+            return response
+
+        logger.debug("Obtaining an RPT for %s", server)
+        data = self.rpts.obtain(server, challenge["ticket"], scope, **kwargs)
+        if data.get("error") == "need_info":
+            gathering_url = self.client.uma_rp_get_claims_gathering_url(
+                data["details"]["ticket"])
+            raise NeedInfoError(data, claims_gathering_url=gathering_url)
+        return self._send(method, url, body, headers, data["access_token"])
+
+    def gather_claims(self, url, ticket, state, scope=None):
+        """Obtains the RPT for the resource server of the url once the claims
+        are gathered, with the ticket and state of the redirect to the
+        ``claims_redirect_uri``.
+
+        Returns:
+            dict: the response of ``uma_rp_get_rpt``
+        """
+        return self.rpts.obtain(self.resource_server(url), ticket, scope,
+                                state=state)
+
+    def _send(self, method, url, body, headers, rpt):
+        headers = dict(headers or {})
+        if rpt is not None:
+            headers["Authorization"] = "Bearer %s" % rpt
+        return self.pool.urlopen(method, url, body, headers)
+
+    def get(self, url, **kwargs):
+        return self.request("GET", url, **kwargs)
+
+    def post(self, url, body=None, **kwargs):
+        return self.request("POST", url, body, **kwargs)
+
+    def put(self, url, body=None, **kwargs):
+        return self.request("PUT", url, body, **kwargs)
+
+    def delete(self, url, **kwargs):
+        return self.request("DELETE", url, **kwargs)
+
+    def close(self):
+        """Closes the connections to the resource servers."""
+        self.pool.close()
@@ -0,0 +1,157 @@
+"""Sharding of the sites over several oxd-servers.
+
+Each oxd-server keeps the state of the sites registered with it, so all the
+requests of a site must go to the same server. :class:`ShardedMessenger` maps
+the ``oxd_id`` of a request to a server with consistent hashing: every server
+owns many points, the virtual nodes, on a hash ring, and a site belongs to the
+server owning the next point after the hash of its key. Adding or removing a
+server only moves the sites between it and its neighbours on the ring, about
+one site in the number of servers.
+
+The ``oxd_id`` is created by the server handling ``register_site`` or
+``setup_client``, which is chosen by the redirect URI of the site. The
+messenger pins the returned ``oxd_id`` to that server, and the pins should be
+stored with the ``oxd_id``; :class:`~oxdpython.client.Client` does so in the
+``shard`` option of its config file.
+"""
+import bisect
+import hashlib
+import logging
+import threading
+
+from .messenger import Messenger
+
+logger = logging.getLogger(__name__)
+
+#: Request parameters identifying the site, in order of preference
+SITE_KEYS = ("oxd_id", "authorization_redirect_uri", "client_id")
+
+#: Commands creating the oxd_id of a site
+REGISTERING_COMMANDS = frozenset(["register_site", "setup_client"])
+
+
+def _hash(key):
+    return int(hashlib.md5(key.encode("utf-8")).hexdigest()[:16], 16)
+
+
+class HashRing(object):
+    """A consistent hash ring of nodes.
+
+    Args:
+        nodes (iterable, optional): the names of the nodes
+        vnodes (int, optional): the number of points of each node on the
+            ring. More points spread the keys more evenly. Default 100.
+    """
+    def __init__(self, nodes=(), vnodes=100):
+        self.vnodes = vnodes
+        self._points = []
+        self._owners = {}
+        for node in nodes:
+            self.add(node)
+
+    @property
+    def nodes(self):
+        return sorted(set(self._owners.values()))
+
+    def add(self, node):
+        for i in range(self.vnodes):
+            point = _hash("%s#%d" % (node, i))
+            if point not in self._owners:
+                bisect.insort(self._points, point)
+                self._owners[point] = node
+
+    def remove(self, node):
+        self._points = [p for p in self._points if self._owners[p] != node]
+        self._owners = dict((p, self._owners[p]) for p in self._points)
+
+    def get(self, key):
+        """Returns the node owning the key.
+
+        Raises:
+            LookupError: when the ring has no nodes
+        """
+        if not self._points:
+            raise LookupError("The hash ring has no nodes")
+        i = bisect.bisect(self._points, _hash(key)) % len(self._points)
+        return self._owners[self._points[i]]
+
+
+class ShardedMessenger(Messenger):
+    """Messenger sending the requests of each site to its own oxd-server.
+
+    Args:
+        messengers (dict): the messenger of each oxd-server by node name
+        vnodes (int, optional): the points of each server on the ring.
+            Default 100.
+        pins (dict, optional): the node of each ``oxd_id`` created earlier.
+            It is updated as sites are registered and removed, so it may be a
+            persistent mapping.
+    """
+    def __init__(self, messengers, vnodes=100, pins=None):
+        Messenger.__init__(self)
+        self.messengers = dict(messengers)
+        self.ring = HashRing(self.messengers, vnodes)
+        self.pins = pins if pins is not None else {}
+        self._lock = threading.Lock()
+
+    @property
+    def access_token(self):
+        return self._access_token
+
+    @access_token.setter
+    def access_token(self, token):
+        Messenger.access_token.fset(self, token)
+        for msgr in self.messengers.values():
+            msgr.access_token = token
+
+    def add(self, node, msgr):
+        """Adds an oxd-server, which takes over a share of the unpinned
+        sites."""
+        with self._lock:
+            msgr.access_token = self._access_token
+            self.messengers[node] = msgr
+            self.ring.add(node)
+
+    def remove(self, node):
+        """Removes an oxd-server. The sites pinned to it are unpinned."""
+        with self._lock:
+            del self.messengers[node]
+            self.ring.remove(node)
+            for oxd_id in [i for i, n in self.pins.items() if n == node]:
+                logger.warning("Unpinning %s from removed %s", oxd_id, node)
+                del self.pins[oxd_id]
+
+    def pin(self, oxd_id, node):
+        """Sends the requests of oxd_id to node."""
+        with self._lock:
+            self.pins[oxd_id] = node
+
+    def node_of(self, oxd_id=None, **params):
+        """Returns the node handling the site of the oxd_id, or of the request
+        parameters when there is no oxd_id."""
+        if oxd_id is not None:
+            with self._lock:
+                node = self.pins.get(oxd_id)
+            if node is not None:
+                return node
+            return self.ring.get(oxd_id)
+        for key in SITE_KEYS:
+            if params.get(key):
+                return self.ring.get(params[key])
+        return self.ring.get("")
+
+    def request(self, command, **kwargs):
+        node = self.node_of(**kwargs)
+        response = self.messengers[node].request(command, **kwargs)
+        if response.get("status") == "ok":
+            data = response.get("data") or {}
+            if command in REGISTERING_COMMANDS and "oxd_id" in data:
+                logger.info("Pinning %s to %s", data["oxd_id"], node)
+                self.pin(data["oxd_id"], node)
+            elif command == "remove_site":
+                with self._lock:
+                    self.pins.pop(kwargs.get("oxd_id"), None)
+        return response
+
+    def __str__(self):
+        return "ShardedMessenger(%s)" % ", ".join(sorted(self.messengers))
@@ -51,5 +51,10 @@ setup(
         "Programming Language :: Python :: 2.7",
     ],
     include_package_data=True,
-    entry_points={}
+    entry_points={
+        "console_scripts": [
+            "oxdpython-bench = oxdpython.bench:main",
+            "oxdpython-provision = oxdpython.provision:main",
+        ],
+    }
 )
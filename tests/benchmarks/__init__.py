@@ -0,0 +1,127 @@
+"""Micro-benchmarks for the hot paths of oxdpython.
+
+The benchmarks are not collected by pytest. They are run with::
+
+    python -m tests.benchmarks                  # compare with the baseline
+    python -m tests.benchmarks --save           # store a new baseline
+    python -m tests.benchmarks -k socket        # run a subset
+
+Every benchmark reports the best time per call over a few repeats. The times
+are compared with the ones stored in ``baseline.json`` and the run fails when
+any benchmark is slower than the baseline by more than the threshold. The
+baseline is only meaningful on the machine it was recorded on, so record a
+new one before comparing on a different machine.
+"""
+import argparse
+import collections
+import json
+import os
+import timeit
+import types
+
+BASELINE = os.path.join(os.path.dirname(os.path.realpath(__file__)),
+                        'baseline.json')
+
+#: Benchmark name mapped to a function that returns the callable to be timed
+BENCHMARKS = collections.OrderedDict()
+
+
+def benchmark(name):
+    """Decorator registering a benchmark. The decorated function does the
+    setup and returns a callable taking no arguments, which is timed. A setup
+    which must be undone, like a patch, is written as a generator yielding
+    the callable within the setup; it is closed once the timing is done."""
+    def register(func):
+        BENCHMARKS[name] = func
+        return func
+    return register
+
+
+def measure(func, repeat=5, min_time=0.1):
+    """Returns the best time in seconds of one call of func, with the number
+    of calls per repeat calibrated to take at least min_time."""
+    timer = timeit.Timer(func)
+    number = 1
+    while True:
+        if timer.timeit(number) >= min_time:
+            break
+        number *= 4
+    return min(timer.repeat(repeat, number)) / number
+
+
+def run(pattern=None, repeat=5, min_time=0.1):
+    """Runs the benchmarks whose name contains the pattern and returns an
+    ordered dict of the name mapped to the seconds per call."""
+    results = collections.OrderedDict()
+    for name, setup in BENCHMARKS.items():
+        if pattern and pattern not in name:
+            continue
+        func = setup()
+        if not isinstance(func, types.GeneratorType):
+            results[name] = measure(func, repeat, min_time)
+            continue
+        try:
+            results[name] = measure(next(func), repeat, min_time)
+        finally:
+            func.close()
+    return results
+
+
+def compare(results, baseline, threshold):
+    """Compares the results with the baseline.
+
+    Returns:
+        list: tuples of (name, seconds, baseline seconds or None, ratio or
+        None, regressed) for every result
+    """
+    rows = []
+    for name, seconds in results.items():
+        base = baseline.get(name)
+        ratio = seconds / base if base else None
+        rows.append((name, seconds, base, ratio,
+                     ratio is not None and ratio > 1 + threshold))
+    return rows
+
+
+def main(argv=None):
+    from . import hotpaths  # noqa registers the benchmarks
+
+    parser = argparse.ArgumentParser(prog="python -m tests.benchmarks")
+    parser.add_argument("-k", dest="pattern",
+                        help="only run benchmarks containing this string")
+    parser.add_argument("--save", action="store_true",
+                        help="store the results as the new baseline")
+    parser.add_argument("--threshold", type=float, default=0.25,
+                        help="allowed slowdown over the baseline as a "
+                             "fraction, default 0.25")
+    parser.add_argument("--baseline", default=BASELINE)
+    parser.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args(argv)
+
+    results = run(args.pattern, args.repeat)
+
+    baseline = {}
+    if os.path.exists(args.baseline):
+        with open(args.baseline) as f:
+            baseline = json.load(f)
+
+    regressed = False
+    print "%-36s %12s %12s %8s" % ("benchmark", "us/call", "baseline", "ratio")
+    for name, seconds, base, ratio, slow in compare(results, baseline,
+                                                    args.threshold):
+        regressed = regressed or slow
+        print "%-36s %12.2f %12s %8s%s" % (
+            name, seconds * 1e6,
+            "%.2f" % (base * 1e6) if base else "-",
+            "%.2f" % ratio if ratio else "-",
+            "  REGRESSION" if slow else "")
+
+    if args.save:
+        baseline.update(results)
+        with open(args.baseline, "w") as f:
+            json.dump(baseline, f, indent=2, sort_keys=True)
+            f.write("\n")
+        print "Baseline saved to %s" % args.baseline
+        return 0
+
+    return 1 if regressed else 0
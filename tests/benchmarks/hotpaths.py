@@ -0,0 +1,205 @@
+import json
+import mimetools
+import os
+import StringIO
+import urllib
+
+from mock import patch
+
+from oxdpython.client import Client
+from oxdpython.codec import BACKENDS, get_codec
+from oxdpython.configurer import Configurer
+from oxdpython.messenger import SocketMessenger, HttpMessenger
+from oxdpython.utils import ResourceSet
+
+from . import benchmark
+
+data_dir = os.path.join(os.path.dirname(os.path.dirname(
+    os.path.realpath(__file__))), 'data')
+initial_config = os.path.join(data_dir, 'initial.cfg')
+https_config = os.path.join(data_dir, 'https.cfg')
+
+KB = 1024
+
+
+def payload(size):
+    """Returns a dict looking like an oxd response whose JSON encoding is
+    about size bytes long."""
+    claim = "x" * 50
+    count = max(size // (len(claim) + 4), 1)
+    return {"status": "ok", "data": {"claims": {"values": [claim] * count}}}
+
+
+class FrameSocket(object):
+    """In-memory socket which accepts anything sent and answers every command
+    with the same frame, delivered in 1024 byte reads like a real socket."""
+    def __init__(self, frame):
+        self.frame = frame
+        self.offset = 0
+
+    def send(self, data):
+        self.offset = 0
+        return len(data)
+
+    def recv(self, size):
+        chunk = self.frame[self.offset:self.offset + size]
+        self.offset += len(chunk)
+        return chunk
+
+    def settimeout(self, timeout):
+        pass
+
+    def close(self):
+        pass
+
+
+def socket_frame(size):
+    command = {"command": "uma_rs_protect", "params": payload(size)}
+    return lambda msgr=SocketMessenger(): msgr._frame(command)
+
+# the 4 digit length prefix limits a frame to 9999 bytes
+for _size in (1, 8):
+    benchmark("socket_frame_%dkb" % _size)(
+        lambda s=_size: socket_frame(s * KB))
+
+
+def socket_send(size):
+    msgr = SocketMessenger()
+    msgr._idle.append(FrameSocket(msgr._frame(payload(size))))
+    command = {"command": "get_user_info", "params": {"oxd_id": "id"}}
+    return lambda: msgr.send(command)
+
+for _size in (1, 8):
+    benchmark("socket_send_%dkb" % _size)(
+        lambda s=_size: socket_send(s * KB))
+
+
+def user_info():
+    """The response of get_user_info for a user with many group claims."""
+    return {"status": "ok", "data": {"claims": {
+        "sub": ["3D2A-B3E8-8C6E-4F7A"], "name": [u"J\u00fcrgen M\u00fcller"],
+        "email": ["juergen@example.com"], "email_verified": [True],
+        "locale": ["de-DE"], "zoneinfo": ["Europe/Berlin"],
+        "member_of": ["ou=group%d,o=gluu" % i for i in range(60)]}}}
+
+
+def rpt_introspection():
+    """The response of introspect_rpt for an RPT with many permissions."""
+    return {"status": "ok", "data": {
+        "active": True, "exp": 1508345892, "iat": 1508342292,
+        "client_id": "@!1736.179E.AA60.16B2!0001!8F7C.B9AB!0008!A2BB",
+        "permissions": [{
+            "resource_id": "9a7d-%04d" % i,
+            "resource_scopes": ["https://photoz.example.com/dev/scopes/view",
+                                "https://photoz.example.com/dev/scopes/all"],
+            "exp": 1508345892} for i in range(40)]}}
+
+
+def protect_command():
+    """The uma_rs_protect command of a site with many resources."""
+    return {"command": "uma_rs_protect", "params": {
+        "oxd_id": "6F9619FF-8B86-D011-B42D-00CF4FC964FF",
+        "resources": [{"path": "/photoz/%d" % i, "conditions": [{
+            "httpMethods": ["GET", "POST"],
+            "scopes": ["http://photoz.example.com/dev/actions/view",
+                       "http://photoz.example.com/dev/actions/add"]}]}
+            for i in range(100)]}}
+
+
+def _installed_codecs():
+    for name, _ in BACKENDS:
+        try:
+            yield get_codec(name)
+        except ImportError:
+            pass
+
+for _codec in _installed_codecs():
+    for _name, _make in (("user_info", user_info),
+                         ("rpt_introspection", rpt_introspection),
+                         ("protect", protect_command)):
+        benchmark("codec_%s_encode_%s" % (_codec.name, _name))(
+            lambda c=_codec, m=_make: lambda o=m(): c.encode(o))
+        benchmark("codec_%s_decode_%s" % (_codec.name, _name))(
+            lambda c=_codec, m=_make: lambda d=c.encode(m()): c.decode(d))
+
+
+def http_request(size, encoding=None):
+    msgr = HttpMessenger("https://oxd.example.com:8443")
+    msgr.access_token = "6F9619FF-8B86-D011-B42D-00CF4FC964FF"
+    body = json.dumps(payload(size))
+    headers = ""
+    if encoding == "gzip":
+        body = HttpMessenger._gzip(body)
+        headers = "Content-Encoding: gzip\r\n"
+    headers += "Content-Length: %d\r\n\r\n" % len(body)
+    with patch("urllib2.urlopen",
+               side_effect=lambda *a, **kw: urllib.addinfourl(
+                   StringIO.StringIO(body), mimetools.Message(
+                       StringIO.StringIO(headers)),
+                   "https://oxd.example.com:8443/get-user-info")):
+        yield lambda: msgr.request("get_user_info", oxd_id="id",
+                                   access_token="token")
+
+benchmark("http_request")(lambda: http_request(KB))
+benchmark("http_request_256kb")(lambda: http_request(256 * KB))
+benchmark("http_request_256kb_gzip")(lambda: http_request(256 * KB, "gzip"))
+
+
+@benchmark("configurer_get")
+def configurer_get():
+    config = Configurer(initial_config)
+    return lambda: config.get("client", "authorization_redirect_uri")
+
+
+@benchmark("configurer_get_missing")
+def configurer_get_missing():
+    config = Configurer(initial_config)
+    return lambda: config.get("client", "client_secret")
+
+
+@benchmark("configurer_get_optional")
+def configurer_get_optional():
+    config = Configurer(initial_config)
+    return lambda: config.get("oxd", "timeout", None)
+
+
+def resource_set_dump(count):
+    rset = ResourceSet()
+    for i in xrange(count):
+        rset.add("/photoz/%d" % i).set_scope("GET", "view")
+    return rset.dump
+
+for _count in (10000, 100000):
+    benchmark("resource_set_dump_%dk" % (_count // 1000))(
+        lambda c=_count: resource_set_dump(c))
+
+
+def client(config, response):
+    c = Client(config)
+    c.msgr.request = lambda command, **params: response
+    return c
+
+
+@benchmark("client_register_site")
+def client_register_site():
+    with patch.object(Configurer, "set"):
+        c = client(initial_config, {"status": "ok", "data": {"oxd_id": "id"}})
+
+        def register():
+            c.oxd_id = None
+            c.register_site()
+        yield register
+
+
+@benchmark("client_update_site")
+def client_update_site():
+    with patch.object(Configurer, "set"):
+        yield client(initial_config, {"status": "ok", "data": {}}).update_site
+
+
+@benchmark("client_get_client_token")
+def client_get_client_token():
+    with patch.object(Configurer, "set"):
+        c = client(https_config, {"status": "ok", "data": {
+            "access_token": "token", "expires_in": 399}})
+        yield lambda: c.get_client_token(auto_update=False)
@@ -0,0 +1,165 @@
+import socket
+import time
+import unittest
+
+import pytest
+from mock import MagicMock
+
+from oxdpython.balancer import BalancedMessenger, P2C
+from oxdpython.exceptions import OxdConnectionError
+from oxdpython.fakeserver import FakeOxdServer
+from oxdpython.messenger import Messenger, SocketMessenger, HttpMessenger
+from oxdpython.retry import RetryPolicy
+
+ok = {"status": "ok", "data": {}}
+
+
+def backend(name):
+    msgr = Messenger()
+    msgr.request = MagicMock(return_value=ok)
+    msgr.probe = MagicMock()
+    msgr.name = name
+    return msgr
+
+
+class BalancedMessengerTestCase(unittest.TestCase):
+    def setUp(self):
+        self.backends = [backend('a'), backend('b'), backend('c')]
+        self.msgr = BalancedMessenger(self.backends, max_failures=2,
+                                      probe_interval=0.01)
+
+    def test_least_outstanding(self):
+        first = self.msgr.acquire()
+        second = self.msgr.acquire()
+        third = self.msgr.acquire()
+        assert len(set([first, second, third])) == 3
+        self.msgr.release(second, False)
+        assert self.msgr.acquire() is second
+
+    def test_p2c_picks_less_busy_of_two(self):
+        self.msgr.strategy = P2C
+        busy = self.msgr.endpoints[0]
+        busy.outstanding = 10
+        for _ in range(20):
+            endpoint = self.msgr.acquire()
+            assert endpoint is not busy
+            self.msgr.release(endpoint, False)
+
+    def test_access_token_set_on_all_endpoints(self):
+        self.msgr.access_token = 'token'
+        assert [b.access_token for b in self.backends] == ['token'] * 3
+
+    def test_failover_when_not_sent(self):
+        self.backends[0].request.side_effect = OxdConnectionError('x', False)
+        self.backends[1].request.side_effect = OxdConnectionError('x', False)
+        for _ in range(3):
+            assert self.msgr.request('register_site') == ok
+        assert self.backends[2].request.call_count == 3
+
+    def test_no_failover_for_lost_response_of_non_idempotent(self):
+        for b in self.backends:
+            b.request.side_effect = OxdConnectionError('x', True)
+        with pytest.raises(OxdConnectionError):
+            self.msgr.request('get_tokens_by_code')
+        assert sum(b.request.call_count for b in self.backends) == 1
+
+    def test_failover_limited_by_retries(self):
+        self.msgr.retry_policy.retries = 1
+        for b in self.backends:
+            b.request.side_effect = OxdConnectionError('x', False)
+        with pytest.raises(OxdConnectionError):
+            self.msgr.request('get_user_info')
+        assert sum(b.request.call_count for b in self.backends) == 2
+
+    def test_failover_waits_for_backoff_and_takes_budget(self):
+        policy = RetryPolicy(retries=5, budget=3, window=60)
+        policy.backoff = MagicMock(return_value=0)
+        self.msgr.retry_policy = policy
+        for b in self.backends:
+            b.request.side_effect = OxdConnectionError('x', False)
+        for _ in range(2):
+            with pytest.raises(OxdConnectionError):
+                self.msgr.request('get_user_info')
+        assert [c[0] for c in policy.backoff.call_args_list] == [
+            (1,), (2,), (1,), (2,)]
+        # the budget allowed one failover of the second request only
+        assert sum(b.request.call_count for b in self.backends) == 5
+
+    def test_ejection_and_reinstatement_by_probe(self):
+        failing = self.msgr.endpoints[0]
+        failing.msgr.probe.side_effect = socket.error('refused')
+        for _ in range(2):
+            self.msgr.release(failing, True)
+        assert not failing.healthy
+        for _ in range(10):
+            endpoint = self.msgr.acquire()
+            assert endpoint is not failing
+            self.msgr.release(endpoint, False)
+
+        failing.msgr.probe.side_effect = None
+        for _ in range(100):
+            if failing.healthy:
+                break
+            time.sleep(0.01)
+        assert failing.healthy
+        assert failing.failures == 0
+
+    def test_all_ejected_still_tries(self):
+        for endpoint in self.msgr.endpoints:
+            endpoint.healthy = False
+        assert self.msgr.request('get_user_info') == ok
+
+
+def test_endpoint_timing_out_on_connect_is_ejected():
+    sock = MagicMock()
+    sock.connect.side_effect = socket.timeout('timed out')
+    dead = SocketMessenger(retry_policy=RetryPolicy(retries=0))
+    dead._socket = MagicMock(return_value=sock)
+    msgr = BalancedMessenger([dead, backend('b')], max_failures=1,
+                             probe_interval=60)
+    # a request held in flight on b sends the next one to the dead endpoint
+    held = msgr.acquire([msgr.endpoints[0]])
+    assert msgr.request('get_user_info') == ok
+    msgr.release(held, False)
+    assert not msgr.endpoints[0].healthy
+
+
+def test_create_with_list_of_hosts():
+    msgr = Messenger.create(['oxd1:8000', 'oxd2'], 8099)
+    assert isinstance(msgr, BalancedMessenger)
+    single = [e.msgr for e in msgr.endpoints]
+    assert [(m.host, m.port) for m in single] == [('oxd1', 8000),
+                                                   ('oxd2', 8099)]
+    assert all(m.retry_policy.retries == 0 for m in single)
+
+    msgr = Messenger.create(['https://a', 'https://b'], https_extension=True)
+    assert all(isinstance(e.msgr, HttpMessenger) for e in msgr.endpoints)
+
+    assert isinstance(Messenger.create(['oxd1'], 8099), SocketMessenger)
+
+
+def test_create_with_ipv6_hosts():
+    msgr = Messenger.create(['[::1]:8000', '[fe80::1]', '::1'], 8099)
+    single = [e.msgr for e in msgr.endpoints]
+    assert [(m.host, m.port) for m in single] == [('::1', 8000),
+                                                   ('fe80::1', 8099),
+                                                   ('::1', 8099)]
+    assert single[0]._socket().family == socket.AF_INET6
+    assert Messenger.create('oxd1', 8099)._socket().family == socket.AF_INET
+
+
+def test_balances_over_fake_servers_and_survives_outage():
+    with FakeOxdServer() as one, FakeOxdServer() as two:
+        msgr = Messenger.create(['%s:%s' % one.address,
+                                 '%s:%s' % two.address], 8099)
+        for busy in msgr.endpoints:
+            # a request held in flight sends the next one to the other server
+            held = msgr.acquire([e for e in msgr.endpoints if e is not busy])
+            msgr.request('get_user_info', access_token='t')
+            msgr.release(held, False)
+        assert len(one.requests) == len(two.requests) == 1
+
+        two.stop()
+        for _ in range(4):
+            assert msgr.request('get_user_info',
+                                access_token='t')['status'] == 'ok'
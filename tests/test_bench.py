@@ -0,0 +1,63 @@
+import os
+import shutil
+import tempfile
+import unittest
+
+import pytest
+
+from oxdpython import bench
+from oxdpython.fakeserver import FakeOxdServer, FakeOxdUnixServer
+
+
+def test_percentile_nearest_rank():
+    samples = range(1, 101)
+    assert bench.percentile(samples, 50) == 50
+    assert bench.percentile(samples, 95) == 95
+    assert bench.percentile(samples, 99) == 99
+    assert bench.percentile([], 99) == 0.0
+
+
+def test_parse_mix():
+    assert bench.parse_mix("login=2,check_access") == [("login", 2.0),
+                                                       ("check_access", 1.0)]
+    with pytest.raises(Exception):
+        bench.parse_mix("login=1,coffee=3")
+
+
+class RunTestCase(unittest.TestCase):
+    def setUp(self):
+        self.tmpdir = tempfile.mkdtemp()
+        self.server = FakeOxdServer().start()
+        self.config = bench.write_config(
+            os.path.join(self.tmpdir, 'bench.cfg'), self.server.host,
+            self.server.port)
+
+    def tearDown(self):
+        self.server.stop()
+        shutil.rmtree(self.tmpdir)
+
+    def test_run_counts_calls_of_each_operation(self):
+        stats = bench.run(self.config, [("login", 1)], workers=2,
+                          operations=5)
+        assert len(stats.latencies['get_tokens_by_code']) == 5
+        assert len(stats.latencies['get_user_info']) == 5
+        assert stats.summary()[-1][1] == 15
+
+    def test_errors_are_counted(self):
+        self.server.responses['uma_rs_check_access'] = {
+            "status": "error",
+            "data": {"error": "internal_error", "error_description": "x"}}
+        stats = bench.run(self.config, [("check_access", 1)], workers=1,
+                          operations=4)
+        assert stats.errors['uma_rs_check_access'] == 4
+        assert stats.summary()[-1][6] == 1.0
+
+
+def test_run_over_unix_socket(tmpdir):
+    with FakeOxdUnixServer() as server:
+        config = bench.write_config(str(tmpdir.join('unix.cfg')), 'localhost',
+                                    socket_path=server.path)
+        stats = bench.run(config, [("check_access", 1)], workers=2,
+                          operations=4)
+    assert len(stats.latencies['uma_rs_check_access']) == 4
+    assert not stats.errors
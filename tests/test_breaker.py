@@ -0,0 +1,134 @@
+import os
+import time
+import unittest
+import urllib2
+
+import pytest
+from mock import MagicMock, patch
+
+from oxdpython.breaker import CircuitBreaker, CircuitBreakerMessenger, \
+    CLOSED, OPEN, HALF_OPEN
+from oxdpython.client import Client
+from oxdpython.exceptions import CircuitOpenError, OxdConnectionError, \
+    OxdTimeoutError
+from oxdpython.messenger import Messenger, HttpMessenger
+
+this_dir = os.path.dirname(os.path.realpath(__file__))
+
+
+def fail():
+    raise OxdConnectionError("refused", sent=False)
+
+
+def succeed():
+    return "ok"
+
+
+class CircuitBreakerTestCase(unittest.TestCase):
+    def setUp(self):
+        self.breaker = CircuitBreaker(error_rate=0.5, window_size=4,
+                                      minimum_calls=4, reset_timeout=10)
+        self.transitions = []
+        self.breaker.add_listener(
+            lambda b, old, new: self.transitions.append((old, new)))
+
+    def call(self, func):
+        try:
+            return self.breaker.call(func)
+        except OxdConnectionError:
+            pass
+
+    def open_breaker(self):
+        for func in (succeed, fail, succeed, fail):
+            self.call(func)
+        assert self.breaker.state == OPEN
+
+    def test_stays_closed_below_error_rate(self):
+        for func in (succeed, fail, succeed, succeed, succeed, fail):
+            self.call(func)
+        assert self.breaker.state == CLOSED
+
+    def test_opens_and_fails_fast(self):
+        self.open_breaker()
+        func = MagicMock()
+        with pytest.raises(CircuitOpenError):
+            self.breaker.call(func)
+        func.assert_not_called()
+        assert self.transitions == [(CLOSED, OPEN)]
+
+    def test_oxd_error_responses_and_other_errors_are_not_failures(self):
+        def raises_value_error():
+            raise ValueError()
+        for _ in range(4):
+            with pytest.raises(ValueError):
+                self.breaker.call(raises_value_error)
+        assert self.breaker.state == CLOSED
+
+    def test_http_error_responses_are_not_failures(self):
+        msgr = CircuitBreakerMessenger(HttpMessenger('https://oxd'),
+                                       self.breaker)
+        with patch('urllib2.urlopen', side_effect=urllib2.HTTPError(
+                'https://oxd/get-user-info', 400, 'Bad Request', {}, None)):
+            for _ in range(4):
+                with pytest.raises(urllib2.HTTPError):
+                    msgr.request('get_user_info')
+        assert self.breaker.state == CLOSED
+
+    def test_timeouts_are_failures(self):
+        def times_out():
+            raise OxdTimeoutError()
+        for _ in range(4):
+            with pytest.raises(OxdTimeoutError):
+                self.breaker.call(times_out)
+        assert self.breaker.state == OPEN
+
+    def test_slow_calls_open_breaker(self):
+        self.breaker.slow_call_duration = 1
+        for _ in range(4):
+            self.breaker.after_call(False, 2)
+        assert self.breaker.state == OPEN
+
+    def test_half_open_trial_success_closes(self):
+        self.open_breaker()
+        with patch('time.time', return_value=time.time() + 11):
+            assert self.breaker.call(succeed) == 'ok'
+        assert self.breaker.state == CLOSED
+        assert self.transitions == [(CLOSED, OPEN), (OPEN, HALF_OPEN),
+                                    (HALF_OPEN, CLOSED)]
+
+    def test_half_open_trial_failure_reopens(self):
+        self.open_breaker()
+        with patch('time.time', return_value=time.time() + 11):
+            self.call(fail)
+        assert self.breaker.state == OPEN
+        with pytest.raises(CircuitOpenError):
+            self.breaker.call(succeed)
+
+    def test_half_open_limits_trials(self):
+        self.open_breaker()
+        with patch('time.time', return_value=time.time() + 11):
+            self.breaker.before_call()
+            assert self.breaker.state == HALF_OPEN
+            with pytest.raises(CircuitOpenError):
+                self.breaker.before_call()
+
+
+class CircuitBreakerMessengerTestCase(unittest.TestCase):
+    def test_request_passes_through_breaker(self):
+        backend = Messenger()
+        backend.request = MagicMock(side_effect=OxdConnectionError("x", True))
+        msgr = CircuitBreakerMessenger(backend, CircuitBreaker(
+            window_size=2, minimum_calls=2))
+        for _ in range(2):
+            with pytest.raises(OxdConnectionError):
+                msgr.request('get_user_info', access_token='t')
+        with pytest.raises(CircuitOpenError):
+            msgr.request('get_user_info', access_token='t')
+        assert backend.request.call_count == 2
+
+    def test_configured_by_client(self):
+        c = Client(os.path.join(this_dir, 'data', 'breaker.cfg'))
+        assert isinstance(c.msgr, CircuitBreakerMessenger)
+        assert c.msgr.breaker.slow_call_duration == 1.5
+        assert c.msgr.breaker.reset_timeout == 10
+        assert c.msgr.breaker.error_rate == 0.5
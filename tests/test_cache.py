@@ -0,0 +1,45 @@
+import time
+
+from oxdpython.cache import TTLCache
+
+
+def test_least_recently_used_evicted():
+    evicted = []
+    cache = TTLCache(maxsize=2, on_evict=lambda k, v: evicted.append(k))
+    cache.set('a', 1)
+    cache.set('b', 2)
+    assert cache.get('a') == 1
+    cache.set('c', 3)
+    assert evicted == ['b']
+    assert 'b' not in cache
+    assert len(cache) == 2
+
+
+def test_entries_expire():
+    cache = TTLCache(ttl=0.02)
+    cache.set('a', 1)
+    cache.set('b', 2, ttl=None)
+    assert cache.get('a') == 1
+    time.sleep(0.03)
+    assert cache.get('a') is None
+    assert cache.get('b') == 2
+    assert cache.hits == 2
+    assert cache.misses == 1
+
+
+def test_expire_removes_expired_entries():
+    cache = TTLCache()
+    cache.set('a', 1, ttl=0)
+    cache.set('b', 2)
+    assert cache.expire() == [('a', 1)]
+    assert len(cache) == 1
+
+
+def test_pop_and_clear():
+    cache = TTLCache()
+    cache.set('a', 1)
+    assert cache.pop('a') == 1
+    assert cache.pop('a', 'x') == 'x'
+    cache.set('b', 2)
+    cache.clear()
+    assert len(cache) == 0
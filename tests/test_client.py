@@ -1,10 +1,18 @@
 import os
 import pytest
+import threading
+import time
 import unittest
 
 from mock import patch, MagicMock
 
+from oxdpython.balancer import BalancedMessenger
+from oxdpython.breaker import CircuitBreakerMessenger
+from oxdpython.cache import TTLCache
 from oxdpython.client import Client, Configurer, Timer
+from oxdpython.fakeserver import FakeOxdServer
+from oxdpython.messenger import UnixSocketMessenger
+from oxdpython.sharding import ShardedMessenger
 
 from oxdpython.exceptions import OxdServerError, InvalidTicketError, \
     NeedInfoError, InvalidRequestError
@@ -23,6 +31,141 @@ generic_error = {
 }
 
 
+class ClientTestCase(unittest.TestCase):
+    def test_timeouts_read_from_config(self):
+        c = Client(https_config)
+        assert c.msgr.timeout == 5.0
+        assert c.msgr.connect_timeout == 0.5
+
+    def test_optional_keys_not_logged_when_missing(self):
+        with patch('oxdpython.configurer.logger') as log:
+            Client(initial_config)
+        # only the flag read before the optional keys were added
+        assert [str(c[0][1]) for c in log.warning.call_args_list] == [
+            "No option 'https_extension' in section: 'oxd'"]
+
+    def test_no_timeouts_by_default(self):
+        c = Client(initial_config)
+        assert c.msgr.timeout is None
+        assert c.msgr.connect_timeout is None
+
+    def test_retries_read_from_config(self):
+        assert Client(https_config).msgr.retry_policy.retries == 4
+        assert Client(initial_config).msgr.retry_policy.retries == 2
+
+    def test_socket_path_selects_unix_socket_transport(self):
+        c = Client(Configurer(None, {'oxd': {'socket_path': '/run/oxd.sock'},
+                                     'client': {}}))
+        assert isinstance(c.msgr, UnixSocketMessenger)
+        assert c.msgr.path == '/run/oxd.sock'
+
+    def test_socket_path_conflicting_options_rejected(self):
+        for options in [{'https_extension': 'true'}, {'host': 'oxd1,oxd2'},
+                        {'host': 'oxd1,oxd2', 'sharding': 'true'}]:
+            options['socket_path'] = '/run/oxd.sock'
+            with pytest.raises(ValueError):
+                Client(Configurer(None, {'oxd': options, 'client': {}}))
+
+    def test_json_codec_read_from_config(self):
+        c = Client(Configurer(None, {'oxd': {'json_codec': 'json'},
+                                     'client': {}}))
+        assert c.msgr.codec.name == 'json'
+        with pytest.raises(ValueError):
+            Client(Configurer(None, {'oxd': {'json_codec': 'xml'},
+                                     'client': {}}))
+
+    def test_response_size_and_decoding_read_from_config(self):
+        c = Client(Configurer(None, {'oxd': {'max_response_size': '4096',
+                                             'incremental_decoding': 'true'},
+                                     'client': {}}))
+        assert c.msgr.max_response_size == 4096
+        assert c.msgr.incremental
+        c = Client(Configurer(None, {'oxd': {'incremental_decoding': 'false'},
+                                     'client': {}}))
+        assert not c.msgr.incremental
+
+    def test_sharding_read_from_config(self):
+        hosts = {'host': 'oxd1,oxd2'}
+        c = Client(Configurer(None, {'oxd': dict(hosts, sharding='true'),
+                                     'client': {}}))
+        assert isinstance(c.shards, ShardedMessenger)
+        for value in ['false', 'no', '0']:
+            c = Client(Configurer(None, {'oxd': dict(hosts, sharding=value),
+                                         'client': {}}))
+            assert c.shards is None
+            assert isinstance(c.msgr, BalancedMessenger)
+
+    def test_circuit_breaker_read_from_config(self):
+        c = Client(Configurer(None, {'oxd': {'circuit_breaker': 'true'},
+                                     'client': {}}))
+        assert isinstance(c.msgr, CircuitBreakerMessenger)
+        for value in ['false', 'no', '0']:
+            c = Client(Configurer(None, {'oxd': {'circuit_breaker': value},
+                                         'client': {}}))
+            assert not isinstance(c.msgr, CircuitBreakerMessenger)
+
+    def test_deadline(self):
+        c = Client(initial_config)
+        with c.deadline(1) as d:
+            assert 0 < d.remaining() <= 1
+
+
+class ClientExecutorTestCase(unittest.TestCase):
+    def setUp(self):
+        self.c = Client(uma_config)
+        self.c.msgr.request = MagicMock(side_effect=lambda command, **p: {
+            "status": "ok", "data": {"access": "granted", "path": p['path']}})
+
+    def tearDown(self):
+        self.c.close()
+
+    def test_submit_returns_future(self):
+        future = self.c.submit('uma_rs_check_access', 'rpt', '/photoz', 'GET')
+        assert future.result(1) == {"access": "granted", "path": "/photoz"}
+
+    def test_map_returns_results_in_order(self):
+        paths = ['/p%d' % i for i in range(20)]
+        results = self.c.map('uma_rs_check_access', ['rpt'] * 20, paths,
+                             ['GET'] * 20, timeout=1)
+        assert [r['path'] for r in results] == paths
+
+    def test_executor_sized_to_connection_pool(self):
+        assert self.c.executor.max_workers == self.c.msgr.pool_size
+        c = Client(Configurer(None, {'oxd': {'host': 'oxd1,oxd2',
+                                             'pool_size': '3'},
+                                     'client': {}}))
+        assert c.executor.max_workers == 6
+
+    def test_token_refresh_keeps_executor_running(self):
+        def request(command, **params):
+            if command == 'get_client_token':
+                return {"status": "ok", "data": {
+                    "access_token": "token", "expires_in": 300}}
+            time.sleep(0.02)
+            return {"status": "ok", "data": {"access": "granted"}}
+        self.c.msgr.request = MagicMock(side_effect=request)
+        self.c.config = Configurer(None, {'oxd': {}, 'client': {}})
+        executor = self.c.executor
+        futures = [self.c.submit('uma_rs_check_access', 'rpt', '/p', 'GET')
+                   for _ in range(8)]
+        self.c.get_client_token(auto_update=True)
+        futures.append(self.c.submit('uma_rs_check_access', 'rpt', '/p',
+                                     'GET'))
+        self.c.get_client_token(auto_update=True)
+        assert all(f.result(1)['access'] == 'granted' for f in futures)
+        assert self.c.executor is executor
+
+    def test_close_stops_own_executor_only(self):
+        executor = self.c.executor
+        self.c.close()
+        with pytest.raises(RuntimeError):
+            executor.submit(time.time)
+        shared = MagicMock()
+        c = Client(uma_config, executor=shared)
+        c.close()
+        assert not shared.shutdown.called
+
+
 class RegisterSiteTestCase(unittest.TestCase):
     def setUp(self):
         self.success = {
@@ -193,6 +336,78 @@ class GetUserInfoTestCase(unittest.TestCase):
             self.c.get_user_info("some_token")
 
 
+class CompleteLoginTestCase(unittest.TestCase):
+    def setUp(self):
+        self.responses = {
+            "get_tokens_by_code": {"status": "ok", "data": {
+                "access_token": "SlAV32hkKG",
+                "expires_in": 3600,
+                "id_token_claims": {"sub": "248289761001",
+                                    "iss": "https://op.example.com",
+                                    "exp": 1311281970}}},
+            "get_user_info": {"status": "ok", "data": {"claims": {
+                "sub": ["248289761001"],
+                "email": ["janedoe@example.com"]}}}
+        }
+        self.c = Client(initial_config, cache=TTLCache())
+        self.c.msgr.request = MagicMock(
+            side_effect=lambda command, **params: self.responses[command])
+
+    def commands(self):
+        return [c[0][0] for c in self.c.msgr.request.call_args_list]
+
+    def test_id_token_claims_used_when_sufficient(self):
+        tokens, claims = self.c.complete_login("code", "state", ["sub"])
+        assert tokens["access_token"] == "SlAV32hkKG"
+        assert claims["sub"] == ["248289761001"]
+        assert claims["exp"] == [1311281970]
+        assert self.commands() == ["get_tokens_by_code"]
+
+    def test_claims_shaped_like_user_info_with_fake_server(self):
+        with FakeOxdServer() as server:
+            c = Client(Configurer(None, {
+                'oxd': {'host': server.host, 'port': str(server.port),
+                        'id': 'site-id'},
+                'client': {}}))
+            login = c.complete_login("code", "state", ["sub"])
+            assert login.claims["sub"] == ["24400320"]
+            claims = c.complete_login("code", "state", ["sub", "email"])[1]
+            assert all(isinstance(v, list) for v in claims.values())
+
+    def test_user_info_completes_missing_claims(self):
+        self.c.login_claims = ["sub", "email"]
+        login = self.c.complete_login("code", "state")
+        assert login.claims["email"] == ["janedoe@example.com"]
+        assert login.claims["iss"] == ["https://op.example.com"]
+        assert self.commands() == ["get_tokens_by_code", "get_user_info"]
+
+        self.c.complete_login("code", "state", required_claims=[])
+        assert self.commands()[-1] == "get_user_info"
+
+    def test_claims_cached_for_access_token(self):
+        login = self.c.complete_login("code", "state", ["sub"],
+                                      cache_claims=True)
+        assert self.c.get_user_info("SlAV32hkKG", cached=True) == \
+            login.claims
+        assert self.commands() == ["get_tokens_by_code"]
+        self.c.get_user_info("other", cached=True)
+        self.c.get_user_info("other", cached=True)
+        assert self.commands().count("get_user_info") == 1
+
+    def test_claims_cached_by_default(self):
+        request = self.c.msgr.request
+        self.c = Client(initial_config)
+        self.c.msgr.request = request
+        self.c.complete_login("code", "state", ["sub"], cache_claims=True)
+        self.c.get_user_info("SlAV32hkKG", cached=True)
+        assert self.commands() == ["get_tokens_by_code"]
+
+    def test_raises_error_on_oxd_error(self):
+        self.responses["get_user_info"] = generic_error
+        with pytest.raises(OxdServerError):
+            self.c.complete_login("code", "state")
+
+
 class GetLogoutUriTestCase(unittest.TestCase):
     def setUp(self):
         self.success = {
@@ -432,6 +647,82 @@ class UmaRsCheckAccessTestCase(unittest.TestCase):
             self.c.uma_rs_check_access('rpt', '/api', 'GET')
 
 
+class UmaRsCheckAccessManyTestCase(unittest.TestCase):
+    def setUp(self):
+        self.c = Client(uma_config, cache=TTLCache())
+        # counted under a lock, the calls come from the executor threads
+        self.lock = threading.Lock()
+        self.calls = []
+        self.introspection = {"active": True, "exp": int(time.time()) + 3600}
+        self.introspected = []
+        self.in_flight = 0
+        self.max_in_flight = 0
+        self.c.msgr.request = self.check
+
+    def tearDown(self):
+        self.c.close()
+
+    def check(self, command, **params):
+        if command == 'introspect_rpt':
+            self.introspected.append(params['rpt'])
+            return {"status": "ok", "data": self.introspection}
+        with self.lock:
+            self.calls.append(params)
+            self.in_flight += 1
+            self.max_in_flight = max(self.max_in_flight, self.in_flight)
+        time.sleep(0.02)
+        with self.lock:
+            self.in_flight -= 1
+        access = 'denied' if params['http_method'] == 'DELETE' else 'granted'
+        return {"status": "ok", "data": {"access": access}}
+
+    def test_pairs_checked_once_and_concurrently(self):
+        resources = [('/photoz/%d' % i, 'GET') for i in range(8)] * 2
+        access = self.c.uma_rs_check_access_many('rpt', resources)
+        assert len(self.calls) == 8
+        assert self.max_in_flight > 1
+        assert sorted(access) == sorted(set(resources))
+        assert all(a['access'] == 'granted' for a in access.values())
+
+    def test_granted_decisions_cached(self):
+        resources = [('/photoz', 'GET'), ('/photoz', 'DELETE')]
+        self.c.uma_rs_check_access_many('rpt', resources)
+        access = self.c.uma_rs_check_access_many('rpt', resources)
+        assert access[('/photoz', 'DELETE')]['access'] == 'denied'
+        assert len(self.calls) == 3
+        self.c.uma_rs_check_access_many('other-rpt', resources)
+        assert len(self.calls) == 5
+        assert self.introspected == ['rpt', 'other-rpt']
+
+    def test_decisions_cached_by_default(self):
+        self.c.close()
+        self.c = Client(uma_config)
+        self.c.msgr.request = self.check
+        self.c.uma_rs_check_access_many('rpt', [('/photoz', 'GET')])
+        self.c.uma_rs_check_access_many('rpt', [('/photoz', 'GET')])
+        assert len(self.calls) == 1
+
+    def test_decisions_cached_until_rpt_expires(self):
+        self.introspection["exp"] = int(time.time()) + 5
+        self.c.uma_rs_check_access_many('rpt', [('/photoz', 'GET')])
+        key = self.c._access_key('rpt', ('/photoz', 'GET'))
+        assert self.c.cache._entries[key][1] <= time.time() + 5
+
+    def test_decisions_not_cached_for_inactive_rpt(self):
+        self.introspection = {"active": False}
+        self.c.uma_rs_check_access_many('rpt', [('/photoz', 'GET')])
+        self.c.uma_rs_check_access_many('rpt', [('/photoz', 'GET')])
+        assert len(self.calls) == 2
+
+    def test_error_of_one_pair_raised(self):
+        self.c.msgr.request = lambda command, **p: {
+            "status": "error", "data": {"error": "invalid_request",
+                                        "error_description": "not protected"}}
+        with pytest.raises(InvalidRequestError):
+            self.c.uma_rs_check_access_many('rpt', [('/a', 'GET'),
+                                                    ('/b', 'GET')])
+
+
 class UmaRpGetClaimsGatherUrlTestCase(unittest.TestCase):
     def setUp(self):
         self.success = {
@@ -619,3 +910,59 @@ class UMAIntrospectRPTTestCase(unittest.TestCase):
 
         with pytest.raises(OxdServerError):
             self.c.introspect_rpt('rpt')
+
+
+class IntrospectManyTestCase(unittest.TestCase):
+    def setUp(self):
+        self.c = Client(initial_config, cache=TTLCache())
+        # recorded under a lock, the calls come from the executor threads
+        self.lock = threading.Lock()
+        self.calls = []
+        self.c.msgr.request = self.introspect
+
+    def tearDown(self):
+        self.c.close()
+
+    def introspect(self, command, **params):
+        with self.lock:
+            self.calls.append(command)
+        token = params.get('access_token') or params.get('rpt')
+        if token == 'broken':
+            return generic_error
+        return {"status": "ok", "data": {
+            "active": token != 'revoked', "exp": int(time.time()) + 300,
+            "token": token}}
+
+    def test_results_aligned_with_input_and_errors_per_item(self):
+        tokens = ['a', 'broken', 'b', 'a', 'revoked']
+        results = self.c.introspect_access_token_many(tokens)
+        assert [r['token'] for r in results if isinstance(r, dict)] == \
+            ['a', 'b', 'a', 'revoked']
+        assert isinstance(results[1], OxdServerError)
+        assert not results[4]['active']
+        assert len(self.calls) == 4
+
+    def test_active_tokens_cached(self):
+        self.c.introspect_rpt_many(['a', 'revoked', 'broken'])
+        self.c.introspect_rpt_many(['a', 'revoked', 'broken'])
+        assert self.calls == ['introspect_rpt'] * 5
+        # the rpt and the access token of the same value are not mixed up
+        self.c.introspect_access_token_many(['a'])
+        assert len(self.calls) == 6
+
+    def test_active_tokens_cached_by_default(self):
+        self.c.close()
+        self.c = Client(initial_config)
+        self.c.msgr.request = self.introspect
+        self.c.introspect_access_token_many(['a'])
+        self.c.introspect_access_token_many(['a'])
+        assert len(self.calls) == 1
+
+    def test_cached_until_token_expires(self):
+        self.c.msgr.request = lambda command, **p: {
+            "status": "ok", "data": {"active": True,
+                                     "exp": int(time.time()) + 1}}
+        self.c.introspect_access_token_many(['a'])
+        key = ('introspect_access_token', self.c.oxd_id, 'a')
+        assert key in self.c.cache
+        assert self.c.cache._entries[key][1] <= time.time() + 1
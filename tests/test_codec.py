@@ -0,0 +1,104 @@
+# -*- coding: utf-8 -*-
+import StringIO
+
+import pytest
+
+from mock import patch, MagicMock
+
+from oxdpython import codec
+from oxdpython.codec import get_codec, JsonCodec
+from oxdpython.messenger import Messenger
+
+
+def installed():
+    for name, _ in codec.BACKENDS:
+        try:
+            yield get_codec(name)
+        except ImportError:
+            pass
+
+
+@pytest.mark.parametrize('c', list(installed()), ids=lambda c: c.name)
+def test_round_trip_of_bytes(c):
+    obj = {"command": "get_user_info",
+           "params": {"name": u"Jürgen", "scopes": ["openid", "uma"],
+                      "active": True, "exp": 1508345892, "none": None}}
+    data = c.encode(obj)
+    assert isinstance(data, str)
+    # non-ASCII is escaped, so the length of the str is the frame length
+    assert data.decode('ascii')
+    assert c.decode(data) == obj
+    assert c.decode('{"name": "J\xc3\xbcrgen"}') == {"name": u"Jürgen"}
+
+
+def test_stdlib_encoding_is_compact():
+    assert JsonCodec().encode({"a": [1, 2]}) == '{"a":[1,2]}'
+
+
+def test_invalid_json_raises_value_error():
+    with pytest.raises(ValueError):
+        JsonCodec().decode('{"status": "ok"')
+
+
+def test_buffered_decoder_decodes_fed_chunks():
+    decoder = JsonCodec().decoder()
+    for chunk in ['{"status":', ' "ok", "da', 'ta": {}}']:
+        decoder.feed(chunk)
+    assert decoder.close() == {"status": "ok", "data": {}}
+
+
+def test_load_falls_back_to_buffering():
+    stream = StringIO.StringIO('{"status": "ok", "data": {"exp": 1.5}}')
+    with patch.object(codec, 'ijson', None):
+        assert JsonCodec().load(stream, incremental=True) == {
+            "status": "ok", "data": {"exp": 1.5}}
+        with pytest.raises(ImportError):
+            codec.parse_incremental(stream)
+
+
+@pytest.fixture(params=['default', 'python'])
+def ijson_backend(request):
+    ijson = pytest.importorskip('ijson')
+    if request.param == 'python':
+        with patch.object(codec, '_ijson_backend', ijson):
+            yield
+    else:
+        yield
+
+
+@pytest.mark.usefixtures('ijson_backend')
+def test_incremental_load():
+    stream = StringIO.StringIO(
+        '{"status": "ok", "data": {"exp": 1.5, "n": 3, "name": "J\xc3\xbc",'
+        ' "scopes": [], "active": true, "none": null}}')
+    stream.read = MagicMock(side_effect=stream.read)
+    assert JsonCodec().load(stream, incremental=True) == {
+        "status": "ok", "data": {"exp": 1.5, "n": 3, "name": u"J\xfc",
+                                 "scopes": [], "active": True, "none": None}}
+    assert stream.read.called
+    for invalid in ['', '{"status": "ok"']:
+        with pytest.raises(ValueError):
+            JsonCodec().load(StringIO.StringIO(invalid), incremental=True)
+
+
+def test_unknown_codec():
+    with pytest.raises(ValueError):
+        get_codec('pickle')
+
+
+def test_default_is_first_installed_backend():
+    def missing():
+        raise ImportError('not installed')
+    with patch.object(codec, 'BACKENDS', [('fast', missing),
+                                          ('json', JsonCodec)]):
+        assert isinstance(codec._first_installed(), JsonCodec)
+
+
+def test_messenger_uses_given_codec():
+    c = MagicMock()
+    c.encode.return_value = '{}'
+    msgr = Messenger.create('localhost', 8099, codec=c)
+    assert msgr._frame({"command": "x"}) == '0002{}'
+    balanced = Messenger.create(['a', 'b'], 8099, codec=c)
+    assert balanced.endpoints[0].msgr.codec is c
+    assert Messenger.create('localhost').codec is get_codec()
@@ -0,0 +1,90 @@
+"""Stress tests of one Client shared by many threads."""
+import os
+import shutil
+import tempfile
+import threading
+import unittest
+
+from oxdpython.client import Client
+from oxdpython.fakeserver import FakeOxdServer
+
+THREADS = 16
+ROUNDS = 25
+
+
+def run_threads(target):
+    errors = []
+
+    def guarded(i):
+        try:
+            target(i)
+        except Exception as e:
+            errors.append(e)
+
+    threads = [threading.Thread(target=guarded, args=(i,))
+               for i in range(THREADS)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    assert errors == []
+
+
+class SharedClientTestCase(unittest.TestCase):
+    def setUp(self):
+        self.server = FakeOxdServer(latency=0.001).start()
+        self.dir = tempfile.mkdtemp()
+        self.config = os.path.join(self.dir, 'client.cfg')
+        with open(self.config, 'w') as f:
+            f.write('[oxd]\nhost = %s\nport = %s\npool_size = 4\n'
+                    '[client]\nauthorization_redirect_uri = https://a/cb\n'
+                    'client_id = id\nclient_secret = secret\n'
+                    % self.server.address)
+        self.client = Client(self.config)
+
+    def tearDown(self):
+        self.client.close()
+        self.server.stop()
+        shutil.rmtree(self.dir)
+
+    def test_registration_happens_once(self):
+        oxd_ids = []
+        run_threads(lambda i: oxd_ids.append(self.client.register_site()))
+        commands = [c for c, _ in self.server.requests]
+        assert commands.count('register_site') == 1
+        assert len(set(oxd_ids)) == 1
+        assert Client(self.config).oxd_id == oxd_ids[0]
+
+    def test_responses_not_mixed_up_between_threads(self):
+        self.server.responses['get_user_info'] = lambda p: {
+            "status": "ok", "data": {"claims": {"sub": [p['access_token']]}}}
+        self.client.oxd_id = 'id'
+
+        def work(i):
+            for n in range(ROUNDS):
+                token = '%d-%d' % (i, n)
+                claims = self.client.get_user_info(token)
+                assert claims['sub'] == [token]
+
+        run_threads(work)
+        assert len(self.server.requests) == THREADS * ROUNDS
+        assert len(self.client.msgr._idle) <= 4
+
+    def test_token_refresh_while_sending(self):
+        self.client.oxd_id = 'id'
+
+        def work(i):
+            for n in range(ROUNDS):
+                if n % 5 == 0:
+                    self.client.get_client_token(auto_update=(i == 0))
+                else:
+                    self.client.uma_rs_check_access('rpt', '/', 'GET')
+
+        run_threads(work)
+        tokens = set(p.get('protection_access_token')
+                     for _, p in self.server.requests
+                     if _ == 'uma_rs_check_access')
+        assert tokens <= set([None, self.client.msgr.access_token])
+        assert Client(self.config).config.get(
+            'client', 'protection_access_token') == \
+            self.client.msgr.access_token
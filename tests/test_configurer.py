@@ -1,4 +1,7 @@
 import os.path
+import threading
+
+from mock import patch
 
 from oxdpython.configurer import Configurer
 
@@ -22,6 +25,17 @@ def test_get_function_returns_value_for_set_config_value():
     assert config.get('two', 'coffee') is None
 
 
+def test_optional_keys_read_quietly():
+    config = Configurer(location)
+    with patch('oxdpython.configurer.logger') as log:
+        assert config.get('oxd', 'port', None) == '8099'
+        assert config.get('oxd', 'timeout', None) is None
+        assert config.get('two', 'coffee', '5') == '5'
+        assert not log.warning.called
+        assert config.get('oxd', 'timeout') is None
+        assert log.warning.called
+
+
 def test_set_function_saves_the_configuration_to_file():
     config = Configurer(location)
     # only allowed sections for a set function are oxd and client
@@ -31,3 +45,69 @@ def test_set_function_saves_the_configuration_to_file():
     # Ensure things have been written to the file
     config2 = Configurer(location)
     assert config2.get('client', 'name') == 'Test Client'
+
+
+def test_settings_kept_in_memory():
+    config = Configurer(None, {'oxd': {'id': 'site-id'}})
+    assert config.get('oxd', 'id') == 'site-id'
+    assert config.set('oxd', 'id', 'new-id')
+    assert config.get('oxd', 'id') == 'new-id'
+    assert config.get('client', 'client_id') is None
+
+
+def test_settings_override_file():
+    config = Configurer(location, {'oxd': {'port': '9000'}})
+    assert config.get('oxd', 'port') == '9000'
+    assert config.get('oxd', 'host') == 'localhost'
+
+
+def test_deferred_writes_once_at_the_end(tmpdir):
+    path = str(tmpdir.join('site.cfg'))
+    tmpdir.join('site.cfg').write('[oxd]\n[client]\n')
+    config = Configurer(path)
+    with config.deferred():
+        config.set('oxd', 'id', 'site-id')
+        with config.deferred():
+            config.set('client', 'client_id', 'client-id')
+        assert Configurer(path).get('oxd', 'id') is None
+    assert Configurer(path).get('client', 'client_id') == 'client-id'
+    assert tmpdir.listdir() == [tmpdir.join('site.cfg')]
+
+
+def test_remove_deletes_the_key_from_the_file(tmpdir):
+    path = str(tmpdir.join('site.cfg'))
+    tmpdir.join('site.cfg').write('[oxd]\nid = site-id\n')
+    config = Configurer(path)
+    os.chmod(path, 0o600)
+    assert config.remove('oxd', 'id')
+    assert not config.remove('oxd', 'id')
+    assert not config.remove('test', 'key')
+    assert Configurer(path).get('oxd', 'id') is None
+    assert os.stat(path).st_mode & 0o777 == 0o600
+
+
+def test_overlapping_deferred_blocks_of_threads(tmpdir):
+    path = str(tmpdir.join('site.cfg'))
+    tmpdir.join('site.cfg').write('[oxd]\n[client]\n')
+    config = Configurer(path)
+    entered, exited = threading.Event(), threading.Event()
+
+    def other():
+        with config.deferred():
+            config.set('client', 'client_id', 'client-id')
+            entered.set()
+            exited.wait(1)
+
+    thread = threading.Thread(target=other)
+    with config.deferred():
+        config.set('oxd', 'id', 'site-id')
+        thread.start()
+        entered.wait(1)
+    # the other thread's block is still open
+    assert Configurer(path).get('oxd', 'id') is None
+    exited.set()
+    thread.join()
+    assert Configurer(path).get('client', 'client_id') == 'client-id'
+
+    config.set('oxd', 'id', 'new-id')
+    assert Configurer(path).get('oxd', 'id') == 'new-id'
@@ -0,0 +1,76 @@
+import threading
+import time
+
+import pytest
+
+from oxdpython import deadline
+from oxdpython.exceptions import OxdTimeoutError
+
+
+def test_no_deadline_by_default():
+    assert deadline.current() is None
+    assert deadline.remaining() is None
+    assert deadline.remaining(3) == 3
+
+
+def test_scope_sets_and_restores_deadline():
+    with deadline.scope(10) as d:
+        assert deadline.current() is d
+        assert 9 < deadline.remaining() <= 10
+        assert deadline.remaining(1) == 1
+    assert deadline.current() is None
+
+
+def test_nested_scope_cannot_extend_deadline():
+    with deadline.scope(1) as outer:
+        with deadline.scope(10) as inner:
+            assert inner is outer
+        with deadline.scope(0.5) as inner:
+            assert inner is not outer
+            assert deadline.remaining() <= 0.5
+        assert deadline.current() is outer
+
+
+def test_none_keeps_deadline():
+    with deadline.scope(1) as outer:
+        with deadline.scope(None) as inner:
+            assert inner is outer
+
+
+def test_remaining_raises_when_expired():
+    with deadline.scope(0.01):
+        time.sleep(0.02)
+        with pytest.raises(OxdTimeoutError):
+            deadline.remaining()
+
+
+def notify_later(condition, done, delay):
+    def run():
+        time.sleep(delay)
+        with condition:
+            done.append(time.time())
+            condition.notify()
+    threading.Thread(target=run).start()
+
+
+def test_wait_wakes_up_when_notified():
+    condition = threading.Condition()
+    latencies = []
+    for _ in range(5):
+        done = []
+        notify_later(condition, done, 0.1)
+        with condition:
+            assert deadline.wait(condition, lambda: done, 5)
+        latencies.append(time.time() - done[0])
+    # a timed Condition.wait of Python 2 notices it up to 50ms late
+    assert sorted(latencies)[2] < 0.01
+
+
+def test_wait_times_out():
+    condition = threading.Condition()
+    start = time.time()
+    with condition:
+        assert not deadline.wait(condition, lambda: False, 0.05)
+    assert 0.05 <= time.time() - start < 0.1
+    with condition:
+        assert deadline.wait(condition, lambda: True, 0)
@@ -0,0 +1,114 @@
+import threading
+import time
+
+import pytest
+
+from oxdpython import deadline
+from oxdpython.exceptions import CancelledError, OxdTimeoutError
+from oxdpython.executor import Executor, Future
+
+
+def test_calls_run_concurrently_up_to_max_workers():
+    executor = Executor(max_workers=4)
+    start = time.time()
+    futures = [executor.submit(time.sleep, 0.05) for _ in range(8)]
+    for future in futures:
+        assert future.result(1) is None
+    # 8 calls in 2 rounds of 4, instead of 0.4s one after the other
+    assert 0.1 <= time.time() - start < 0.3
+    assert len(executor._threads) == 4
+    executor.shutdown()
+    assert executor._threads == []
+
+
+def test_exception_of_call_raised_by_result():
+    executor = Executor()
+    future = executor.submit(lambda: 1 / 0)
+    with pytest.raises(ZeroDivisionError):
+        future.result(1)
+    assert isinstance(future.exception(), ZeroDivisionError)
+    executor.shutdown()
+
+
+def test_result_timeout():
+    executor = Executor(max_workers=1)
+    future = executor.submit(time.sleep, 0.1)
+    with pytest.raises(OxdTimeoutError):
+        future.result(0.01)
+    assert future.result(1) is None
+    executor.shutdown()
+
+
+def test_result_with_timeout_returned_when_call_finishes():
+    executor = Executor()
+    latencies = []
+    for _ in range(5):
+        future = executor.submit(lambda: time.sleep(0.1) or time.time())
+        finished = future.result(5)
+        latencies.append(time.time() - finished)
+    # a timed Condition.wait of Python 2 notices the call up to 50ms late
+    assert sorted(latencies)[2] < 0.01
+    executor.shutdown()
+
+
+def test_pending_call_cancelled():
+    executor = Executor(max_workers=1)
+    started = threading.Event()
+    release = threading.Event()
+    running = executor.submit(lambda: (started.set(), release.wait(1)))
+    pending = executor.submit(lambda: 'never')
+    assert started.wait(1)
+    assert not running.cancel()
+    assert pending.cancel()
+    release.set()
+    with pytest.raises(CancelledError):
+        pending.result(1)
+    assert running.result(1)
+    executor.shutdown()
+
+
+def test_deadline_of_submitter_applies():
+    executor = Executor(max_workers=1)
+    with deadline.scope(0.05):
+        remaining = executor.submit(deadline.remaining)
+        executor.submit(time.sleep, 0.1)
+        late = executor.submit(lambda: 'late')
+    assert 0 < remaining.result(1) <= 0.05
+    with pytest.raises(OxdTimeoutError):
+        late.result(1)
+    executor.shutdown()
+
+
+def test_map_keeps_order_and_timeout():
+    executor = Executor(max_workers=3)
+    delays = [0.03, 0.01, 0.02]
+    assert list(executor.map(lambda d: time.sleep(d) or d, delays)) == delays
+    results = executor.map(time.sleep, [0.01, 0.2], timeout=0.05)
+    assert next(results) is None
+    with pytest.raises(OxdTimeoutError):
+        next(results)
+    executor.shutdown()
+
+
+def test_nested_submit_runs_in_worker():
+    executor = Executor(max_workers=1)
+    outer = executor.submit(
+        lambda: executor.submit(lambda: 'inner').result(1))
+    assert outer.result(1) == 'inner'
+    executor.shutdown()
+
+
+def test_done_callbacks():
+    done = []
+    future = Future()
+    future.add_done_callback(done.append)
+    future._finish('x')
+    future.add_done_callback(done.append)
+    assert done == [future, future]
+
+
+def test_submit_after_shutdown():
+    executor = Executor()
+    executor.shutdown()
+    with pytest.raises(RuntimeError):
+        executor.submit(time.time)
@@ -0,0 +1,168 @@
+import os
+import time
+import unittest
+
+import pytest
+
+from oxdpython import deadline
+from oxdpython.exceptions import OxdTimeoutError, OxdResponseTooLargeError
+from oxdpython.fakeserver import FakeOxdServer, FakeOxdUnixServer, \
+    FakeHttpsExtension, OXD_ID
+from oxdpython.messenger import Messenger, SocketMessenger, \
+    UnixSocketMessenger, HttpMessenger
+
+
+class FakeOxdServerTestCase(unittest.TestCase):
+    def setUp(self):
+        self.server = FakeOxdServer().start()
+        self.msgr = SocketMessenger(*self.server.address)
+
+    def tearDown(self):
+        self.server.stop()
+
+    def test_canned_response(self):
+        resp = self.msgr.request('register_site', authorization_redirect_uri='a')
+        assert resp['data']['oxd_id'] == OXD_ID
+
+    def test_connection_reused_for_many_commands(self):
+        for _ in range(3):
+            resp = self.msgr.request('uma_rs_check_access', rpt='r', path='/',
+                                     http_method='GET')
+            assert resp['data']['access'] == 'granted'
+        assert len(self.server.requests) == 3
+
+    def test_unknown_command_is_error(self):
+        assert self.msgr.request('make_coffee')['status'] == 'error'
+
+    def test_callable_response(self):
+        self.server.responses['get_user_info'] = lambda p: {
+            "status": "ok", "data": {"claims": {"sub": [p['access_token']]}}}
+        resp = self.msgr.request('get_user_info', access_token='abc')
+        assert resp['data']['claims']['sub'] == ['abc']
+
+    def test_records_protection_token(self):
+        self.msgr.access_token = 'token'
+        self.msgr.request('get_logout_uri', oxd_id='id')
+        command, params = self.server.requests[-1]
+        assert command == 'get_logout_uri'
+        assert params['protection_access_token'] == 'token'
+
+    def test_latency(self):
+        self.server.latency = 0.05
+        start = time.time()
+        self.msgr.request('introspect_rpt', rpt='r')
+        assert time.time() - start >= 0.05
+
+    def test_timeout(self):
+        self.msgr.timeout = 0.05
+        self.server.latency = lambda cmd: 0.2 if cmd == 'introspect_rpt' else 0
+        start = time.time()
+        with pytest.raises(OxdTimeoutError):
+            self.msgr.request('introspect_rpt', rpt='r')
+        assert time.time() - start < 0.15
+
+        # the late response must not be read as the response of the next one
+        resp = self.msgr.request('get_logout_uri', oxd_id='id')
+        assert 'uri' in resp['data']
+
+    def test_deadline_scope_shortens_timeout(self):
+        self.msgr.timeout = 10
+        self.server.latency = 0.2
+        with pytest.raises(OxdTimeoutError):
+            with deadline.scope(0.05):
+                self.msgr.request('introspect_rpt', rpt='r')
+
+
+class FakeOxdUnixServerTestCase(unittest.TestCase):
+    def setUp(self):
+        self.server = FakeOxdUnixServer().start()
+        self.msgr = UnixSocketMessenger(self.server.path)
+
+    def tearDown(self):
+        self.msgr.close()
+        self.server.stop()
+
+    def test_framed_protocol_over_unix_socket(self):
+        self.msgr.access_token = 'token'
+        for _ in range(3):
+            resp = self.msgr.request('uma_rs_check_access', rpt='r', path='/',
+                                     http_method='GET')
+            assert resp['data']['access'] == 'granted'
+        assert len(self.server.requests) == 3
+        assert self.server.requests[-1][1]['protection_access_token'] == \
+            'token'
+        assert len(self.msgr._idle) == 1
+
+    def test_probe(self):
+        self.msgr.probe(timeout=1)
+
+    def test_created_from_socket_path(self):
+        msgr = Messenger.create('localhost', 8099,
+                                socket_path=self.server.path)
+        assert isinstance(msgr, UnixSocketMessenger)
+        assert msgr.request('get_logout_uri', oxd_id='id')['status'] == 'ok'
+
+    def test_socket_file_removed_on_stop(self):
+        path = self.server.path
+        self.server.stop()
+        assert not os.path.exists(path)
+        assert not os.path.exists(os.path.dirname(path))
+
+
+class FakeHttpsExtensionTestCase(unittest.TestCase):
+    def setUp(self):
+        self.server = FakeHttpsExtension().start()
+        self.msgr = HttpMessenger(self.server.url)
+
+    def tearDown(self):
+        self.server.stop()
+
+    def test_command_mapped_to_path(self):
+        resp = self.msgr.request('get_authorization_url', oxd_id='id')
+        assert 'authorization_url' in resp['data']
+        assert self.server.requests[-1] == ('get_authorization_url',
+                                            {'oxd_id': 'id'})
+
+    def test_bearer_token_recorded(self):
+        self.msgr.access_token = 'token'
+        self.msgr.request('introspect_access_token', access_token='a')
+        params = self.server.requests[-1][1]
+        assert params['protection_access_token'] == 'token'
+
+    def test_response_larger_than_maximum(self):
+        self.msgr.max_response_size = 20
+        with pytest.raises(OxdResponseTooLargeError):
+            self.msgr.request('get_authorization_url', oxd_id='id')
+        self.msgr.max_response_size = 1000
+        assert self.msgr.request('get_authorization_url', oxd_id='id')
+
+    def test_compressed_request_and_response(self):
+        self.server.compress = True
+        self.msgr.compress_threshold = 0
+        resources = [{"path": "/photoz/%d" % i} for i in range(100)]
+        resp = self.msgr.request('uma_rs_protect', oxd_id='id',
+                                 resources=resources)
+        assert resp['status'] == 'ok'
+        assert self.server.requests[-1][1]['resources'] == resources
+
+    def test_bearer_token_of_request_wins(self):
+        self.msgr.access_token = 'token'
+        self.msgr.request('introspect_access_token', access_token='a',
+                          protection_access_token='site-token')
+        params = self.server.requests[-1][1]
+        assert params == {'access_token': 'a',
+                          'protection_access_token': 'site-token'}
+
+    def test_timeout(self):
+        self.msgr.timeout = 0.05
+        self.server.latency = 0.2
+        with pytest.raises(OxdTimeoutError):
+            self.msgr.request('get_user_info', access_token='a')
+
+    def test_latency_per_command(self):
+        self.server.latency = lambda cmd: 0.05 if cmd == 'get_user_info' else 0
+        start = time.time()
+        self.msgr.request('remove_site', oxd_id='id')
+        assert time.time() - start < 0.05
+        self.msgr.request('get_user_info', access_token='a')
+        assert time.time() - start >= 0.05
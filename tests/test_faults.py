@@ -0,0 +1,67 @@
+import unittest
+
+from oxdpython.fakeserver import FakeOxdServer
+from oxdpython.faults import FaultInjectingProxy, run_harness, HarnessReport, \
+    Outcome, LATENCY, RESET, TRUNCATE, SPLIT, COMPLETED, FAILED, STALLED
+from oxdpython.messenger import SocketMessenger
+
+
+def test_recovery_times():
+    report = HarnessReport([Outcome('a', COMPLETED, 1.0, None),
+                            Outcome('a', FAILED, 0.5, None),
+                            Outcome('a', STALLED, 2.0, None),
+                            Outcome('a', COMPLETED, 1.0, None),
+                            Outcome('a', FAILED, 0.5, None)])
+    assert report.recovery_times == [3.5]
+
+
+class FaultInjectionTestCase(unittest.TestCase):
+    def setUp(self):
+        self.server = FakeOxdServer().start()
+
+    def tearDown(self):
+        self.server.stop()
+
+    def harness(self, faults, deadline=1.0, timeout=None,
+                command='get_user_info', count=None, **kwargs):
+        with FaultInjectingProxy(self.server.address, faults,
+                                 **kwargs) as proxy:
+            report = run_harness(lambda: SocketMessenger(*proxy.address,
+                                                         timeout=timeout),
+                                 [command] * (count or len(faults)),
+                                 deadline=deadline)
+        assert proxy.injected == faults
+        return report
+
+    def test_split_frames_complete(self):
+        report = self.harness([SPLIT, SPLIT], split_size=1)
+        assert len(report.completed) == 2
+
+    def test_latency_within_deadline_completes(self):
+        report = self.harness([LATENCY, None], latency=0.05)
+        assert len(report.completed) == 2
+        assert report.outcomes[0].elapsed >= 0.05
+
+    def test_latency_beyond_deadline_stalls(self):
+        report = self.harness([LATENCY, None], deadline=0.1, latency=0.5)
+        assert [o.result for o in report.outcomes] == [STALLED, COMPLETED]
+
+    def test_latency_beyond_timeout_fails_within_deadline(self):
+        report = self.harness([LATENCY, None], deadline=0.5, timeout=0.1,
+                              latency=0.3)
+        assert [o.result for o in report.outcomes] == [FAILED, COMPLETED]
+        assert report.outcomes[0].elapsed < 0.3
+
+    def test_reset_fails_fast_and_recovers(self):
+        report = self.harness([None, RESET, None], command='remove_site')
+        assert [o.result for o in report.outcomes] == [COMPLETED, FAILED,
+                                                       COMPLETED]
+        assert len(report.recovery_times) == 1
+
+    def test_truncated_prefix_fails_fast_and_recovers(self):
+        report = self.harness([TRUNCATE, None], command='get_tokens_by_code')
+        assert [o.result for o in report.outcomes] == [FAILED, COMPLETED]
+
+    def test_idempotent_command_resent_after_faults(self):
+        report = self.harness([RESET, TRUNCATE, None, RESET, None], count=2)
+        assert [o.result for o in report.outcomes] == [COMPLETED, COMPLETED]
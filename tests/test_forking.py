@@ -0,0 +1,153 @@
+import json
+import os
+import shutil
+import signal
+import threading
+import time
+
+from mock import patch, MagicMock
+
+from oxdpython import forking
+from oxdpython.balancer import BalancedMessenger
+from oxdpython.client import Client
+from oxdpython.configurer import Configurer
+from oxdpython.fakeserver import FakeOxdServer
+from oxdpython.messenger import Messenger, SocketMessenger
+from oxdpython.scheduler import Scheduler
+
+this_dir = os.path.dirname(os.path.realpath(__file__))
+initial_config = os.path.join(this_dir, 'data', 'initial.cfg')
+
+
+def in_child(func):
+    """Runs func in a forked process and returns what it returned."""
+    read, write = os.pipe()
+    pid = os.fork()
+    if pid == 0:
+        os.close(read)
+        try:
+            result = func()
+        except Exception as e:
+            result = repr(e)
+        os.write(write, json.dumps(result))
+        os._exit(0)
+    os.close(write)
+    data = os.read(read, 65536)
+    os.close(read)
+    os.waitpid(pid, 0)
+    return json.loads(data)
+
+
+def test_child_opens_own_connection():
+    with FakeOxdServer() as server:
+        msgr = SocketMessenger(*server.address)
+        msgr.request('get_user_info', access_token='parent')
+        inherited = msgr._idle[0]
+
+        def child():
+            msgr.request('get_user_info', access_token='child')
+            return msgr._idle[0] is not inherited
+
+        assert in_child(child) is True
+        # the parent keeps using its connection
+        assert msgr.request('get_logout_uri', oxd_id='id')['status'] == 'ok'
+        assert msgr._idle == [inherited]
+        assert [p.get('access_token') for _, p in server.requests] == [
+            'parent', 'child', None]
+
+
+def test_check_resets_registered_objects_once():
+    obj = MagicMock()
+    forking.register(obj)
+
+    def child():
+        forking.check()
+        forking.check()
+        return obj._after_fork.call_count
+
+    assert in_child(child) == 1
+    assert not obj._after_fork.called
+
+
+def test_scheduler_runs_inherited_tasks():
+    scheduler = Scheduler()
+    ran = []
+    scheduler.schedule(0.1, lambda: ran.append(os.getpid()))
+
+    def child():
+        forking.check()
+        time.sleep(0.3)
+        return ran == [os.getpid()]
+
+    try:
+        assert in_child(child) is True
+    finally:
+        scheduler.stop()
+
+
+def test_balancer_forgets_parent_requests():
+    backends = [Messenger(), Messenger()]
+    for b in backends:
+        b.probe = MagicMock()
+    msgr = BalancedMessenger(backends, probe_interval=60)
+    msgr.acquire()
+    msgr.endpoints[1].healthy = False
+
+    def child():
+        forking.check()
+        return [[e.outstanding for e in msgr.endpoints],
+                msgr._prober is not None and msgr._prober.is_alive()]
+
+    assert in_child(child) == [[0, 0], True]
+    assert msgr.endpoints[0].outstanding + msgr.endpoints[1].outstanding == 1
+
+
+@patch('oxdpython.client.Timer')
+def test_client_token_refresh_set_up_again(mock_timer, tmpdir):
+    config = str(tmpdir.join('initial.cfg'))
+    shutil.copy(initial_config, config)
+    c = Client(config)
+    c.msgr.request = MagicMock(return_value={
+        "status": "ok", "data": {"access_token": "token", "expires_in": 60}})
+    c.get_client_token()
+
+    def child():
+        forking.check()
+        # other clients still alive in this process are reset as well
+        calls = [call[0] for call in mock_timer.call_args_list
+                 if call[0][1].__self__ is c]
+        return [len(calls), calls[-1][0]]
+
+    count, delay = in_child(child)
+    assert count == 2
+    assert 59 < delay <= 60
+    c.close()
+
+
+def test_locks_held_at_fork_do_not_block_child():
+    client = Client(Configurer(None, {'oxd': {'id': 'site-id'},
+                                      'client': {}}))
+    held, release = threading.Event(), threading.Event()
+
+    def hold():
+        with client._lock:
+            with client.config.deferred():
+                with client.config._lock:
+                    held.set()
+                    release.wait(5)
+    thread = threading.Thread(target=hold)
+    thread.start()
+    held.wait(1)
+
+    def child():
+        signal.alarm(5)
+        assert client.register_site() == 'site-id'
+        assert client.config.set('client', 'client_id', 'child')
+        client.close()
+        return not client.config._deferred
+
+    try:
+        assert in_child(child) is True
+    finally:
+        release.set()
+        thread.join()
@@ -0,0 +1,130 @@
+import os
+import time
+import unittest
+
+import pytest
+from mock import MagicMock
+
+from oxdpython import deadline
+from oxdpython.balancer import BalancedMessenger
+from oxdpython.client import Client
+from oxdpython.exceptions import OxdConnectionError, OxdTimeoutError
+from oxdpython.fakeserver import FakeOxdServer
+from oxdpython.hedging import HedgePolicy
+from oxdpython.messenger import Messenger
+
+this_dir = os.path.dirname(os.path.realpath(__file__))
+
+
+class HedgePolicyTestCase(unittest.TestCase):
+    def setUp(self):
+        self.policy = HedgePolicy(minimum_samples=10, rate=0.5, burst=2)
+
+    def observe(self, latencies, command='uma_rs_check_access'):
+        for latency in latencies:
+            self.policy.observe(command, latency)
+
+    def test_no_delay_before_minimum_samples(self):
+        self.observe([0.01] * 9)
+        assert self.policy.delay('uma_rs_check_access') is None
+        self.observe([0.01])
+        assert self.policy.delay('uma_rs_check_access') == 0.01
+
+    def test_delay_is_percentile(self):
+        self.observe([i / 100.0 for i in range(1, 101)])
+        assert self.policy.delay('uma_rs_check_access') == 0.95
+        self.policy.percentile = 50
+        assert self.policy.delay('uma_rs_check_access') == 0.5
+
+    def test_commands_not_hedged(self):
+        self.observe([0.01] * 20, command='register_site')
+        assert self.policy.delay('register_site') is None
+
+    def test_rate_cap(self):
+        assert self.policy.take()
+        assert self.policy.take()
+        assert not self.policy.take()
+        self.policy.delay('uma_rs_check_access')
+        assert not self.policy.take()
+        self.policy.delay('uma_rs_check_access')
+        assert self.policy.take()
+        assert self.policy.hedges == 3
+
+
+class HedgedRequestTestCase(unittest.TestCase):
+    def setUp(self):
+        self.slow = FakeOxdServer().start()
+        self.fast = FakeOxdServer().start()
+        self.msgr = Messenger.create(['%s:%s' % s.address
+                                      for s in (self.slow, self.fast)], 8099)
+        self.policy = HedgePolicy(minimum_samples=1)
+        self.policy.observe('introspect_access_token', 0.01)
+        self.msgr.hedge_policy = self.policy
+
+    def tearDown(self):
+        self.slow.stop()
+        self.fast.stop()
+
+    def route_first_to_slow(self):
+        self.slow.latency = 0.5
+        original = self.msgr.acquire
+        self.msgr.acquire = MagicMock(side_effect=lambda exclude=(): original(
+            exclude or [self.msgr.endpoints[1]]))
+
+    def test_hedge_answers_before_slow_endpoint(self):
+        self.route_first_to_slow()
+        start = time.time()
+        resp = self.msgr.request('introspect_access_token', access_token='t')
+        assert resp['status'] == 'ok'
+        assert time.time() - start < 0.4
+        assert len(self.fast.requests) == 1
+        assert self.policy.hedges == 1
+
+    def test_not_hedged_when_rate_exceeded(self):
+        self.policy.burst = 0
+        self.policy._tokens = 0
+        self.route_first_to_slow()
+        start = time.time()
+        self.msgr.request('introspect_access_token', access_token='t')
+        assert time.time() - start >= 0.5
+        assert len(self.fast.requests) == 0
+
+    def test_write_commands_not_hedged(self):
+        self.route_first_to_slow()
+        self.msgr.request('remove_site', oxd_id='id')
+        assert len(self.fast.requests) == 0
+
+    def test_deadline_applies_to_hedged_request(self):
+        self.route_first_to_slow()
+        self.fast.latency = 0.5
+        with pytest.raises(OxdTimeoutError):
+            with deadline.scope(0.1):
+                self.msgr.request('introspect_access_token', access_token='t')
+
+
+def backend(response=None, error=None):
+    msgr = Messenger()
+    msgr.request = MagicMock(return_value=response, side_effect=error)
+    return msgr
+
+
+def test_failed_primary_fails_over():
+    ok = {"status": "ok", "data": {}}
+    msgr = BalancedMessenger([backend(error=OxdConnectionError('x', True)),
+                              backend(error=OxdConnectionError('x', True))],
+                             hedge_policy=HedgePolicy(minimum_samples=1))
+    msgr.hedge_policy.observe('uma_rs_check_access', 0.01)
+    with pytest.raises(OxdConnectionError):
+        msgr.request('uma_rs_check_access', rpt='r')
+    assert sum(e.msgr.request.call_count for e in msgr.endpoints) == 2
+
+    msgr.endpoints[1].msgr.request = MagicMock(return_value=ok)
+    for _ in range(4):
+        assert msgr.request('uma_rs_check_access', rpt='r') == ok
+
+
+def test_hedging_read_from_config():
+    c = Client(os.path.join(this_dir, 'data', 'hedging.cfg'))
+    assert isinstance(c.msgr, BalancedMessenger)
+    assert c.msgr.hedge_policy.rate == 0.2
+    assert c.msgr.hedge_policy.percentile == 95
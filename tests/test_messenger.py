@@ -1,25 +1,110 @@
+import mimetools
+import socket
 import unittest
+import urllib
+import zlib
+import StringIO
 
-from mock import patch, MagicMock
+import pytest
+from mock import MagicMock, patch
 
-from oxdpython.messenger import SocketMessenger
+from oxdpython import deadline
+from oxdpython.exceptions import OxdConnectionError, OxdTimeoutError, \
+    OxdResponseTooLargeError
+from oxdpython.messenger import SocketMessenger, HttpMessenger
+from oxdpython.retry import RetryPolicy
 
 class SocketMessengerTestCase(unittest.TestCase):
     def setUp(self):
         self.msgr = SocketMessenger()
-        self.msgr.sock = MagicMock()
-        self.msgr.sock.send.return_value = 5
-        self.msgr.sock.recv.return_value = '0008{"id":5}'
+        self.sock = MagicMock()
+        self.sock.send.return_value = 5
+        self.sock.recv.return_value = '0008{"id":5}'
+        self.msgr._socket = MagicMock(return_value=self.sock)
 
     def test_send(self):
         """SocketMessenger.send sends message"""
         assert self.msgr.send({"command": "test"}) == {"id": 5}
 
+    def test_send_length_prefix_split_over_reads(self):
+        self.sock.recv.side_effect = ['00', '08{"id"', ':5}']
+        assert self.msgr.send({"command": "test"}) == {"id": 5}
+
+    def test_send_raises_on_closed_connection(self):
+        self.sock.recv.side_effect = ['0008{"i', '']
+        with pytest.raises(OxdConnectionError) as e:
+            self.msgr.send({})
+        assert e.value.sent
+        assert self.sock.close.called
+        assert self.msgr._idle == []
+
+    def test_send_failure_is_safe_to_resend(self):
+        self.sock.send.side_effect = socket.error('broken pipe')
+        with pytest.raises(OxdConnectionError) as e:
+            self.msgr.send({})
+        assert not e.value.sent
+
+    def test_response_larger_than_maximum_is_not_read(self):
+        self.msgr.max_response_size = 7
+        self.sock.recv.side_effect = ['0008{"id"', ':5}']
+        with pytest.raises(OxdResponseTooLargeError):
+            self.msgr.request('get_user_info')
+        assert self.sock.recv.call_count == 1
+        assert self.sock.close.called
+        assert self.msgr._idle == []
+
+    def test_incremental_decoding_reads_whole_frame(self):
+        pytest.importorskip('ijson')
+        self.msgr.incremental = True
+        self.sock.recv.side_effect = ['0010{"id"', ':5}  ', '0008{"id":6}']
+        assert self.msgr.send({}) == {"id": 5}
+        assert self.msgr.send({}) == {"id": 6}
+        assert self.msgr._socket.call_count == 1
+
+    def test_reads_rest_of_frame_at_once(self):
+        self.sock.recv.side_effect = ['0008{"i', 'd":5}']
+        assert self.msgr.send({}) == {"id": 5}
+        assert self.sock.recv.call_args[0][0] == 5
+
+    def test_request_resends_whole_frame(self):
+        sock = self.sock
+        sock.recv.side_effect = ['', '0008{"id":5}']
+        sock.send.side_effect = lambda data: len(data)
+        assert self.msgr.request('get_user_info') == {"id": 5}
+        first, second = sock.send.call_args_list
+        assert first == second
+
     def test_first_connection(self):
         """SocketMessenger connects deferred until first send"""
-        assert not self.msgr.firstDone
+        assert not self.sock.connect.called
+        self.msgr.send({})
+        assert self.sock.connect.called
+
+    def test_connection_reused(self):
+        self.msgr.send({})
         self.msgr.send({})
-        assert self.msgr.firstDone
+        assert self.msgr._socket.call_count == 1
+        assert self.msgr._idle == [self.sock]
+
+    def test_waits_for_connection_when_pool_exhausted(self):
+        self.msgr.pool_size = 1
+        self.msgr._checkout()
+        with pytest.raises(OxdTimeoutError):
+            with deadline.scope(0.05):
+                self.msgr.send({})
+
+    def test_connect_timeout_is_safe_to_resend(self):
+        self.sock.connect.side_effect = [socket.timeout('timed out'), None]
+        assert self.msgr.request('get_tokens_by_code') == {"id": 5}
+        assert self.sock.connect.call_count == 2
+
+        self.msgr.close()
+        self.msgr.retry_policy = RetryPolicy(retries=0)
+        self.sock.connect.side_effect = socket.timeout('timed out')
+        with pytest.raises(OxdConnectionError) as e:
+            self.msgr.request('get_tokens_by_code')
+        assert not e.value.sent
+        assert self.msgr._busy == 0
 
     def test_request(self):
         assert self.msgr.request('get_user_info') == {"id": 5}
@@ -32,3 +117,103 @@ class SocketMessengerTestCase(unittest.TestCase):
 
         assert 'protection_access_token' in self.msgr.send.call_args[0][0]["params"]
 
+
+    def test_protection_token_of_request_wins(self):
+        self.msgr.send = MagicMock()
+
+        self.msgr.access_token = 'test-token'
+        self.msgr.request('test_command', protection_access_token='site-token')
+
+        params = self.msgr.send.call_args[0][0]["params"]
+        assert params['protection_access_token'] == 'site-token'
+
+
+def http_response(body, **headers):
+    headers = "".join("%s: %s\r\n" % (k.replace("_", "-"), v)
+                      for k, v in headers.items())
+    return urllib.addinfourl(StringIO.StringIO(body), mimetools.Message(
+        StringIO.StringIO(headers + "\r\n")), "https://oxd/get-user-info")
+
+
+def gzip(data):
+    return HttpMessenger._gzip(data)
+
+
+def raw_deflate(data):
+    compressor = zlib.compressobj(6, zlib.DEFLATED, -zlib.MAX_WBITS)
+    return compressor.compress(data) + compressor.flush()
+
+
+class HttpMessengerTestCase(unittest.TestCase):
+    def setUp(self):
+        self.msgr = HttpMessenger('https://oxd.example.com',
+                                  retry_policy=RetryPolicy(retries=0))
+        self.urlopen = patch('urllib2.urlopen').start()
+        self.urlopen.return_value = http_response('{"id": 5}')
+
+    def tearDown(self):
+        patch.stopall()
+
+    def test_small_request_not_compressed(self):
+        self.msgr.compress_threshold = 1000
+        self.msgr.request('get_user_info', oxd_id='id')
+        req = self.urlopen.call_args[0][0]
+        assert req.get_data() == '{"oxd_id":"id"}'
+        assert not req.has_header('Content-encoding')
+        assert req.get_header('Accept-encoding') == 'gzip, deflate'
+
+    def test_large_request_compressed(self):
+        self.msgr.compress_threshold = 10
+        self.msgr.request('get_user_info', oxd_id='id')
+        req = self.urlopen.call_args[0][0]
+        assert req.get_header('Content-encoding') == 'gzip'
+        assert zlib.decompress(req.get_data(), 31) == '{"oxd_id":"id"}'
+
+    def test_compressed_responses_decompressed(self):
+        body = '{"values": [%s]}' % ",".join(['"abc"'] * 50000)
+        for encoding, data in [('gzip', gzip(body)),
+                               ('deflate', zlib.compress(body)),
+                               ('deflate', raw_deflate(body))]:
+            self.urlopen.return_value = http_response(
+                data, Content_Encoding=encoding)
+            assert len(self.msgr.request('get_user_info')['values']) == 50000
+
+        self.urlopen.return_value = http_response(
+            raw_deflate('{"id": 5}'), Content_Encoding='deflate')
+        assert self.msgr.request('get_user_info') == {'id': 5}
+
+    def test_incremental_decoding_of_compressed_response(self):
+        pytest.importorskip('ijson')
+        self.msgr.incremental = True
+        body = '{"values": [%s], "exp": 1.5}' % ",".join(['"abc"'] * 50000)
+        self.urlopen.return_value = http_response(
+            gzip(body), Content_Encoding='gzip')
+        response = self.msgr.request('get_user_info')
+        assert len(response['values']) == 50000
+        assert response['exp'] == 1.5
+
+        self.msgr.max_response_size = 100000
+        self.urlopen.return_value = http_response(
+            gzip(body), Content_Encoding='gzip')
+        with pytest.raises(OxdResponseTooLargeError):
+            self.msgr.request('get_user_info')
+
+    def test_size_limit_applies_to_decompressed_response(self):
+        body = '{"values": "%s"}' % ("a" * 200000)
+        self.urlopen.return_value = http_response(
+            gzip(body), Content_Encoding='gzip',
+            Content_Length=len(gzip(body)))
+        self.msgr.max_response_size = 100000
+        with pytest.raises(OxdResponseTooLargeError):
+            self.msgr.request('get_user_info')
+
+    def test_unsupported_encoding(self):
+        self.urlopen.return_value = http_response('x', Content_Encoding='br')
+        with pytest.raises(OxdConnectionError):
+            self.msgr.request('get_user_info')
+
+    def test_corrupt_compressed_response(self):
+        self.urlopen.return_value = http_response(
+            'not gzip', Content_Encoding='gzip')
+        with pytest.raises(OxdConnectionError):
+            self.msgr.request('get_user_info')
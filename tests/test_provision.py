@@ -0,0 +1,95 @@
+import os
+import shutil
+import tempfile
+import unittest
+
+from mock import patch
+
+from oxdpython import provision
+from oxdpython.configurer import Configurer
+from oxdpython.fakeserver import FakeOxdServer, OXD_ID
+
+
+def register_site(params):
+    if 'broken' in params['authorization_redirect_uri']:
+        return {'status': 'error', 'data': {'error': 'invalid_request'}}
+    return {'status': 'ok', 'data': {'oxd_id': OXD_ID}}
+
+
+class ProvisionTestCase(unittest.TestCase):
+    def setUp(self):
+        self.server = FakeOxdServer(
+            responses={'register_site': register_site}).start()
+        self.dir = tempfile.mkdtemp()
+        self.configs = [self.site(n) for n in ['a', 'b', 'c']]
+
+    def tearDown(self):
+        self.server.stop()
+        shutil.rmtree(self.dir)
+
+    def site(self, name, uri=None):
+        path = os.path.join(self.dir, name + '.cfg')
+        with open(path, 'w') as f:
+            f.write('[oxd]\nhost = %s\nport = %s\n' % self.server.address)
+            f.write('[client]\nauthorization_redirect_uri = %s\n' % (
+                uri or 'https://%s.example.com/callback' % name))
+        return path
+
+    def commands(self):
+        return [c for c, _ in self.server.requests]
+
+    def test_registers_all_sites_writing_each_config_once(self):
+        with patch.object(Configurer, '_write',
+                          autospec=True, side_effect=Configurer._write) as w:
+            results = provision.provision(self.configs, concurrency=2)
+        assert [r.oxd_id for r in results] == [OXD_ID] * 3
+        assert all(r.error is None for r in results)
+        assert sorted(c.config_file for c, in
+                      (call[0] for call in w.call_args_list)) == self.configs
+        assert Configurer(self.configs[0]).get('oxd', 'id') == OXD_ID
+        assert self.commands() == ['register_site'] * 3
+
+    def test_resumes_after_a_failed_site(self):
+        self.configs.append(self.site('d', 'https://broken.example.com/cb'))
+        results = provision.provision(self.configs)
+        assert [r.error is None for r in results] == [True] * 3 + [False]
+        assert Configurer(self.configs[0]).get('oxd', 'id') == OXD_ID
+        assert Configurer(self.configs[3]).get('oxd', 'id') is None
+
+        self.server.requests.clear()
+        self.site('d')
+        results = provision.provision(self.configs)
+        assert all(r.error is None for r in results)
+        assert self.commands() == ['register_site']
+
+    def test_setup_client_gets_protection_token(self):
+        results = provision.provision(self.configs, setup_client=True)
+        assert all(r.oxd_id == OXD_ID for r in results)
+        config = Configurer(self.configs[1])
+        assert config.get('client', 'client_id')
+        assert config.get('client', 'protection_access_token')
+
+        self.server.requests.clear()
+        provision.provision(self.configs, setup_client=True)
+        assert self.commands() == []
+
+    def test_teardown_removes_the_ids(self):
+        provision.provision(self.configs[:2])
+        self.server.requests.clear()
+        results = provision.teardown(self.configs)
+        assert [r.oxd_id for r in results] == [OXD_ID, OXD_ID, None]
+        assert self.commands() == ['remove_site'] * 2
+        assert all(Configurer(c).get('oxd', 'id') is None
+                   for c in self.configs)
+
+    def test_main_reads_manifest_and_returns_failure(self):
+        self.site('c', 'https://broken.example.com/cb')
+        manifest = os.path.join(self.dir, 'sites.manifest')
+        with open(manifest, 'w') as f:
+            f.write('# test sites\na.cfg\n\nb.cfg  # second\nc.cfg\n')
+        assert provision.read_manifest(manifest) == self.configs
+        assert provision.main([manifest, '-c', '2']) == 1
+        self.site('c')
+        assert provision.main([manifest]) == 0
+        assert provision.main([manifest, '--remove']) == 0
+        assert Configurer(self.configs[2]).get('oxd', 'id') is None
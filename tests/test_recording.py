@@ -0,0 +1,109 @@
+import gzip
+import os
+import shutil
+import tempfile
+import time
+import unittest
+
+import pytest
+from mock import MagicMock
+
+from oxdpython.messenger import Messenger
+from oxdpython.recording import RecordingMessenger, ReplayMessenger, load, \
+    play
+
+
+class RecordAndReplayTestCase(unittest.TestCase):
+    def setUp(self):
+        self.tmpdir = tempfile.mkdtemp()
+        self.path = os.path.join(self.tmpdir, 'traffic.jsonl.gz')
+        self.backend = Messenger()
+        self.backend.request = MagicMock(side_effect=[
+            {"status": "ok", "data": {"access": "granted"}},
+            {"status": "ok", "data": {"access": "denied"}},
+            {"status": "ok", "data": {"claims": {}}},
+        ])
+        msgr = RecordingMessenger(self.backend, self.path)
+        msgr.access_token = 'secret'
+        msgr.request('uma_rs_check_access', rpt='a', path='/', http_method='GET')
+        msgr.request('uma_rs_check_access', rpt='a', path='/', http_method='GET')
+        msgr.request('get_user_info', access_token='t')
+        msgr.close()
+
+    def tearDown(self):
+        shutil.rmtree(self.tmpdir)
+
+    def test_records_exchanges(self):
+        records = load(self.path)
+        assert [r.command for r in records] == ['uma_rs_check_access',
+                                                'uma_rs_check_access',
+                                                'get_user_info']
+        assert records[2].params == {'access_token': 'REDACTED'}
+        assert records[1].response['data']['access'] == 'denied'
+        assert records[0].offset <= records[1].offset
+
+    def test_access_token_shared_not_recorded(self):
+        assert self.backend.access_token == 'secret'
+        with open(self.path, 'rb') as f:
+            assert 'secret' not in f.read()
+
+    def test_secrets_redacted(self):
+        backend = Messenger()
+        backend.request = MagicMock(return_value={"status": "ok", "data": {
+            "access_token": "at-1", "id_token": "idt-1",
+            "refresh_token": "rt-1", "expires_in": 299}})
+        msgr = RecordingMessenger(backend, self.path)
+        msgr.request('get_tokens_by_code', code='c', state='s',
+                     protection_access_token='pat-1')
+        msgr.request('get_client_token', client_id='id',
+                     client_secret='cs-1', op_host='https://op')
+        msgr.request('uma_rs_check_access', rpt='rpt-1', path='/')
+        msgr.close()
+        with gzip.open(self.path, 'rb') as f:
+            recording = f.read()
+        for secret in ['pat-1', 'cs-1', 'rpt-1', 'at-1', 'idt-1', 'rt-1']:
+            assert secret not in recording
+        records = load(self.path)
+        assert records[0].params['code'] == 'c'
+        assert records[0].response['data']['expires_in'] == 299
+        assert records[1].params['client_secret'] == 'REDACTED'
+
+        replay = ReplayMessenger(self.path, scale=0, strict=True)
+        assert replay.request('uma_rs_check_access', rpt='rpt-2', path='/')
+        assert replay.request('get_tokens_by_code', code='c', state='s',
+                              protection_access_token='pat-2')['data'] \
+            ['access_token'] == 'REDACTED'
+
+    def test_replay_in_recorded_order_then_repeats_last(self):
+        msgr = ReplayMessenger(self.path, scale=0)
+        params = dict(rpt='a', path='/', http_method='GET')
+        accesses = [msgr.request('uma_rs_check_access', **params)['data']
+                    ['access'] for _ in range(3)]
+        assert accesses == ['granted', 'denied', 'denied']
+
+    def test_replay_unrecorded_params(self):
+        msgr = ReplayMessenger(self.path, scale=0)
+        params = dict(rpt='a', path='/other', http_method='GET')
+        assert msgr.request('uma_rs_check_access', **params)['data'] == {
+            'access': 'granted'}
+        strict = ReplayMessenger(self.path, scale=0, strict=True)
+        with pytest.raises(KeyError):
+            strict.request('uma_rs_check_access', **params)
+        with pytest.raises(KeyError):
+            msgr.request('remove_site')
+
+    def test_replay_scaled_timing(self):
+        msgr = ReplayMessenger(self.path, scale=1000)
+        msgr._exact.clear()
+        for records in msgr._by_command.values():
+            for i, r in enumerate(records):
+                records[i] = r._replace(elapsed=0.0001)
+        start = time.time()
+        msgr.request('get_user_info', access_token='t')
+        assert time.time() - start >= 0.1
+
+    def test_play(self):
+        results = play(self.path, ReplayMessenger(self.path, scale=0), 0)
+        assert [r[0] for r in results] == ['uma_rs_check_access',
+                                           'uma_rs_check_access',
+                                           'get_user_info']
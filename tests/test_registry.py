@@ -0,0 +1,139 @@
+import itertools
+import os
+import shutil
+import tempfile
+import threading
+import time
+import unittest
+
+import pytest
+
+from oxdpython.fakeserver import FakeOxdServer
+from oxdpython.registry import ClientRegistry, SiteMessenger
+
+
+def site(name):
+    return {'oxd': {'id': name + '-id'},
+            'client': {'authorization_redirect_uri':
+                       'https://%s.example.com/callback' % name,
+                       'protection_access_token': name + '-token',
+                       'client_id': name + '-client',
+                       'client_secret': 'secret'}}
+
+
+class ClientRegistryTestCase(unittest.TestCase):
+    def setUp(self):
+        self.server = FakeOxdServer().start()
+        self.dir = tempfile.mkdtemp()
+        self.config = os.path.join(self.dir, 'shared.cfg')
+        with open(self.config, 'w') as f:
+            f.write('[oxd]\nhost = %s\nport = %s\n' % self.server.address)
+        self.loaded = []
+        self.registry = ClientRegistry(self.config, loader=self.load,
+                                       max_clients=2)
+
+    def tearDown(self):
+        self.registry.close()
+        self.server.stop()
+        shutil.rmtree(self.dir)
+
+    def load(self, name):
+        if name == 'unknown':
+            return None
+        self.loaded.append(name)
+        return site(name)
+
+    def test_sites_share_messenger_with_own_token(self):
+        for name in ['a', 'b']:
+            self.registry.get(name).get_logout_uri()
+        params = [p for _, p in self.server.requests]
+        assert [(p['oxd_id'], p['protection_access_token'])
+                for p in params] == [('a-id', 'a-token'), ('b-id', 'b-token')]
+
+        msgrs = [self.registry.get(n).msgr for n in ['a', 'b']]
+        assert all(isinstance(m, SiteMessenger) for m in msgrs)
+        assert msgrs[0].msgr is msgrs[1].msgr is self.registry.msgr
+        assert self.registry.get('a').cache is self.registry.cache
+        assert self.registry.get('a').executor is self.registry.executor
+
+    def test_submitted_calls_sent_with_token_of_site(self):
+        futures = [self.registry.get(n).submit('get_logout_uri')
+                   for n in ['a', 'b']]
+        for future in futures:
+            future.result(1)
+        tokens = sorted(p['protection_access_token']
+                        for _, p in self.server.requests)
+        assert tokens == ['a-token', 'b-token']
+
+    def test_concurrent_token_refreshes_stay_with_their_site(self):
+        counter = itertools.count()
+
+        def get_client_token(params):
+            return {'status': 'ok', 'data': {
+                'access_token': '%s-token-%d' % (params['client_id'],
+                                                 next(counter)),
+                'expires_in': 300}}
+        self.server.responses['get_client_token'] = get_client_token
+        # interleaves the requests of the two sites
+        self.server.latency = 0.002
+        clients = [self.registry.get(n) for n in ['a', 'b']]
+
+        def refresh(client):
+            for _ in range(20):
+                client.get_client_token(auto_update=False)
+                client.get_logout_uri()
+        threads = [threading.Thread(target=refresh, args=(c,))
+                   for c in clients]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        sent = [(p['oxd_id'][0], p['protection_access_token'][0])
+                for c, p in self.server.requests if c == 'get_logout_uri']
+        assert len(sent) == 40
+        assert not self.registry.msgr.access_token
+        assert all(site == token for site, token in sent)
+
+    def test_clients_loaded_once(self):
+        first = self.registry['a']
+        assert self.registry['a'] is first
+        assert self.loaded == ['a']
+
+    def test_least_recently_used_unloaded(self):
+        self.registry.get('a')
+        self.registry.get('b')
+        self.registry.get('a')
+        self.registry.get('c')
+        assert 'b' not in self.registry
+        assert len(self.registry) == 2
+        self.registry.get('b')
+        assert self.loaded == ['a', 'b', 'c', 'b']
+
+    def test_unknown_site(self):
+        with pytest.raises(KeyError):
+            self.registry.get('unknown')
+
+    def test_token_refresh_scheduled_and_cancelled_on_unload(self):
+        client = self.registry.get('a')
+        client.get_client_token()
+        assert len(self.registry.scheduler) == 1
+        self.registry.remove('a')
+        assert len(self.registry.scheduler) == 0
+
+    def test_idle_clients_expire(self):
+        self.registry.idle_timeout = 0.01
+        self.registry.get('a')
+        time.sleep(0.02)
+        self.registry.get('b')
+        self.registry.expire()
+        assert 'a' not in self.registry
+        assert 'b' in self.registry
+
+    def test_add_config_file(self):
+        path = os.path.join(self.dir, 'site.cfg')
+        with open(path, 'w') as f:
+            f.write('[oxd]\nid = file-id\n[client]\n')
+        client = self.registry.add('file', path)
+        client.remove_site()
+        assert self.server.requests[-1][1]['oxd_id'] == 'file-id'
@@ -0,0 +1,80 @@
+import pytest
+from mock import MagicMock, patch
+
+from oxdpython import deadline
+from oxdpython.exceptions import OxdConnectionError, OxdTimeoutError
+from oxdpython.retry import RetryPolicy
+
+
+def lost_response():
+    return OxdConnectionError("closed", sent=True)
+
+
+def not_sent():
+    return OxdConnectionError("refused", sent=False)
+
+
+@pytest.fixture(autouse=True)
+def no_sleep():
+    with patch('oxdpython.retry.time.sleep') as sleep:
+        yield sleep
+
+
+def test_idempotent_command_retried_after_lost_response():
+    func = MagicMock(side_effect=[lost_response(), lost_response(), 'ok'])
+    assert RetryPolicy().call('uma_rs_check_access', func) == 'ok'
+    assert func.call_count == 3
+
+
+def test_non_idempotent_command_not_retried_after_lost_response():
+    func = MagicMock(side_effect=[lost_response(), 'ok'])
+    with pytest.raises(OxdConnectionError):
+        RetryPolicy().call('register_site', func)
+    assert func.call_count == 1
+
+
+def test_non_idempotent_command_retried_when_not_sent():
+    func = MagicMock(side_effect=[not_sent(), 'ok'])
+    assert RetryPolicy().call('get_tokens_by_code', func) == 'ok'
+
+
+def test_retries_are_limited():
+    func = MagicMock(side_effect=not_sent())
+    with pytest.raises(OxdConnectionError):
+        RetryPolicy(retries=3).call('get_user_info', func)
+    assert func.call_count == 4
+
+
+def test_other_errors_are_not_retried():
+    func = MagicMock(side_effect=OxdTimeoutError())
+    with pytest.raises(OxdTimeoutError):
+        RetryPolicy().call('get_user_info', func)
+    assert func.call_count == 1
+
+
+def test_backoff_is_capped_exponential():
+    policy = RetryPolicy(base_delay=0.1, max_delay=0.3)
+    with patch('random.uniform', side_effect=lambda a, b: b):
+        assert [policy.backoff(n) for n in (1, 2, 3, 4)] == [0.1, 0.2, 0.3,
+                                                            0.3]
+
+
+def test_budget_limits_retries_in_window():
+    policy = RetryPolicy(budget=2, window=60)
+    func = MagicMock(side_effect=not_sent())
+    for expected_calls in (3, 1):
+        func.reset_mock()
+        with pytest.raises(OxdConnectionError):
+            policy.call('get_user_info', func)
+        assert func.call_count == expected_calls
+
+
+def test_no_retry_beyond_deadline(no_sleep):
+    policy = RetryPolicy(base_delay=10, max_delay=10)
+    func = MagicMock(side_effect=not_sent())
+    with patch('random.uniform', return_value=5):
+        with deadline.scope(1):
+            with pytest.raises(OxdConnectionError):
+                policy.call('get_user_info', func)
+    assert func.call_count == 1
+    no_sleep.assert_not_called()
@@ -0,0 +1,84 @@
+import time
+import unittest
+
+from mock import MagicMock
+
+from oxdpython.exceptions import InvalidTicketError
+from oxdpython.rpt import RptCache, Rpt
+
+
+def rpt_response(token, upgraded=False, **data):
+    data.update(access_token=token, token_type='Bearer', pct='pct-' + token,
+                upgraded=upgraded)
+    return data
+
+
+class RptCacheTestCase(unittest.TestCase):
+    def setUp(self):
+        self.client = MagicMock(oxd_id='site-id')
+        self.client.introspect_rpt.return_value = {
+            'active': True, 'exp': int(time.time()) + 300,
+            'permissions': [{'resource_id': 'photos',
+                             'resource_scopes': ['view']}]}
+        self.rpts = RptCache(self.client)
+
+    def test_obtained_rpt_is_reused_for_same_scopes(self):
+        self.client.uma_rp_get_rpt.return_value = rpt_response('one')
+        assert self.rpts.get('https://rs', ['view']) is None
+        assert self.rpts.obtain('https://rs', 'ticket',
+                                ['view'])['access_token'] == 'one'
+        self.client.uma_rp_get_rpt.assert_called_once_with(
+            'ticket', scope=['view'])
+
+        assert self.rpts.get('https://rs', ['view']) == 'one'
+        assert self.rpts.get('https://rs', ['view', 'print']) is None
+        assert self.rpts.get('https://other', ['view']) is None
+        entry = self.rpts.lookup('https://rs', ['view'])
+        assert entry.permissions[0]['resource_id'] == 'photos'
+        assert entry.pct == 'pct-one'
+
+    def test_held_rpt_and_pct_are_upgraded(self):
+        self.client.uma_rp_get_rpt.side_effect = [
+            rpt_response('one'), rpt_response('two', upgraded=True)]
+        self.rpts.obtain('https://rs', 'ticket-1', ['view'])
+        self.rpts.obtain('https://rs', 'ticket-2', ['print'])
+        self.client.uma_rp_get_rpt.assert_called_with(
+            'ticket-2', scope=['print'], rpt='one', pct='pct-one')
+        assert self.rpts.get('https://rs', ['print']) == 'two'
+        assert self.rpts.get('https://rs', ['view']) == 'two'
+
+    def test_expiry_from_response_skips_introspection(self):
+        self.client.uma_rp_get_rpt.return_value = rpt_response(
+            'one', expires_in=20)
+        self.rpts.obtain('https://rs', 'ticket')
+        assert not self.client.introspect_rpt.called
+        # expires within the leeway
+        assert self.rpts.get('https://rs') is None
+
+        self.rpts.leeway = 0
+        self.rpts.obtain('https://rs', 'ticket')
+        assert self.rpts.get('https://rs') == 'one'
+
+    def test_need_info_and_inactive_rpt_not_kept(self):
+        self.client.uma_rp_get_rpt.return_value = {
+            'error': 'need_info', 'details': {'ticket': 'ticket-2'}}
+        assert self.rpts.obtain('https://rs', 'ticket')['error'] == \
+            'need_info'
+        assert self.rpts.get('https://rs') is None
+
+        self.client.uma_rp_get_rpt.return_value = rpt_response('one')
+        self.client.introspect_rpt.return_value = {'active': False}
+        self.rpts.obtain('https://rs', 'ticket')
+        assert self.rpts.get('https://rs') is None
+
+    def test_errors_propagate_and_invalidate_drops_rpt(self):
+        self.rpts.cache.set(('rpt', 'site-id', 'https://rs', ()),
+                            Rpt('one', None, None, None), ttl=None)
+        assert self.rpts.get('https://rs') == 'one'
+        self.rpts.invalidate('https://rs')
+        assert self.rpts.get('https://rs') is None
+
+        self.client.uma_rp_get_rpt.side_effect = InvalidTicketError(
+            {'error_description': 'expired'})
+        with self.assertRaises(InvalidTicketError):
+            self.rpts.obtain('https://rs', 'ticket')
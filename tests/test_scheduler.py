@@ -0,0 +1,45 @@
+import threading
+import time
+
+from oxdpython.scheduler import Scheduler
+
+
+def test_tasks_run_in_order_of_due_time():
+    scheduler = Scheduler()
+    done = []
+    finished = threading.Event()
+    scheduler.schedule(0.04, lambda: (done.append('late'), finished.set()))
+    scheduler.schedule(0.01, done.append, 'early')
+    assert finished.wait(1)
+    assert done == ['early', 'late']
+    scheduler.stop()
+
+
+def test_cancelled_task_not_run():
+    scheduler = Scheduler()
+    done = []
+    task = scheduler.schedule(0.01, done.append, 'x')
+    task.cancel()
+    assert len(scheduler) == 0
+    time.sleep(0.03)
+    assert done == []
+    scheduler.stop()
+
+
+def test_failing_task_does_not_stop_scheduler():
+    scheduler = Scheduler()
+    finished = threading.Event()
+    scheduler.schedule(0, lambda: 1 / 0)
+    scheduler.schedule(0.01, finished.set)
+    assert finished.wait(1)
+    scheduler.stop()
+
+
+def test_one_thread_for_many_tasks():
+    scheduler = Scheduler(name='test scheduler')
+    for i in range(100):
+        scheduler.schedule(60, lambda: None)
+    names = [t.name for t in threading.enumerate()]
+    assert names.count('test scheduler') == 1
+    scheduler.stop()
+    assert 'test scheduler' not in [t.name for t in threading.enumerate()]
@@ -0,0 +1,197 @@
+import BaseHTTPServer
+import SocketServer
+import httplib
+import socket
+import threading
+import time
+import unittest
+
+import pytest
+from mock import MagicMock
+
+from oxdpython.exceptions import NeedInfoError
+from oxdpython.session import UmaSession, ConnectionPool, \
+    parse_uma_challenge
+
+CHALLENGE = 'UMA realm="rs", as_uri="https://op.example.com", ticket="%s"'
+# the www-authenticate_header of uma_rs_check_access
+OXD_CHALLENGE = ("UMA realm='example', as_uri='https://as.example.com', "
+                 "error='insufficient_scope', ticket='%s'")
+
+
+class _Server(SocketServer.ThreadingMixIn, BaseHTTPServer.HTTPServer):
+    daemon_threads = True
+
+
+class _Handler(BaseHTTPServer.BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+
+    def do_GET(self):
+        rs = self.server.rs
+        rs.requests.append((self.client_address, self.path,
+                            self.headers.get('Authorization')))
+        if self.headers.get('Authorization') == 'Bearer ' + rs.valid_rpt:
+            status, body, headers = 200, 'photos', {}
+        else:
+            status, body, headers = 401, '', {
+                'WWW-Authenticate': rs.challenge % 'ticket-1'}
+        self.send_response(status)
+        for name, value in headers.items():
+            self.send_header(name, value)
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def do_POST(self):
+        rs = self.server.rs
+        rs.requests.append((self.client_address, self.path, 'POST'))
+        self.rfile.read(int(self.headers.get('Content-Length', 0)))
+        time.sleep(rs.delay)
+        self.send_response(201)
+        self.send_header('Content-Length', '0')
+        self.end_headers()
+
+    def log_message(self, *args):
+        pass
+
+
+class ResourceServer(object):
+    def __init__(self):
+        self.requests = []
+        self.valid_rpt = 'rpt-1'
+        self.challenge = CHALLENGE
+        self.delay = 0
+        self.server = _Server(('localhost', 0), _Handler)
+        self.server.rs = self
+        self.url = 'http://localhost:%s' % self.server.server_address[1]
+        thread = threading.Thread(target=self.server.serve_forever)
+        thread.daemon = True
+        thread.start()
+
+    def stop(self):
+        self.server.shutdown()
+        self.server.server_close()
+
+
+def test_parse_uma_challenge():
+    assert parse_uma_challenge(CHALLENGE % 't') == {
+        'realm': 'rs', 'as_uri': 'https://op.example.com', 'ticket': 't'}
+    assert parse_uma_challenge(OXD_CHALLENGE % 't') == {
+        'realm': 'example', 'as_uri': 'https://as.example.com',
+        'error': 'insufficient_scope', 'ticket': 't'}
+    assert parse_uma_challenge('UMA realm=rs, ticket=t') == {
+        'realm': 'rs', 'ticket': 't'}
+    assert parse_uma_challenge('Bearer realm="rs"') is None
+    assert parse_uma_challenge(None) is None
+
+
+class UmaSessionTestCase(unittest.TestCase):
+    def setUp(self):
+        self.rs = ResourceServer()
+        self.client = MagicMock(oxd_id='site-id')
+        self.client.uma_rp_get_rpt.return_value = {
+            'access_token': 'rpt-1', 'token_type': 'Bearer',
+            'pct': 'pct-1', 'expires_in': 300}
+        self.session = UmaSession(self.client)
+
+    def tearDown(self):
+        self.session.close()
+        self.rs.stop()
+
+    def test_obtains_rpt_on_401_and_reuses_it(self):
+        response = self.session.get(self.rs.url + '/photoz?album=1',
+                                    scope=['view'])
+        assert (response.status, response.body) == (200, 'photos')
+        self.client.uma_rp_get_rpt.assert_called_once_with(
+            'ticket-1', scope=['view'])
+
+        assert self.session.get(self.rs.url + '/photoz',
+                                scope=['view']).status == 200
+        assert self.client.uma_rp_get_rpt.call_count == 1
+        assert [(p, a) for _, p, a in self.rs.requests] == [
+            ('/photoz?album=1', None), ('/photoz?album=1', 'Bearer rpt-1'),
+            ('/photoz', 'Bearer rpt-1')]
+        # all sent over one kept alive connection
+        assert len(set(addr for addr, _, _ in self.rs.requests)) == 1
+
+    def test_rpt_obtained_for_challenge_in_oxd_format(self):
+        self.rs.challenge = OXD_CHALLENGE
+        assert self.session.get(self.rs.url + '/photoz').status == 200
+        self.client.uma_rp_get_rpt.assert_called_once_with(
+            'ticket-1', scope=None)
+
+    def test_rejected_rpt_is_upgraded(self):
+        self.session.get(self.rs.url + '/photoz')
+        self.rs.valid_rpt = 'rpt-2'
+        self.client.uma_rp_get_rpt.return_value = {
+            'access_token': 'rpt-2', 'pct': 'pct-1', 'expires_in': 300,
+            'upgraded': True}
+        assert self.session.get(self.rs.url + '/photoz').status == 200
+        self.client.uma_rp_get_rpt.assert_called_with(
+            'ticket-1', scope=None, rpt='rpt-1', pct='pct-1')
+        assert self.session.rpts.get(self.rs.url) == 'rpt-2'
+
+    def test_need_info_gives_claims_gathering_url(self):
+        self.client.uma_rp_get_rpt.return_value = {
+            'error': 'need_info', 'error_description': 'claims needed',
+            'details': {'ticket': 'ticket-2'}}
+        self.client.uma_rp_get_claims_gathering_url.return_value = \
+            'https://op.example.com/gather'
+        with self.assertRaises(NeedInfoError) as ctx:
+            self.session.get(self.rs.url + '/photoz')
+        assert ctx.exception.claims_gathering_url == \
+            'https://op.example.com/gather'
+        self.client.uma_rp_get_claims_gathering_url.assert_called_once_with(
+            'ticket-2')
+
+        self.client.uma_rp_get_rpt.return_value = {
+            'access_token': 'rpt-1', 'expires_in': 300}
+        self.session.gather_claims(self.rs.url + '/photoz', 'ticket-3',
+                                   'state-1')
+        self.client.uma_rp_get_rpt.assert_called_with(
+            'ticket-3', scope=None, state='state-1')
+        assert self.session.get(self.rs.url + '/photoz').status == 200
+
+
+def test_stale_idle_connection_is_replaced():
+    rs = ResourceServer()
+    pool = ConnectionPool()
+    try:
+        assert pool.urlopen('GET', rs.url + '/').status == 401
+        for conn in pool._idle.values()[0]:
+            conn.sock.close()
+        assert pool.urlopen('GET', rs.url + '/').status == 401
+        assert len(rs.requests) == 2
+    finally:
+        pool.close()
+        rs.stop()
+
+
+def test_post_not_sent_again_after_timeout():
+    rs = ResourceServer()
+    pool = ConnectionPool(timeout=0.1)
+    try:
+        assert pool.urlopen('POST', rs.url + '/photos', 'photo').status == 201
+        rs.delay = 0.3
+        with pytest.raises(socket.timeout):
+            pool.urlopen('POST', rs.url + '/photos', 'photo')
+        time.sleep(0.3)
+        assert len(rs.requests) == 2
+    finally:
+        pool.close()
+        rs.stop()
+
+
+def test_post_not_sent_again_after_broken_response():
+    rs = ResourceServer()
+    pool = ConnectionPool()
+    try:
+        pool.urlopen('GET', rs.url + '/')
+        conn = pool._idle.values()[0][0]
+        conn.getresponse = MagicMock(side_effect=httplib.BadStatusLine(''))
+        with pytest.raises(httplib.BadStatusLine):
+            pool.urlopen('POST', rs.url + '/photos', 'photo')
+        assert len(rs.requests) == 2
+    finally:
+        pool.close()
+        rs.stop()
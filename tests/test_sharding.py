@@ -0,0 +1,144 @@
+import os
+import shutil
+import tempfile
+import unittest
+
+import pytest
+from mock import MagicMock
+
+from oxdpython.client import Client
+from oxdpython.fakeserver import FakeOxdServer
+from oxdpython.messenger import Messenger, SocketMessenger
+from oxdpython.sharding import HashRing, ShardedMessenger
+
+this_dir = os.path.dirname(os.path.realpath(__file__))
+keys = ['site-%d' % i for i in range(2000)]
+
+
+class HashRingTestCase(unittest.TestCase):
+    def setUp(self):
+        self.ring = HashRing(['a', 'b', 'c', 'd'])
+
+    def test_keys_spread_over_nodes(self):
+        counts = {}
+        for key in keys:
+            node = self.ring.get(key)
+            counts[node] = counts.get(node, 0) + 1
+        assert sorted(counts) == ['a', 'b', 'c', 'd']
+        assert all(300 < c < 700 for c in counts.values())
+
+    def test_adding_node_moves_few_keys_to_it(self):
+        before = dict((k, self.ring.get(k)) for k in keys)
+        self.ring.add('e')
+        moved = [k for k in keys if self.ring.get(k) != before[k]]
+        assert all(self.ring.get(k) == 'e' for k in moved)
+        assert len(moved) < len(keys) * 0.3
+
+    def test_removing_node_only_moves_its_keys(self):
+        before = dict((k, self.ring.get(k)) for k in keys)
+        self.ring.remove('b')
+        assert self.ring.nodes == ['a', 'c', 'd']
+        for key in keys:
+            if before[key] != 'b':
+                assert self.ring.get(key) == before[key]
+
+    def test_empty_ring(self):
+        with pytest.raises(LookupError):
+            HashRing().get('x')
+
+
+def backend():
+    msgr = Messenger()
+    msgr.request = MagicMock(return_value={"status": "ok", "data": {}})
+    return msgr
+
+
+class ShardedMessengerTestCase(unittest.TestCase):
+    def setUp(self):
+        self.backends = dict((n, backend()) for n in ['a', 'b', 'c'])
+        self.msgr = ShardedMessenger(self.backends)
+
+    def test_requests_of_site_go_to_one_node(self):
+        node = self.msgr.node_of('id-1')
+        for _ in range(3):
+            self.msgr.request('get_user_info', oxd_id='id-1')
+        assert self.backends[node].request.call_count == 3
+
+    def test_registration_pins_oxd_id(self):
+        uri = 'https://site.example.com/callback'
+        node = self.msgr.node_of(authorization_redirect_uri=uri)
+        self.backends[node].request.return_value = {
+            "status": "ok", "data": {"oxd_id": "new-id"}}
+        self.msgr.request('register_site', authorization_redirect_uri=uri)
+        assert self.msgr.pins == {'new-id': node}
+        assert self.msgr.node_of('new-id') == node
+
+        self.backends[node].request.return_value = {
+            "status": "ok", "data": {"oxd_id": "new-id"}}
+        self.msgr.request('remove_site', oxd_id='new-id')
+        assert self.msgr.pins == {}
+
+    def test_failed_registration_not_pinned(self):
+        for b in self.backends.values():
+            b.request.return_value = {"status": "error", "data": {}}
+        self.msgr.request('register_site', authorization_redirect_uri='u')
+        assert self.msgr.pins == {}
+
+    def test_access_token_set_on_all_nodes(self):
+        self.msgr.access_token = 'token'
+        new = backend()
+        self.msgr.add('d', new)
+        assert new.access_token == 'token'
+        assert all(b.access_token == 'token' for b in self.backends.values())
+
+    def test_removing_node_unpins_its_sites(self):
+        self.msgr.pin('id-1', 'a')
+        self.msgr.pin('id-2', 'b')
+        self.msgr.remove('a')
+        assert self.msgr.pins == {'id-2': 'b'}
+        assert self.msgr.node_of('id-1') in ('b', 'c')
+
+
+def test_sites_sharded_over_fake_servers():
+    servers = [FakeOxdServer().start() for _ in range(3)]
+    try:
+        msgr = ShardedMessenger(dict(
+            ('%s:%s' % s.address, SocketMessenger(*s.address))
+            for s in servers))
+        for i in range(30):
+            msgr.request('get_user_info', oxd_id='id-%d' % i, access_token='t')
+        assert all(s.requests for s in servers)
+        for s in servers:
+            node = '%s:%s' % s.address
+            assert all(msgr.node_of(p['oxd_id']) == node
+                       for _, p in s.requests)
+    finally:
+        for s in servers:
+            s.stop()
+
+
+class ClientShardingTestCase(unittest.TestCase):
+    def setUp(self):
+        self.dir = tempfile.mkdtemp()
+        self.config = os.path.join(self.dir, 'sharding.cfg')
+        shutil.copy(os.path.join(this_dir, 'data', 'sharding.cfg'),
+                    self.config)
+
+    def tearDown(self):
+        shutil.rmtree(self.dir)
+
+    def test_shard_read_from_config(self):
+        c = Client(self.config)
+        assert isinstance(c.msgr, ShardedMessenger)
+        assert c.msgr.node_of('test-id') == 'oxd2:8099'
+
+    def test_shard_stored_on_registration(self):
+        c = Client(self.config)
+        c.oxd_id = None
+        for b in c.shards.messengers.values():
+            b.request = MagicMock(return_value={
+                "status": "ok", "data": {"oxd_id": "new-id"}})
+        c.register_site()
+        node = c.shards.node_of(
+            authorization_redirect_uri=c.authorization_redirect_uri)
+        assert Client(self.config).shards.node_of('new-id') == node